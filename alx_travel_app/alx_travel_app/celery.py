@@ -19,6 +19,26 @@ app.conf.beat_schedule = {
         'task': 'listings.tasks.debug_task',
         'schedule': 30.0,
     },
+    'roll-forward-listing-calendars': {
+        'task': 'listings.tasks.roll_forward_calendars',
+        'schedule': crontab(hour=0, minute=5),
+    },
+    'catch-up-listing-stats': {
+        'task': 'listings.tasks.catch_up_listing_stats',
+        'schedule': crontab(hour=1, minute=15),
+    },
+    'build-listing-neighbors': {
+        'task': 'listings.tasks.build_listing_neighbors',
+        'schedule': crontab(hour=2, minute=30),
+    },
+    'refresh-listing-neighbors': {
+        'task': 'listings.tasks.refresh_listing_neighbors',
+        'schedule': crontab(minute='*/15'),
+    },
+    'expire-pending-bookings': {
+        'task': 'listings.tasks.expire_pending_bookings',
+        'schedule': crontab(minute='*/5'),
+    },
 }
 
 @app.task(bind=True)
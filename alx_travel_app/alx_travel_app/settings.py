@@ -28,7 +28,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-DEBUG=os.getenv('DEBUG')
+DEBUG = os.getenv('DEBUG', 'False') == 'True'
 SECRET_KEY = os.getenv('SECRET_KEY')
 ALLOWED_HOSTS =os.getenv('ALLOWED_HOSTS', default='travel-app-qvxz.onrender.com,localhost,127.0.0.1').split(',')
 # SECURITY WARNING: don't run with debug turned on in production!
@@ -59,13 +59,30 @@ INSTALLED_APPS = [
     'allauth.socialaccount',
 ]
 
+# APP_PROFILE=lean (production web and Celery workers) skips apps that are
+# only needed for development, docs or tooling, so processes boot faster.
+# build.sh runs migrations and schema generation with the full profile.
+APP_PROFILE = os.getenv('APP_PROFILE', 'full')
+LEAN_EXCLUDED_APPS = [
+    'drf_yasg',
+    'django_extensions',
+    'drf_spectacular',
+    'django_celery_results',
+    'django_celery_beat',
+]
+if APP_PROFILE == 'lean':
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in LEAN_EXCLUDED_APPS]
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'listings.tracing.CorrelationIdMiddleware',
+    'listings.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'listings.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
@@ -173,7 +190,27 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# Files generated by build.sh (e.g. the OpenAPI schema) are collected from
+# here; collectstatic writes their .gz/.br variants (see STORAGES) and
+# WhiteNoise serves those.
+BUILD_STATIC_DIR = os.path.join(BASE_DIR, 'build', 'static')
+STATICFILES_DIRS = [BUILD_STATIC_DIR] if os.path.isdir(BUILD_STATIC_DIR) else []
+OPENAPI_SCHEMA_STATIC_PATH = 'schema/openapi.json'
+
+# Uploaded files (listing imports). The web service and Celery workers must
+# share this storage; use a network backend in STORAGES when they don't.
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # Hashed names plus precompressed .gz/.br copies, written by collectstatic.
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -196,24 +233,78 @@ DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
 
+# Redis used by the app itself for cross-process signalling (listings.redis_client)
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/1')
+# Seconds a process skips Redis after failing to connect to it
+REDIS_BREAKER_SECONDS = float(os.getenv('REDIS_BREAKER_SECONDS', 10))
+
+# Shared cache (facet counts etc.): Redis when REDIS_URL is set, else per process.
+# Its connections share listings.redis_client's breaker and timeouts.
+REDIS_CACHE_OPTIONS = {
+    'pool_class': 'listings.redis_client.BreakerConnectionPool',
+    'socket_connect_timeout': 1,
+    'socket_timeout': 2,
+}
+if os.getenv('REDIS_URL'):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL,
+                          'OPTIONS': REDIS_CACHE_OPTIONS}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+# Logging. LOG_MODE=queue (default) hands records to a background listener so
+# requests never wait on disk (listings.logs); LOG_MODE=sync writes inline.
+LOG_MODE = os.getenv('LOG_MODE', 'queue')
+LOG_FILE = os.getenv('LOG_FILE', os.path.join(BASE_DIR, "chapa_payments.log"))
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 20 * 1024 * 1024))
+LOG_ROTATE_SECONDS = int(os.getenv('LOG_ROTATE_SECONDS', 24 * 60 * 60))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 7))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv('LOG_PAYLOAD_MAX_CHARS', 2000))
+# Share of INFO/DEBUG records kept per logger (gateway payloads are verbose)
+LOG_SAMPLE_RATES = {
+    'listings.payloads': float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', 0.05)),
+}
+LOG_HANDLERS = ["queue"] if LOG_MODE == 'queue' else ["console", "file"]
+# Tag and sample once, wherever records enter the pipeline (the trace ID
+# lives in a context variable of the logging thread).
+LOG_ENTRY_FILTERS = ["correlation", "sample"]
+LOG_TARGET_FILTERS = [] if LOG_MODE == 'queue' else LOG_ENTRY_FILTERS
 
-# Logging (simple file log)
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
-    "formatters": {"verbose": {"format": "%(levelname)s %(asctime)s %(name)s %(message)s"}},
+    "formatters": {
+        "verbose": {"format": "%(levelname)s %(asctime)s %(name)s %(message)s"},
+        "json": {"()": "listings.logs.JSONFormatter", "max_payload_chars": LOG_PAYLOAD_MAX_CHARS},
+    },
+    "filters": {
+        "sample": {"()": "listings.logs.SamplingFilter", "rates": LOG_SAMPLE_RATES},
+        "correlation": {"()": "listings.tracing.CorrelationIdFilter"},
+    },
     "handlers": {
         "file": {
+            "()": "listings.logs.ProcessSafeRotatingFileHandler",
             "level": "INFO",
-            "class": "logging.FileHandler",
-            "filename": os.path.join(BASE_DIR, "chapa_payments.log"),
-            "formatter": "verbose",
+            "filename": LOG_FILE,
+            "max_bytes": LOG_MAX_BYTES,
+            "interval": LOG_ROTATE_SECONDS,
+            "backup_count": LOG_BACKUP_COUNT,
+            "formatter": "json",
+            "filters": LOG_TARGET_FILTERS,
+        },
+        "console": {"class": "logging.StreamHandler", "formatter": "verbose", "filters": LOG_TARGET_FILTERS},
+        # Built after "console" and "file" (dictConfig goes in name order).
+        "queue": {
+            "()": "listings.logs.BackgroundQueueHandler",
+            "handlers": ["console", "file"],
+            "queue_size": LOG_QUEUE_SIZE,
+            "filters": LOG_ENTRY_FILTERS,
         },
-        "console": {"class": "logging.StreamHandler"},
     },
     "loggers": {
-        "": {"handlers": ["console", "file"], "level": "INFO"},
-        "listings": {"handlers": ["file", "console"], "level": "INFO", "propagate": False},
+        "": {"handlers": LOG_HANDLERS, "level": "INFO"},
+        "listings": {"handlers": LOG_HANDLERS, "level": "INFO", "propagate": False},
     },
 }
 
@@ -227,14 +318,20 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
+# Keep the LOGGING pipeline above in workers instead of Celery's own root handlers
+CELERY_WORKER_HIJACK_ROOT_LOGGER = False
 
 
 
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # The browsable API renders a full HTML page per request; only offer it while developing.
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+        'listings.renderers.ORJSONRenderer',
+    ] + (['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
+    'DEFAULT_PARSER_CLASSES': [
+        'listings.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
@@ -244,7 +341,104 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
         'rest_framework.permissions.AllowAny',
     ],
+    # Per user (or client IP) rates for views using listings.throttling.RedisScopedRateThrottle
+    'DEFAULT_THROTTLE_RATES': {
+        'payments-initialize': os.getenv('THROTTLE_PAYMENTS_INITIALIZE', '10/min'),
+        'payments-verify': os.getenv('THROTTLE_PAYMENTS_VERIFY', '30/min'),
+        'user-signup': os.getenv('THROTTLE_USER_SIGNUP', '5/hour'),
+    },
+    # Proxies in front of the app (Render adds one). Anonymous clients are
+    # throttled by the address the last of them appended to X-Forwarded-For,
+    # not by whatever the client put there.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
 }
+if APP_PROFILE != 'lean':
+    REST_FRAMEWORK['DEFAULT_SCHEMA_CLASS'] = 'drf_spectacular.openapi.AutoSchema'
+
+# Response compression (listings.middleware.CompressionMiddleware)
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', 1024))
+RESPONSE_BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', 4))
+
+# Largest batch accepted by POST /api/bookings/bulk/
+BOOKING_BULK_MAX_ITEMS = int(os.getenv('BOOKING_BULK_MAX_ITEMS', 100))
+
+# Pending bookings hold their dates for this long before the sweeper cancels them
+BOOKING_HOLD_TTL_MINUTES = int(os.getenv('BOOKING_HOLD_TTL_MINUTES', 60))
+BOOKING_EXPIRY_BATCH_SIZE = int(os.getenv('BOOKING_EXPIRY_BATCH_SIZE', 500))
+BOOKING_EXPIRY_MAX_BATCHES = int(os.getenv('BOOKING_EXPIRY_MAX_BATCHES', 20))
+
+# Host analytics: longest range one stats request may cover, and how many past
+# days the nightly catch-up recomputes
+LISTING_STATS_MAX_DAYS = int(os.getenv('LISTING_STATS_MAX_DAYS', 731))
+LISTING_STATS_CATCHUP_DAYS = int(os.getenv('LISTING_STATS_CATCHUP_DAYS', 7))
+
+# Bulk listing import: rows validated and inserted per transaction, rejected
+# rows kept with their errors, largest upload accepted, and how long one task
+# runs before re-queuing itself to continue from its checkpoint
+LISTING_IMPORT_CHUNK_SIZE = int(os.getenv('LISTING_IMPORT_CHUNK_SIZE', 1000))
+LISTING_IMPORT_MAX_ERRORS = int(os.getenv('LISTING_IMPORT_MAX_ERRORS', 1000))
+LISTING_IMPORT_MAX_UPLOAD_MB = int(os.getenv('LISTING_IMPORT_MAX_UPLOAD_MB', 100))
+LISTING_IMPORT_TASK_SECONDS = int(os.getenv('LISTING_IMPORT_TASK_SECONDS', 600))
+
+# Similar listings: neighbors kept per listing, and rows of the similarity
+# matrix computed per block (memory grows with block size x listings)
+SIMILAR_LISTINGS_K = int(os.getenv('SIMILAR_LISTINGS_K', 10))
+SIMILAR_LISTINGS_BLOCK_SIZE = int(os.getenv('SIMILAR_LISTINGS_BLOCK_SIZE', 512))
+# Where the nightly build keeps its fitted model for the incremental refresh,
+# in the default (media) storage
+SIMILAR_LISTINGS_MODEL_PATH = os.getenv('SIMILAR_LISTINGS_MODEL_PATH', 'similarity/model.npz')
+
+# Location autocomplete: results per lookup, and the longest a process keeps
+# its prefix index if a change notification is missed
+LOCATION_AUTOCOMPLETE_LIMIT = int(os.getenv('LOCATION_AUTOCOMPLETE_LIMIT', 10))
+LOCATION_INDEX_MAX_AGE = int(os.getenv('LOCATION_INDEX_MAX_AGE', 300))
+
+# Listing facets: values returned per facet, and how long a count set is
+# cached (it is also dropped as soon as any listing changes)
+LISTING_FACET_LIMIT = int(os.getenv('LISTING_FACET_LIMIT', 50))
+LISTING_FACET_CACHE_SECONDS = int(os.getenv('LISTING_FACET_CACHE_SECONDS', 3600))
+
+# Payment status event streams: keep-alive interval and the longest a client
+# waits for a pending payment before the stream ends (seconds)
+PAYMENT_EVENTS_KEEPALIVE = int(os.getenv('PAYMENT_EVENTS_KEEPALIVE', 15))
+PAYMENT_EVENTS_TIMEOUT = int(os.getenv('PAYMENT_EVENTS_TIMEOUT', 600))
+
+# Import time a lean web worker may spend booting (manage.py bench_startup)
+STARTUP_IMPORT_BUDGET_MS = float(os.getenv('STARTUP_IMPORT_BUDGET_MS', 750))
+
+# Profiling (listings.profiling). Staff get a report by sending
+# PROFILING_HEADER; sampled profiles slower than PROFILING_SAMPLE_MIN_MS are
+# logged on listings.profiles. With no header and both rates at 0 the
+# middleware is not loaded at all.
+PROFILING_HEADER = os.getenv('PROFILING_HEADER', 'X-Profile')
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_TASK_SAMPLE_RATE = float(os.getenv('PROFILING_TASK_SAMPLE_RATE', 0))
+# Task names profiled on every run, e.g. "reverify_payments,send_bulk_emails"
+PROFILING_TASKS = [name for name in os.getenv('PROFILING_TASKS', '').split(',') if name]
+PROFILING_SAMPLE_MIN_MS = float(os.getenv('PROFILING_SAMPLE_MIN_MS', 200))
+PROFILING_TOP_FRAMES = int(os.getenv('PROFILING_TOP_FRAMES', 25))
+PROFILING_TOP_QUERIES = int(os.getenv('PROFILING_TOP_QUERIES', 10))
+PROFILING_LOCK_TIMEOUT = float(os.getenv('PROFILING_LOCK_TIMEOUT', 5))
+
+# Request/task tracing (listings.tracing): the header carrying the trace ID,
+# and where per-task queue-wait/run-time histograms are written as OTLP/JSON
+# (empty disables the export)
+TRACE_ID_HEADER = os.getenv('TRACE_ID_HEADER', 'X-Request-ID')
+TASK_METRICS_FILE = os.getenv('TASK_METRICS_FILE', os.path.join(BASE_DIR, 'logs', 'task-metrics.jsonl'))
+TASK_METRICS_EXPORT_SECONDS = int(os.getenv('TASK_METRICS_EXPORT_SECONDS', 60))
+TASK_METRICS_SERVICE_NAME = os.getenv('TASK_METRICS_SERVICE_NAME', 'alx_travel_app')
+TASK_METRICS_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 300000]
+
+# Booking notification dedup (listings.dedup): how long enqueued emails wait
+# for a newer status, and how long sent/pending markers are kept (seconds)
+NOTIFICATION_DEBOUNCE_SECONDS = int(os.getenv('NOTIFICATION_DEBOUNCE_SECONDS', 5))
+NOTIFICATION_DEDUP_TTL = int(os.getenv('NOTIFICATION_DEDUP_TTL', 600))
+
+# Availability search (listings.occupancy): listings checked per query, and
+# the default/maximum page of free listings returned by /listings/available/
+AVAILABILITY_CHUNK_SIZE = int(os.getenv('AVAILABILITY_CHUNK_SIZE', 500))
+AVAILABILITY_PAGE_SIZE = int(os.getenv('AVAILABILITY_PAGE_SIZE', 100))
+AVAILABILITY_MAX_PAGE_SIZE = int(os.getenv('AVAILABILITY_MAX_PAGE_SIZE', 1000))
 
 # Security settings
 CSRF_TRUSTED_ORIGINS = ['https://alx_travel_app.onrender.com','http://localhost:8001', 'http://127.0.0.1:8001']
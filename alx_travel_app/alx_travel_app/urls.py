@@ -14,9 +14,26 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
+from django.http import Http404
+from django.templatetags.static import static
 from django.urls import path, include
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
+from django.views.generic import RedirectView
+
+
+class SchemaRedirectView(RedirectView):
+    """
+    Redirects to the schema file build.sh generates. Its hashed URL is
+    looked up per request, since static() raises ValueError until
+    collectstatic has written a manifest entry for it.
+    """
+
+    def get_redirect_url(self, *args, **kwargs):
+        try:
+            return static(settings.OPENAPI_SCHEMA_STATIC_PATH)
+        except ValueError:
+            raise Http404('The OpenAPI schema has not been built')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -28,7 +45,16 @@ urlpatterns = [
     path('api/auth/', include('dj_rest_auth.urls')),
     path('api/auth/registration/', include('dj_rest_auth.registration.urls')),
     
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
-    path('swagger/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
-    path('redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
-]
\ No newline at end of file
+]
+
+if settings.APP_PROFILE == 'lean':
+    # The schema is generated by build.sh and served precompressed by WhiteNoise.
+    urlpatterns.append(path('api/schema/', SchemaRedirectView.as_view(), name='schema'))
+else:
+    from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
+
+    urlpatterns += [
+        path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+        path('swagger/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
+        path('redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+    ]
\ No newline at end of file
@@ -2,5 +2,14 @@
 set -o errexit
 
 pip install -r requirements.txt
+
+# The lean profile (APP_PROFILE=lean) does not load drf-spectacular, so the
+# OpenAPI schema is generated here and served as a static file; collectstatic
+# writes its .gz/.br variants.
+mkdir -p build/static/schema
+APP_PROFILE=full python manage.py spectacular --format openapi-json --file build/static/schema/openapi.json
 python manage.py collectstatic --no-input
-python manage.py migrate
\ No newline at end of file
+APP_PROFILE=full python manage.py migrate
+
+# Report worker import time against the budget; this does not fail the build.
+python manage.py bench_startup --profile "${APP_PROFILE:-lean}" || true
@@ -0,0 +1,107 @@
+"""
+Gunicorn configuration: ``gunicorn -c gunicorn.conf.py``.
+
+Everything can be overridden from the environment:
+
+GUNICORN_WORKER_CLASS   uvicorn (default), gthread or sync. uvicorn serves
+                        the ASGI app. The payment event streams (SSE)
+                        require it: under gthread or sync they answer 501
+                        and clients fall back to polling.
+WEB_CONCURRENCY         worker processes; default 2 x CPUs + 1, capped at
+                        GUNICORN_MAX_WORKERS (default 8). Under uvicorn a
+                        worker runs its sync views one at a time, so it
+                        needs as many processes as sync does.
+GUNICORN_THREADS        threads per gthread worker (default 4).
+GUNICORN_PRELOAD        load the app in the master before forking so workers
+                        share its memory copy-on-write (default 1).
+GUNICORN_MAX_REQUESTS   recycle a worker after this many requests (default
+                        1000, 0 disables), plus up to
+                        GUNICORN_MAX_REQUESTS_JITTER (default 10%) so workers
+                        do not all restart at once.
+GUNICORN_KEEPALIVE, GUNICORN_TIMEOUT, GUNICORN_GRACEFUL_TIMEOUT, PORT.
+
+``manage.py bench_server`` compares the worker classes under load.
+"""
+import gc
+import os
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'uvicorn': 'uvicorn_worker.UvicornWorker',
+}
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name) or default)
+
+
+def cpu_count():
+    """CPUs this process may use, honouring affinity and a cgroup v2 quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+worker_kind = os.environ.get('GUNICORN_WORKER_CLASS', 'uvicorn')
+if worker_kind not in WORKER_CLASSES:
+    raise RuntimeError(f'GUNICORN_WORKER_CLASS must be one of {", ".join(WORKER_CLASSES)}, not {worker_kind!r}')
+worker_class = WORKER_CLASSES[worker_kind]
+wsgi_app = 'alx_travel_app.asgi:application' if worker_kind == 'uvicorn' else 'alx_travel_app.wsgi:application'
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = _env_int('WEB_CONCURRENCY', min(cpu_count() * 2 + 1, _env_int('GUNICORN_MAX_WORKERS', 8)))
+threads = _env_int('GUNICORN_THREADS', 4) if worker_kind == 'gthread' else 1
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)
+
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+# Worker heartbeats go to a tmpfs rather than a possibly slow container disk.
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+
+def when_ready(server):
+    """Master, before the first fork: finish loading what every worker needs."""
+    if not server.cfg.preload_app:
+        return
+    from django.urls import get_resolver
+    # Import every view module now rather than on each worker's first request.
+    get_resolver().url_patterns
+    _close_connections()
+    # Objects allocated so far are never collected, so the collector does not
+    # touch (and copy) the pages the workers share with the master.
+    gc.freeze()
+
+
+def pre_fork(server, worker):
+    # Anything the master opened would otherwise be shared by every child.
+    if server.cfg.preload_app:
+        _close_connections()
+
+
+def post_fork(server, worker):
+    # Without preload Django is not set up yet; the worker starts clean.
+    if server.cfg.preload_app:
+        _close_connections()
+
+
+def _close_connections():
+    from django.core.cache import caches
+    from django.db import connections
+    connections.close_all()
+    for cache in caches.all(initialized_only=True):
+        cache.close()
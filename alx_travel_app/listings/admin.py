@@ -1,9 +1,186 @@
 from django.contrib import admin
-from .models import Payment
+from django.contrib.admin.utils import get_fields_from_path
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+from . import occupancy, rollups
+from .models import Listing, ListingImport, Booking, Review, Payment, ListingDailyStats
+from .tasks import bulk_update_booking_status, reverify_payments
+
+# Selections larger than this are split across several Celery jobs.
+ADMIN_TASK_BATCH_SIZE = 500
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses the planner's row estimate instead of COUNT(*) for unfiltered
+    changelists on large tables. Filtered or small results are counted
+    exactly.
+    """
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if not query.where:
+            estimate = self._estimated_rows(self.object_list.model._meta.db_table)
+            if estimate is not None and estimate > self.exact_count_threshold:
+                return estimate
+        return super().count
+
+    def _estimated_rows(self, table):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+            elif connection.vendor == 'mysql':
+                cursor.execute("SELECT table_rows FROM information_schema.tables "
+                               "WHERE table_schema = DATABASE() AND table_name = %s", [table])
+            elif connection.vendor == 'sqlite':
+                cursor.execute(f"SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}")
+            else:
+                return None
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] is not None else None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Base admin for tables that can grow to millions of rows: estimated
+    counts, no second full-table count, and searches restricted to
+    index-friendly lookups.
+
+    ``search_lookups`` maps a field path to the lookup used for it,
+    e.g. ``{'booking_reference': 'startswith', 'user_id__email': 'exact'}``.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_lookups = {}
+
+    def get_search_fields(self, request):
+        return tuple(self.search_lookups)
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term or not self.search_lookups:
+            return queryset, False
+
+        query = Q()
+        for path, lookup in self.search_lookups.items():
+            field = get_fields_from_path(self.model, path)[-1]
+            try:
+                value = field.to_python(search_term)
+            except ValidationError:
+                continue  # e.g. not a valid UUID for this field
+            query |= Q(**{f'{path}__{lookup}': value})
+
+        if not query:
+            return queryset.none(), False
+        return queryset.filter(query), False
+
+    def queue_in_batches(self, request, queryset, task, *args):
+        ids = [str(pk) for pk in queryset.values_list('pk', flat=True)]
+        for start in range(0, len(ids), ADMIN_TASK_BATCH_SIZE):
+            task.delay(ids[start:start + ADMIN_TASK_BATCH_SIZE], *args)
+        jobs = -(-len(ids) // ADMIN_TASK_BATCH_SIZE)
+        self.message_user(request, f"Queued {len(ids)} {self.model._meta.verbose_name_plural} in {jobs} background job(s).")
+
+
+@admin.register(Listing)
+class ListingAdmin(LargeTableAdmin):
+    list_display = ("title", "host", "city", "country", "is_active", "created_at")
+    list_filter = ("is_active",)
+    list_select_related = ("host",)
+    raw_id_fields = ("host",)
+    search_lookups = {"listing_id": "exact", "host__email": "exact"}
+    date_hierarchy = "created_at"
+    ordering = ("-created_at",)
+
+
+@admin.register(Booking)
+class BookingAdmin(LargeTableAdmin):
+    list_display = ("booking_id", "listing_id", "user_id", "start_date", "end_date", "status", "created_at")
+    list_filter = ("status",)
+    list_select_related = ("listing_id", "user_id")
+    raw_id_fields = ("listing_id", "user_id")
+    search_lookups = {"booking_id": "exact", "user_id__email": "exact"}
+    date_hierarchy = "created_at"
+    ordering = ("-created_at",)
+    actions = ["confirm_bookings", "cancel_bookings"]
+
+    @admin.action(description="Confirm selected pending bookings (background job)")
+    def confirm_bookings(self, request, queryset):
+        self.queue_in_batches(request, queryset, bulk_update_booking_status, Booking.Status.CONFIRMED)
+
+    @admin.action(description="Cancel selected bookings (background job)")
+    def cancel_bookings(self, request, queryset):
+        self.queue_in_batches(request, queryset, bulk_update_booking_status, Booking.Status.CANCELED)
+
+    def save_model(self, request, obj, form, change):
+        before = Booking.objects.get(pk=obj.pk) if change else None
+        super().save_model(request, obj, form, change)
+        if before is None:
+            occupancy.mark_booked(obj)
+            rollups.refresh_booking(obj)
+        else:
+            occupancy.rebook(before, obj)
+            rollups.refresh_bookings([before, obj])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        occupancy.rebook(obj, None)
+        rollups.refresh_booking(obj)
+
+    def delete_queryset(self, request, queryset):
+        bookings = list(queryset.filter(status__in=occupancy.BLOCKING_STATUSES))
+        super().delete_queryset(request, queryset)
+        occupancy.release_many(bookings)
+        rollups.refresh_bookings(bookings)
+
+
+@admin.register(Review)
+class ReviewAdmin(LargeTableAdmin):
+    list_display = ("review_id", "listing_id", "user_id", "rating", "created_at")
+    list_select_related = ("listing_id", "user_id")
+    raw_id_fields = ("listing_id", "user_id")
+    search_lookups = {"review_id": "exact", "user_id__email": "exact"}
+    date_hierarchy = "created_at"
+    ordering = ("-created_at",)
+
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
-    list_display = ("booking_reference", "transaction_id", "amount", "currency", "status", "created_at")
+class PaymentAdmin(LargeTableAdmin):
+    list_display = ("booking_reference", "transaction_id", "user_id", "amount", "currency", "status", "created_at")
+    list_filter = ("status",)
+    list_select_related = ("user_id",)
+    raw_id_fields = ("user_id", "booking_id")
     readonly_fields = ("created_at", "updated_at",)
-    search_fields = ("booking_reference", "transaction_id", "user__username", "user__email")
+    search_lookups = {"booking_reference": "startswith", "transaction_id": "exact", "user_id__email": "exact"}
+    date_hierarchy = "created_at"
+    ordering = ("-created_at",)
+    actions = ["reverify_selected_payments"]
+
+    @admin.action(description="Re-verify selected payments with Chapa (background job)")
+    def reverify_selected_payments(self, request, queryset):
+        self.queue_in_batches(request, queryset, reverify_payments)
+
+
+@admin.register(ListingDailyStats)
+class ListingDailyStatsAdmin(LargeTableAdmin):
+    list_display = ("listing_id", "day", "booked_nights", "revenue", "review_count", "rating_sum")
+    list_select_related = ("listing_id",)
+    raw_id_fields = ("listing_id",)
+    search_lookups = {"listing_id": "exact"}
+    date_hierarchy = "day"
+    ordering = ("-day",)
+
 
+@admin.register(ListingImport)
+class ListingImportAdmin(admin.ModelAdmin):
+    list_display = ("import_id", "host", "file_format", "status", "rows_processed", "rows_created", "rows_failed", "updated_at")
+    list_filter = ("status",)
+    list_select_related = ("host",)
+    raw_id_fields = ("host",)
+    readonly_fields = ("rows_processed", "rows_created", "rows_failed", "errors", "error", "created_at", "updated_at")
+    ordering = ("-created_at",)
@@ -0,0 +1,153 @@
+"""
+Overlap-safe booking creation.
+
+Two bookings for the same listing may not hold the same night while both
+are pending or confirmed. On PostgreSQL this is enforced by the
+``booking_no_overlap`` exclusion constraint (migration 0008). Everywhere
+the check runs inside a short transaction that first locks the listing,
+so concurrent requests for one listing are serialized while requests for
+different listings proceed in parallel.
+"""
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from .models import Booking, Listing
+
+BLOCKING_STATUSES = (Booking.Status.PENDING, Booking.Status.CONFIRMED)
+
+
+class BookingConflict(Exception):
+    """The requested dates overlap an existing booking."""
+
+
+def lock_listing(listing_id):
+    """
+    Hold a lock on the listing until the surrounding transaction ends.
+    """
+    if connection.features.has_select_for_update:
+        list(Listing.objects.select_for_update().filter(pk=listing_id).values_list('pk'))
+    else:
+        # SQLite has no row locks; a no-op UPDATE takes the database write
+        # lock, which serializes the overlap check below.
+        Listing.objects.filter(pk=listing_id).update(is_active=F('is_active'))
+
+
+def overlapping(listing_id, start_date, end_date, exclude_pk=None):
+    bookings = Booking.objects.filter(
+        status__in=BLOCKING_STATUSES,
+        start_date__lt=end_date,
+        end_date__gt=start_date,
+    )
+    if listing_id is not None:
+        bookings = bookings.filter(listing_id=listing_id)
+    if exclude_pk is not None:
+        bookings = bookings.exclude(pk=exclude_pk)
+    return bookings
+
+
+def reserve(listing_id, start_date, end_date, status=Booking.Status.PENDING, exclude_pk=None):
+    """
+    Lock the listing and make sure [start_date, end_date) is free. Call
+    inside transaction.atomic() and write the booking before it ends.
+    Raises BookingConflict.
+    """
+    lock_listing(listing_id)
+    if status in BLOCKING_STATUSES and overlapping(listing_id, start_date, end_date, exclude_pk).exists():
+        raise BookingConflict('These dates overlap an existing booking for this listing.')
+
+
+def is_overlap_violation(error):
+    return 'booking_no_overlap' in str(error)
+
+
+def create_booking(**fields):
+    """
+    Create a booking unless it overlaps an active one for the same listing.
+    Raises BookingConflict.
+    """
+    listing = fields['listing_id']
+    try:
+        with transaction.atomic():
+            reserve(getattr(listing, 'pk', listing), fields['start_date'], fields['end_date'],
+                    fields.get('status', Booking.Status.PENDING))
+            return Booking.objects.create(**fields)
+    except IntegrityError as e:
+        if is_overlap_violation(e):
+            raise BookingConflict('These dates overlap an existing booking for this listing.')
+        raise
+
+
+def create_bookings(user, items):
+    """
+    Create many bookings for ``user`` in one transaction.
+
+    ``items`` is a list of dicts with listing_id (UUID), start_date and
+    end_date. Every listing involved is locked once, existing bookings are
+    read with a single query and the accepted items are inserted with one
+    bulk_create, so the query count does not grow with the batch size.
+
+    Returns (created bookings, {item index: error message}).
+    """
+    listing_ids = sorted({item['listing_id'] for item in items}, key=str)
+    errors = {}
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            listings = {listing.pk: listing
+                        for listing in Listing.objects.select_for_update().filter(pk__in=listing_ids).order_by('pk')}
+        else:
+            Listing.objects.filter(pk__in=listing_ids).update(is_active=F('is_active'))
+            listings = Listing.objects.in_bulk(listing_ids)
+
+        taken = {}
+        if items:
+            existing = overlapping(
+                None, min(item['start_date'] for item in items), max(item['end_date'] for item in items)
+            ).filter(listing_id__in=listing_ids).values_list('listing_id', 'start_date', 'end_date')
+            for listing_id, start, end in existing:
+                taken.setdefault(listing_id, []).append((start, end))
+
+        accepted = []
+        for index, item in enumerate(items):
+            listing = listings.get(item['listing_id'])
+            if listing is None or not listing.is_active:
+                errors[index] = 'Listing not found or not active.'
+                continue
+            start, end = item['start_date'], item['end_date']
+            intervals = taken.setdefault(listing.pk, [])
+            if any(s < end and e > start for s, e in intervals):
+                errors[index] = 'These dates overlap an existing booking for this listing.'
+                continue
+            intervals.append((start, end))
+            accepted.append(Booking(listing_id=listing, user_id=user, start_date=start, end_date=end))
+
+        created = Booking.objects.bulk_create(accepted)
+    return created, errors
+
+
+# new status -> statuses a booking may move to it from
+TRANSITIONS = {
+    Booking.Status.CONFIRMED: (Booking.Status.PENDING,),
+    Booking.Status.CANCELED: (Booking.Status.PENDING, Booking.Status.CONFIRMED),
+}
+
+
+def set_status(bookings, new_status, skip_locked=False):
+    """
+    Move the bookings in ``bookings`` that are allowed to (TRANSITIONS) to
+    ``new_status``. The rows are locked while they are read and updated,
+    and the UPDATE repeats the status condition. A booking that changed
+    concurrently is therefore left alone. With ``skip_locked``, rows
+    another transaction holds are passed over. Returns the ids of the
+    bookings that actually changed.
+    """
+    allowed = TRANSITIONS[new_status]
+    with transaction.atomic():
+        candidates = [pk for pk, current in bookings.select_for_update(skip_locked=skip_locked)
+                      .values_list('booking_id', 'status') if current in allowed]
+        if not candidates:
+            return []
+        updated = Booking.objects.filter(booking_id__in=candidates, status__in=allowed).update(status=new_status)
+        if updated != len(candidates):
+            # Without row locks (SQLite) a candidate may have moved on; keep the ones this UPDATE changed.
+            candidates = list(Booking.objects.filter(booking_id__in=candidates, status=new_status)
+                              .values_list('booking_id', flat=True))
+    return candidates
@@ -0,0 +1,80 @@
+"""
+Cross-process "listings changed" notifications.
+
+Every Listing save or delete bumps a version stamp in Redis and publishes
+it on LISTINGS_CHANNEL. Per-process caches (the location index) subscribe
+to the channel and drop their copy; shared caches (facet counts) put the
+version in their keys. When Redis is unreachable the stamp is kept per
+process, so a single process still sees its own writes.
+"""
+import logging
+import threading
+import time
+
+from redis.exceptions import RedisError
+from .redis_client import get_client
+
+logger = logging.getLogger(__name__)
+
+LISTINGS_VERSION_KEY = 'listings:version'
+LISTINGS_CHANNEL = 'listings:changed'
+
+_local_version = 0
+_listeners = []
+_subscriber = None
+_subscriber_lock = threading.Lock()
+
+
+def current_version():
+    """The latest listings version, as a string usable in cache keys."""
+    try:
+        return f"r{int(get_client().get(LISTINGS_VERSION_KEY) or 0)}"
+    except RedisError:
+        return f"l{_local_version}"
+
+
+def bump_version():
+    """Record that listings changed and tell every process."""
+    global _local_version
+    _local_version += 1
+    try:
+        client = get_client()
+        client.publish(LISTINGS_CHANNEL, client.incr(LISTINGS_VERSION_KEY))
+    except RedisError as e:
+        logger.warning("Could not publish listings version: %s", e)
+    _notify()
+
+
+def _notify():
+    for callback in list(_listeners):
+        callback()
+
+
+def _listen():
+    backoff = 1
+    while True:
+        try:
+            pubsub = get_client().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(LISTINGS_CHANNEL)
+            # Changes may have been missed while disconnected.
+            _notify()
+            backoff = 1
+            for _ in pubsub.listen():
+                _notify()
+        except RedisError:
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+
+def subscribe(callback):
+    """
+    Call ``callback()`` whenever listings change, in this or any other
+    process. Starts the subscriber thread on first use.
+    """
+    global _subscriber
+    if callback not in _listeners:
+        _listeners.append(callback)
+    with _subscriber_lock:
+        if _subscriber is None or not _subscriber.is_alive():
+            _subscriber = threading.Thread(target=_listen, name='listings-changes', daemon=True)
+            _subscriber.start()
@@ -0,0 +1,102 @@
+"""
+Payment verification against Chapa's verify API.
+
+verify_with_chapa() is used by the verify endpoint and by the admin's
+re-verify job, so a payment is only marked successful after the same
+checks in both: Chapa's tx_ref must be the payment's booking reference,
+its amount must equal the payment's, and the transaction must be reported
+successful.
+"""
+import logging
+from decimal import Decimal, InvalidOperation
+
+import requests
+from django.conf import settings
+from . import payment_events, rollups
+
+logger = logging.getLogger(__name__)
+# Full gateway responses; sampled and truncated by the logging config.
+payload_logger = logging.getLogger("listings.payloads")
+
+SUCCESSFUL = 'successful'
+MISMATCH = 'mismatch'
+FAILED = 'failed'
+
+
+def _amount_matches(payment, chapa_amount):
+    if chapa_amount is None:
+        return True
+    try:
+        chapa_amount = Decimal(str(chapa_amount))
+    except (InvalidOperation, TypeError) as e:
+        logger.warning("Could not parse chapa amount: %s", e)
+        return False
+    if chapa_amount != payment.amount:
+        logger.warning("amount mismatch for %s: local=%s chapa=%s",
+                       payment.booking_reference, payment.amount, chapa_amount)
+        return False
+    return True
+
+
+def verify_with_chapa(payment):
+    """
+    Verify ``payment`` with Chapa and mark it successful or failed.
+
+    Returns (outcome, Chapa's response data). The outcome is SUCCESSFUL,
+    MISMATCH when Chapa's tx_ref is not the payment's (the payment is
+    marked failed), or FAILED for any other answer, including a differing
+    amount. A successful payment's rollups, event and confirmation email
+    are taken care of. Raises requests.RequestException if Chapa cannot be
+    reached and ValueError if it does not answer with JSON, leaving the
+    payment as it was.
+    """
+    tx_ref = payment.booking_reference
+    headers = {"Authorization": f"Bearer {settings.CHAPA_SECRET_KEY}"}
+    try:
+        resp = requests.get(f"{settings.CHAPA_VERIFY_URL}{tx_ref}", headers=headers, timeout=15)
+        resp.raise_for_status()
+    except requests.RequestException as e:
+        logger.error("Failed to call Chapa verify: %s", str(e))
+        raise
+
+    try:
+        resp_data = resp.json()
+    except ValueError:
+        logger.error("Invalid JSON from Chapa for %s", tx_ref, extra={"payload": resp.text})
+        raise
+
+    payload_logger.info("Chapa verify response for %s", tx_ref, extra={"payload": resp.text})
+
+    chapa_status = (resp_data.get("status") or "").lower()
+    chapa_data = resp_data.get("data") or {}
+
+    chapa_tx_ref = chapa_data.get("tx_ref") or chapa_data.get("reference") or chapa_data.get("id")
+    if str(chapa_tx_ref) != str(tx_ref):
+        logger.warning("tx_ref mismatch: local=%s chapa=%s", tx_ref, chapa_tx_ref)
+        payment.status = "failed"
+        payment.save(update_fields=["status", "updated_at"])
+        payment_events.publish(payment)
+        return MISMATCH, resp_data
+
+    message = (resp_data.get("message") or "").lower()
+    success_by_message = "successful" in message or "success" in message
+    chapa_data_status = (chapa_data.get("status") or "").lower()
+    is_success = (chapa_status == "success") or (chapa_data_status in ("success", "completed")) or success_by_message
+
+    payment.transaction_id = chapa_data.get("reference") or chapa_data.get("id") or chapa_data.get("tx_ref") or payment.transaction_id
+    if is_success and _amount_matches(payment, chapa_data.get("amount")):
+        payment.mark_successful()
+        payment.save(update_fields=["status", "paid_at", "transaction_id", "updated_at"])
+        rollups.refresh_payment(payment)
+        payment_events.publish(payment)
+        try:
+            from .tasks import send_payment_confirmation_email
+            send_payment_confirmation_email.delay(payment.id)
+        except Exception as e:
+            logger.error("Failed to queue email task: %s", e)
+        return SUCCESSFUL, resp_data
+
+    payment.status = "failed"
+    payment.save(update_fields=["status", "transaction_id", "updated_at"])
+    payment_events.publish(payment)
+    return FAILED, resp_data
@@ -0,0 +1,142 @@
+"""
+Deduplicated, debounced booking notifications.
+
+Notification tasks use DebouncedTask as their Celery base. Their first
+argument is a booking id (or a list of ids), and the second, if they have
+one, is the booking status the email is about. Enqueueing such a task
+(``.delay()``/``.apply_async()``) does, per booking:
+
+- ``SET notify:<kind>:<booking>:latest <status> EX ttl``: the status the
+  guest should hear about.
+- ``SET notify:<kind>:<booking>:pending 1 NX EX ttl``: if a task for this
+  booking is already waiting, the booking is dropped from this one. If
+  queueing the task then fails, its pending markers are deleted again.
+
+Tasks are queued NOTIFICATION_DEBOUNCE_SECONDS in the future. When one
+runs it sends the *latest* status, not the one it was queued with, and
+skips bookings whose latest status was already sent. So double clicks
+and client retries send one email, and a confirm quickly followed by a
+cancel only sends the cancellation.
+
+When Redis is unreachable every task is queued and sent as before.
+"""
+import logging
+
+from celery import Task
+from django.conf import settings
+from redis.exceptions import RedisError
+from .redis_client import get_client
+
+logger = logging.getLogger(__name__)
+
+# Status recorded for notifications that are not about a status change.
+CREATED = 'created'
+
+
+def _key(kind, booking_id, suffix):
+    return f'notify:{kind}:{booking_id}:{suffix}'
+
+
+def claim(kind, statuses):
+    """
+    Record the latest status of each booking in ``statuses`` ({booking id:
+    status}) and return the ids that have no task waiting yet.
+    """
+    ttl = settings.NOTIFICATION_DEDUP_TTL
+    pipe = get_client().pipeline(transaction=False)
+    for booking_id, status in statuses.items():
+        pipe.set(_key(kind, booking_id, 'latest'), status, ex=ttl)
+        pipe.set(_key(kind, booking_id, 'pending'), 1, nx=True, ex=ttl)
+    results = pipe.execute()
+    return [booking_id for booking_id, claimed in zip(statuses, results[1::2]) if claimed]
+
+
+def unclaim(kind, booking_ids):
+    """Drop the pending markers claim() set, for a task that was never queued."""
+    try:
+        pipe = get_client().pipeline(transaction=False)
+        for booking_id in booking_ids:
+            pipe.delete(_key(kind, booking_id, 'pending'))
+        pipe.execute()
+    except RedisError as e:
+        logger.warning("Could not release notification claims: %s", e)
+
+
+def resolve(kind, statuses):
+    """
+    {booking id: status to send} for a running task: each booking's latest
+    status, leaving out bookings whose latest status was already sent.
+    Falls back to ``statuses`` when Redis is unreachable.
+    """
+    try:
+        pipe = get_client().pipeline(transaction=False)
+        for booking_id in statuses:
+            pipe.get(_key(kind, booking_id, 'latest'))
+            pipe.get(_key(kind, booking_id, 'sent'))
+            pipe.delete(_key(kind, booking_id, 'pending'))
+        results = pipe.execute()
+    except RedisError as e:
+        logger.warning("Could not check notification state: %s", e)
+        return dict(statuses)
+    resolved = {}
+    for index, (booking_id, status) in enumerate(statuses.items()):
+        latest, sent = results[index * 3], results[index * 3 + 1]
+        latest = latest.decode() if latest else status
+        if sent is None or sent.decode() != latest:
+            resolved[booking_id] = latest
+    return resolved
+
+
+def mark_sent(kind, statuses):
+    try:
+        pipe = get_client().pipeline(transaction=False)
+        for booking_id, status in statuses.items():
+            pipe.set(_key(kind, booking_id, 'sent'), status, ex=settings.NOTIFICATION_DEDUP_TTL)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning("Could not record sent notifications: %s", e)
+
+
+class DebouncedTask(Task):
+    """
+    Celery base for booking notification tasks; see the module docstring.
+
+    ``delay()``/``apply_async()`` return None instead of an AsyncResult when
+    every booking already has a task waiting, i.e. nothing was queued.
+    """
+
+    # Tasks sending the same emails share a kind (and so their dedup keys).
+    notification_kind = None
+
+    def notification_statuses(self, args):
+        """{booking id: status} from the task's positional arguments."""
+        booking_ids = args[0] if isinstance(args[0], (list, tuple)) else [args[0]]
+        status = str(args[1]) if len(args) > 1 else CREATED
+        return {str(booking_id): status for booking_id in booking_ids}
+
+    def apply_async(self, args=None, kwargs=None, **options):
+        # Retries (and anything queued with its own schedule) go straight through.
+        if not args or options.get('retries') or 'countdown' in options or 'eta' in options:
+            return super().apply_async(args, kwargs, **options)
+        statuses = self.notification_statuses(args)
+        try:
+            claimed = claim(self.notification_kind, statuses)
+        except RedisError as e:
+            logger.warning("Could not deduplicate %s: %s", self.name, e)
+            return super().apply_async(args, kwargs, **options)
+        if not claimed:
+            return None
+        if isinstance(args[0], (list, tuple)):
+            args = (claimed, *args[1:])
+        try:
+            return super().apply_async(args, kwargs, countdown=settings.NOTIFICATION_DEBOUNCE_SECONDS, **options)
+        except Exception:
+            # Otherwise these bookings' notifications would be dropped until the claims expire.
+            unclaim(self.notification_kind, claimed)
+            raise
+
+    def resolve_statuses(self, args):
+        return resolve(self.notification_kind, self.notification_statuses(args))
+
+    def mark_sent(self, statuses):
+        mark_sent(self.notification_kind, statuses)
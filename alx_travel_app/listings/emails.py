@@ -0,0 +1,42 @@
+"""
+Email rendering.
+
+Every email is a pair of templates, listings/<name>.txt and
+listings/<name>.html. The plain-text part is rendered from its own
+template instead of running strip_tags over the HTML. Both compiled
+templates are kept per process, so a worker looks them up once rather
+than on every message. render_many() renders one email for many contexts
+through a single reused Context.
+"""
+from django.conf import settings
+from django.template import Context
+from django.template.loader import get_template
+
+_compiled = {}
+
+
+def _templates(name):
+    templates = _compiled.get(name)
+    if templates is None:
+        templates = tuple(get_template(f'listings/{name}.{extension}').template for extension in ('txt', 'html'))
+        # While developing, templates are looked up each time so edits show up.
+        if not settings.DEBUG:
+            _compiled[name] = templates
+    return templates
+
+
+def render_many(name, contexts):
+    """[(plain text, HTML), ...] for the email ``name``, one per context dict."""
+    text_template, html_template = _templates(name)
+    # The text templates turn autoescaping off themselves.
+    context = Context(autoescape=True)
+    rendered = []
+    for values in contexts:
+        with context.push(values):
+            rendered.append((text_template.render(context), html_template.render(context)))
+    return rendered
+
+
+def render(name, context):
+    """(plain text, HTML) for one email."""
+    return render_many(name, [context])[0]
@@ -0,0 +1,111 @@
+"""
+Streaming CSV/NDJSON exports of bookings and payments.
+
+Rows are read with values_list().iterator(chunk_size=...) (a server-side
+cursor where the database supports it) and encoded one at a time, so
+memory use does not grow with the number of rows exported.
+"""
+import csv
+import datetime
+
+import orjson
+from django.utils.dateparse import parse_date
+from .models import Booking, Payment
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# dataset -> (model, [(column header, values() lookup)])
+DATASETS = {
+    'bookings': (Booking, [
+        ('booking_id', 'booking_id'),
+        ('listing_id', 'listing_id'),
+        ('listing_title', 'listing_id__title'),
+        ('user_id', 'user_id'),
+        ('user_email', 'user_id__email'),
+        ('start_date', 'start_date'),
+        ('end_date', 'end_date'),
+        ('status', 'status'),
+        ('created_at', 'created_at'),
+    ]),
+    'payments': (Payment, [
+        ('id', 'id'),
+        ('booking_reference', 'booking_reference'),
+        ('booking_id', 'booking_id'),
+        ('transaction_id', 'transaction_id'),
+        ('user_email', 'user_id__email'),
+        ('amount', 'amount'),
+        ('currency', 'currency'),
+        ('status', 'status'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ]),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _parse_day(value, name):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f'{name} must be a date in YYYY-MM-DD format')
+    return day
+
+
+def filter_export(queryset, status=None, since=None, until=None):
+    """
+    Apply the export filters. ``since``/``until`` are inclusive
+    YYYY-MM-DD strings matched against ``created_at``.
+    Raises ValueError for malformed dates.
+    """
+    if status:
+        queryset = queryset.filter(status=status)
+    if since:
+        queryset = queryset.filter(created_at__date__gte=_parse_day(since, 'since'))
+    if until:
+        queryset = queryset.filter(created_at__date__lte=_parse_day(until, 'until'))
+    return queryset
+
+
+def export_rows(dataset, queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    _, columns = DATASETS[dataset]
+    lookups = [lookup for _, lookup in columns]
+    return queryset.order_by('created_at').values_list(*lookups).iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """File-like object whose write() hands back what it was given."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, datetime.datetime) else value
+
+
+def stream_csv(headers, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def stream_ndjson(headers, rows):
+    for row in rows:
+        # default=str keeps Decimal amounts exact.
+        yield orjson.dumps(dict(zip(headers, row)), default=str, option=orjson.OPT_UTC_Z) + b'\n'
+
+
+def stream_export(dataset, file_format, queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the encoded export of ``queryset`` chunk by chunk.
+    """
+    _, columns = DATASETS[dataset]
+    headers = [header for header, _ in columns]
+    rows = export_rows(dataset, queryset, chunk_size)
+    if file_format == 'csv':
+        return stream_csv(headers, rows)
+    return stream_ndjson(headers, rows)
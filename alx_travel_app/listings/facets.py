@@ -0,0 +1,97 @@
+"""
+Faceted filtering for listings.
+
+``?country=``, ``?state=``, ``?city=`` and ``?is_active=`` filter the
+listing list; repeat a parameter to match any of several values. Facet
+counts follow the usual disjunctive rule: each facet is counted with
+every other filter applied but not its own, so the options next to a
+selected value keep their counts.
+
+Counts cost one GROUP BY per facet. They are cached under the current
+listings version (listings.changes), so any listing save invalidates
+every cached combination at once and a request costs at most
+len(FACET_FIELDS) aggregate queries, usually none. While the Redis cache
+is unreachable (or skipped by listings.redis_client's breaker) counts are
+computed without caching.
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from redis.exceptions import RedisError
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from . import changes
+
+FACET_FIELDS = ('country', 'state', 'city', 'is_active')
+BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+logger = logging.getLogger(__name__)
+
+
+def parse_filters(params):
+    """{field: [values]} from query params. Raises ValueError for a bad is_active."""
+    filters = {}
+    for field in FACET_FIELDS:
+        values = [value for value in params.getlist(field) if value != '']
+        if not values:
+            continue
+        if field == 'is_active':
+            try:
+                values = [BOOLEAN_VALUES[value.lower()] for value in values]
+            except KeyError:
+                raise ValueError('is_active must be true or false')
+        filters[field] = sorted(set(values))
+    return filters
+
+
+def apply_filters(queryset, filters, skip=None):
+    for field, values in filters.items():
+        if field != skip:
+            queryset = queryset.filter(**{f'{field}__in': values})
+    return queryset
+
+
+def _cache_key(filters, limit):
+    digest = hashlib.blake2b(json.dumps([filters, limit], sort_keys=True).encode(), digest_size=12).hexdigest()
+    return f'listing-facets:{changes.current_version()}:{digest}'
+
+
+def facet_counts(queryset, filters, limit=None):
+    """
+    {field: [{'value': ..., 'count': ...}, ...]} for the listings in
+    ``queryset``, at most ``limit`` values per facet, largest first.
+    """
+    limit = limit or settings.LISTING_FACET_LIMIT
+    key = _cache_key(filters, limit)
+    try:
+        counts = cache.get(key)
+    except RedisError as e:
+        logger.warning("Facet cache read skipped: %s", e)
+        key, counts = None, None
+    if counts is None:
+        counts = {}
+        for field in FACET_FIELDS:
+            grouped = (apply_filters(queryset, filters, skip=field).order_by()
+                       .values(field).annotate(count=Count('pk')).order_by('-count', field)[:limit])
+            counts[field] = [{'value': row[field], 'count': row['count']} for row in grouped]
+        if key is not None:
+            try:
+                cache.set(key, counts, settings.LISTING_FACET_CACHE_SECONDS)
+            except RedisError as e:
+                logger.warning("Facet cache write skipped: %s", e)
+    return counts
+
+
+class FacetFilterBackend(BaseFilterBackend):
+    """DRF filter backend for the facet fields."""
+
+    def filter_queryset(self, request, queryset, view):
+        try:
+            filters = parse_filters(request.query_params)
+        except ValueError as e:
+            raise ValidationError({'is_active': str(e)})
+        return apply_filters(queryset, filters)
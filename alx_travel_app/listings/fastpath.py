@@ -0,0 +1,141 @@
+"""
+Read-only fast path for list endpoints.
+
+ModelSerializer builds a model instance per row and then walks every field
+through get_attribute()/to_representation(). For plain list responses we
+can instead fetch ``.values_list()`` tuples and convert each column with a
+mapper compiled once from the serializer's own field definitions, so the
+output stays identical to the serializer while skipping most of the work.
+"""
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+
+def _identity(value):
+    return value
+
+
+def _datetime_mapper(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+
+    field_timezone = getattr(field, 'timezone', None) or field.default_timezone()
+
+    def to_iso(value):
+        if not value:
+            return None
+        if field_timezone is not None and timezone.is_aware(value):
+            value = value.astimezone(field_timezone)
+        else:
+            value = field.enforce_timezone(value)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    return to_iso
+
+
+def _uuid_mapper(field):
+    return str if field.uuid_format == 'hex_verbose' else field.to_representation
+
+
+def _related_mapper(field):
+    # values_list() already yields the related pk.
+    return _identity if field.pk_field is None else field.pk_field.to_representation
+
+
+# Serializer field type -> factory returning a cheap value converter.
+MAPPER_FACTORIES = {
+    serializers.CharField: lambda field: str,
+    serializers.EmailField: lambda field: str,
+    serializers.IntegerField: lambda field: int,
+    serializers.BooleanField: lambda field: field.to_representation,
+    serializers.UUIDField: _uuid_mapper,
+    serializers.DateTimeField: _datetime_mapper,
+    serializers.ReadOnlyField: lambda field: _identity,
+    serializers.PrimaryKeyRelatedField: _related_mapper,
+}
+
+
+def orm_path(model, source_attrs):
+    """
+    Translate a DRF dotted source ('host.user_id') into a values() lookup
+    ('host__user_id'), or None if the model has no such attribute.
+    """
+    opts = model._meta
+    for index, attr in enumerate(source_attrs):
+        try:
+            model_field = opts.get_field(attr)
+        except FieldDoesNotExist:
+            if hasattr(opts.model, attr):
+                raise ImproperlyConfigured(
+                    f'{opts.object_name}.{attr} is not a model field and cannot be read with values()')
+            return None
+        if index < len(source_attrs) - 1:
+            if not model_field.is_relation:
+                return None
+            opts = model_field.related_model._meta
+    return '__'.join(source_attrs)
+
+
+class ValuesSerializer:
+    """
+    Serializes a queryset the same way ``serializer_class(queryset, many=True).data``
+    would, using values_list() tuples instead of model instances.
+    """
+
+    def __init__(self, serializer_class, context=None):
+        serializer = serializer_class(context=context or {})
+        model = serializer.Meta.model
+
+        # Nested (expanded) serializers need model instances.
+        self.supported = not any(isinstance(field, serializers.BaseSerializer)
+                                 for field in serializer._readable_fields)
+
+        self.names, self.columns, self.mappers = [], [], []
+        for field in serializer._readable_fields:
+            if not self.supported:
+                break
+            path = orm_path(model, field.source_attrs)
+            if path is None:
+                # DRF raises SkipField for read-only sources the model lacks.
+                continue
+            factory = MAPPER_FACTORIES.get(type(field))
+            mapper = factory(field) if factory else field.to_representation
+            self.names.append(field.field_name)
+            self.columns.append(path)
+            self.mappers.append(mapper)
+
+    def serialize(self, queryset):
+        names = self.names
+        mappers = list(enumerate(self.mappers))
+        rows = queryset.values_list(*self.columns)
+        return [
+            dict(zip(names, [None if row[i] is None else mapper(row[i]) for i, mapper in mappers]))
+            for row in rows.iterator(chunk_size=2000)
+        ]
+
+
+class FastListMixin:
+    """
+    ViewSet mixin that serves unpaginated list responses through
+    ValuesSerializer. Anything else falls back to the regular serializer.
+    """
+
+    def fast_list_response(self, queryset):
+        serializer_class = self.get_serializer_class()
+        values_serializer = ValuesSerializer(serializer_class, self.get_serializer_context())
+        if not values_serializer.supported:
+            return Response(self.get_serializer(queryset, many=True).data)
+        return Response(values_serializer.serialize(queryset))
+
+    def list(self, request, *args, **kwargs):
+        if self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.fast_list_response(queryset)
@@ -0,0 +1,162 @@
+"""
+Streaming bulk import of listings from CSV or NDJSON.
+
+A ListingImport holds the uploaded file, the host the listings are created
+for, and the import's progress. run() reads the file one row at a time.
+It validates LISTING_IMPORT_CHUNK_SIZE rows at once with a single reused
+serializer, then inserts the chunk's valid rows with bulk_create. Each
+chunk is one transaction. The import's counters, including the checkpoint
+``rows_processed``, are saved in that same transaction. An interrupted
+import therefore resumes after its last committed chunk, without
+duplicating or skipping listings.
+
+Rows are numbered from 1, not counting the CSV header. Invalid rows are
+skipped. The first LISTING_IMPORT_MAX_ERRORS of them are kept with their
+row number and errors.
+
+bulk_create does not send post_save, so each committed chunk bumps the
+listings version itself (listings.changes).
+"""
+import csv
+import io
+import logging
+import os
+import time
+from itertools import islice
+
+import orjson
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from . import changes
+from .models import Listing, ListingImport
+from .serializers import ListingImportRowSerializer
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+EXTENSIONS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+def format_of(filename):
+    """The import format implied by a file name, or None."""
+    return EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+
+def _row_error(message):
+    return {'non_field_errors': [message]}
+
+
+def _plain(detail):
+    """A ValidationError's detail as plain dicts, lists and strings."""
+    if isinstance(detail, dict):
+        return {field: _plain(value) for field, value in detail.items()}
+    if isinstance(detail, list):
+        return [_plain(value) for value in detail]
+    return str(detail)
+
+
+def read_rows(f, file_format):
+    """
+    Yield (row number, row dict, None), or (row number, None, errors) for
+    rows that could not be parsed, from a binary file.
+    """
+    if file_format == 'csv':
+        text = io.TextIOWrapper(f, encoding='utf-8-sig', newline='')
+        for number, row in enumerate(csv.DictReader(text), 1):
+            if None in row:  # DictReader files surplus values under None
+                yield number, None, _row_error('Row has more values than the header has columns.')
+            else:
+                yield number, row, None
+        return
+    number = 0
+    for line in f:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield number, None, _row_error(f'Invalid JSON: {e}')
+            continue
+        if isinstance(row, dict):
+            yield number, row, None
+        else:
+            yield number, None, _row_error('Expected a JSON object.')
+
+
+def validate_chunk(serializer, rows):
+    """([validated data], [{'row': n, 'errors': ...}]) for a chunk of read_rows() output."""
+    valid, errors = [], []
+    for number, row, row_errors in rows:
+        if row_errors is None:
+            try:
+                valid.append(serializer.run_validation(row))
+                continue
+            except ValidationError as e:
+                row_errors = _plain(e.detail)
+        errors.append({'row': number, 'errors': row_errors})
+    return valid, errors
+
+
+def _commit_chunk(listing_import, valid, errors, last_row):
+    """
+    Insert a chunk and move the checkpoint past it. Returns False, without
+    writing anything, when another run has moved the checkpoint meanwhile.
+    """
+    with transaction.atomic():
+        checkpoint = (ListingImport.objects.select_for_update()
+                      .values_list('rows_processed', flat=True).get(pk=listing_import.pk))
+        if checkpoint != listing_import.rows_processed:
+            return False
+        Listing.objects.bulk_create([Listing(host_id=listing_import.host_id, **data) for data in valid],
+                                    batch_size=settings.LISTING_IMPORT_CHUNK_SIZE)
+        listing_import.rows_processed = last_row
+        listing_import.rows_created += len(valid)
+        listing_import.rows_failed += len(errors)
+        room = settings.LISTING_IMPORT_MAX_ERRORS - len(listing_import.errors)
+        listing_import.errors.extend(errors[:max(room, 0)])
+        listing_import.save(update_fields=['rows_processed', 'rows_created', 'rows_failed', 'errors', 'updated_at'])
+        if valid:
+            transaction.on_commit(changes.bump_version)
+    return True
+
+
+def _finish(listing_import, status, error=''):
+    listing_import.status = status
+    listing_import.error = error
+    listing_import.save(update_fields=['status', 'error', 'updated_at'])
+
+
+def run(listing_import, deadline=None, progress=None):
+    """
+    Import from the checkpoint on, calling ``progress(listing_import)``
+    after each chunk. Stops early once past ``deadline`` (a time.monotonic()
+    value). Returns True if it stopped there with rows left to import.
+    Unexpected errors mark the import FAILED and are re-raised.
+    """
+    _finish(listing_import, ListingImport.Status.RUNNING)
+    serializer = ListingImportRowSerializer()
+    try:
+        with listing_import.source.open('rb') as f:
+            rows = islice(read_rows(f, listing_import.file_format), listing_import.rows_processed, None)
+            while chunk := list(islice(rows, settings.LISTING_IMPORT_CHUNK_SIZE)):
+                valid, errors = validate_chunk(serializer, chunk)
+                if not _commit_chunk(listing_import, valid, errors, chunk[-1][0]):
+                    logger.warning("Import %s is being run elsewhere; stopping", listing_import.pk)
+                    return False
+                if progress is not None:
+                    progress(listing_import)
+                if deadline is not None and time.monotonic() > deadline:
+                    return True
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        logger.warning("Import %s failed after row %s: %s", listing_import.pk, listing_import.rows_processed, e)
+        _finish(listing_import, ListingImport.Status.FAILED, f'After row {listing_import.rows_processed}: {e}')
+        return False
+    except Exception as e:
+        logger.exception("Import %s failed after row %s", listing_import.pk, listing_import.rows_processed)
+        _finish(listing_import, ListingImport.Status.FAILED,
+                f'After row {listing_import.rows_processed}: {e.__class__.__name__}: {e}')
+        raise
+    _finish(listing_import, ListingImport.Status.COMPLETED)
+    return False
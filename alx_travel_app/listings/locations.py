@@ -0,0 +1,105 @@
+"""
+In-memory prefix index of listing locations for autocomplete.
+
+Each process keeps a sorted array of the distinct cities and countries of
+active listings, with listing counts. A prefix lookup is two bisects over
+the keys plus a top-N by count, so no database query is made. The index
+is built on first use and rebuilt lazily after listings change (see
+listings.changes), or after LOCATION_INDEX_MAX_AGE seconds in case a
+notification was missed.
+"""
+import heapq
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.models import Count
+from . import changes
+from .models import Listing
+
+# Results for prefixes this short cover most of the index, so they are memoised.
+MEMO_PREFIX_LENGTH = 2
+
+
+def normalize(text):
+    """Case- and accent-insensitive search key: 'São Paulo' -> 'sao paulo'."""
+    decomposed = unicodedata.normalize('NFKD', text.strip().casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+class LocationIndex:
+    def __init__(self, entries):
+        """``entries`` is an iterable of (search key, count, result dict)."""
+        entries = sorted(entries, key=lambda entry: entry[0])
+        self.keys = [key for key, _, _ in entries]
+        self.counts = [count for _, count, _ in entries]
+        self.results = [result for _, _, result in entries]
+        self.built_at = time.monotonic()
+        self._memo = {}
+
+    @classmethod
+    def build(cls):
+        active = Listing.objects.filter(is_active=True).exclude(city='').order_by()
+        entries = [
+            (normalize(row['city']), row['count'],
+             {'type': 'city', 'city': row['city'], 'country': row['country'], 'count': row['count']})
+            for row in active.values('city', 'country').annotate(count=Count('pk'))
+        ]
+        entries += [
+            (normalize(row['country']), row['count'],
+             {'type': 'country', 'country': row['country'], 'count': row['count']})
+            for row in Listing.objects.filter(is_active=True).exclude(country='').order_by()
+            .values('country').annotate(count=Count('pk'))
+        ]
+        return cls(entries)
+
+    def search(self, prefix, limit=10):
+        """The ``limit`` locations starting with ``prefix``, most listings first."""
+        key = normalize(prefix)
+        if not key:
+            return []
+        memo_key = (key, limit) if len(key) <= MEMO_PREFIX_LENGTH else None
+        if memo_key in self._memo:
+            return self._memo[memo_key]
+
+        lo = bisect_left(self.keys, key)
+        hi = bisect_left(self.keys, key + '\uffff', lo)
+        best = heapq.nsmallest(limit, range(lo, hi), key=lambda i: (-self.counts[i], self.keys[i]))
+        results = [self.results[i] for i in best]
+        if memo_key is not None:
+            self._memo[memo_key] = results
+        return results
+
+    def __len__(self):
+        return len(self.keys)
+
+
+_index = None
+_stale = True
+_lock = threading.Lock()
+
+
+def _mark_stale():
+    global _stale
+    _stale = True
+
+
+def get_index():
+    """This process's index, (re)built if listings changed since it was built."""
+    global _index, _stale
+    index = _index
+    if index is not None and not _stale and time.monotonic() - index.built_at < settings.LOCATION_INDEX_MAX_AGE:
+        return index
+    with _lock:
+        if _index is None or _stale or time.monotonic() - _index.built_at >= settings.LOCATION_INDEX_MAX_AGE:
+            changes.subscribe(_mark_stale)
+            # Cleared before the build so a change during it triggers another.
+            _stale = False
+            _index = LocationIndex.build()
+        return _index
+
+
+def search(prefix, limit=None):
+    return get_index().search(prefix, limit or settings.LOCATION_AUTOCOMPLETE_LIMIT)
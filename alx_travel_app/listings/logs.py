@@ -0,0 +1,254 @@
+"""
+Logging pipeline: a non-blocking queue handler, JSON records, a
+multi-process-safe rotating file and per-logger sampling.
+
+With LOG_MODE=queue (the default) loggers only put records on an
+in-memory queue. A listener thread in each process formats them and does
+the file and console I/O, so request threads never wait on disk. The
+listener is restarted in forked children (gunicorn and Celery prefork
+workers). Every process writes to the same file and rotation happens
+under a file lock, so the processes do not clobber each other's output.
+
+Gateway payloads are logged on the ``listings.payloads`` logger with the
+body in ``extra={'payload': ...}``. LOG_SAMPLE_RATES keeps a fraction of
+such records, and the JSON formatter truncates the payload.
+
+This module is imported while settings are configured, so it must not
+import Django models.
+"""
+import atexit
+import copy
+import fcntl
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
+
+# Attributes every LogRecord has; anything else on a record came from ``extra``.
+RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line with the standard fields plus any ``extra``."""
+
+    def __init__(self, max_payload_chars=2000, **kwargs):
+        super().__init__(**kwargs)
+        self.max_payload_chars = max_payload_chars
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        payload = entry.get('payload')
+        if isinstance(payload, str) and len(payload) > self.max_payload_chars:
+            entry['payload'] = payload[:self.max_payload_chars]
+            entry['payload_truncated'] = len(payload)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a share of the records from some loggers, e.g.
+    ``{'listings.payloads': 0.05}``. Warnings and errors are always kept.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.name)
+        return rate is None or random.random() < rate
+
+
+class ProcessSafeRotatingFileHandler(logging.FileHandler):
+    """
+    Rotates when the file passes ``max_bytes`` or ``interval`` seconds after
+    the last rotation, whichever comes first. Each write takes an exclusive
+    lock on ``<filename>.lock`` (which also records the last rotation
+    time) and reopens the file if another process rotated it.
+    """
+
+    def __init__(self, filename, max_bytes=0, interval=0, backup_count=5, encoding='utf-8'):
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.backup_count = backup_count
+        self.lock_path = f'{os.path.abspath(filename)}.lock'
+        super().__init__(filename, mode='a', encoding=encoding, delay=True)
+
+    def emit(self, record):
+        try:
+            message = self.format(record) + self.terminator
+            with open(self.lock_path, 'a+') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._reopen_if_rotated()
+                if self._should_rotate(lock, len(message.encode(self.encoding or 'utf-8'))):
+                    self._rotate(lock)
+                if self.stream is None:
+                    self.stream = self._open()
+                self.stream.write(message)
+                self.stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def _reopen_if_rotated(self):
+        if self.stream is None:
+            return
+        try:
+            current = os.stat(self.baseFilename).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(self.stream.fileno()).st_ino:
+            self.stream.close()
+            self.stream = None
+
+    def _should_rotate(self, lock, incoming):
+        try:
+            size = os.path.getsize(self.baseFilename)
+        except FileNotFoundError:
+            return False
+        if self.max_bytes and size and size + incoming > self.max_bytes:
+            return True
+        if self.interval:
+            lock.seek(0)
+            rotated_at = float(lock.read().strip() or 0)
+            if not rotated_at:
+                self._stamp(lock)
+            elif time.time() - rotated_at >= self.interval:
+                return True
+        return False
+
+    def _stamp(self, lock):
+        lock.seek(0)
+        lock.truncate()
+        lock.write(str(time.time()))
+        lock.flush()
+
+    def _rotate(self, lock):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f'{self.baseFilename}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.baseFilename}.{index + 1}')
+        if self.backup_count:
+            os.replace(self.baseFilename, f'{self.baseFilename}.1')
+        else:
+            os.remove(self.baseFilename)
+        self._stamp(lock)
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Puts records on a bounded queue that a per-process QueueListener drains
+    into ``handlers`` (names of other configured handlers). If the queue is
+    full the record is dropped rather than blocking the caller. Once there
+    is room again, the number dropped is logged as a warning, at most every
+    ``report_interval`` seconds.
+    """
+
+    def __init__(self, handlers, queue_size=10000, report_interval=60):
+        super().__init__(queue.Queue(queue_size))
+        # dictConfig builds handlers in name order, so the targets must sort
+        # before this handler's name. Holding them here also keeps them alive:
+        # they are not attached to any logger.
+        self.targets = [self._lookup(name) for name in handlers]
+        self.queue_size = queue_size
+        self.report_interval = report_interval
+        self.dropped = 0
+        self._reported = 0
+        self._reported_at = float('-inf')
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.stop)
+
+    @staticmethod
+    def _lookup(name):
+        lookup = getattr(logging, 'getHandlerByName', None) or logging._handlers.get  # 3.12+ / 3.11
+        handler = lookup(name)
+        if handler is None:
+            raise ValueError(f'Handler {name!r} must be configured before the queue handler')
+        return handler
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self.listener = QueueListener(self.queue, *self.targets, respect_handler_level=True)
+                self.listener.start()
+                self._pid = os.getpid()
+
+    def _after_fork(self):
+        # The parent's listener thread does not exist here and its queue may
+        # hold a lock taken mid-fork, so start over.
+        self.queue = queue.Queue(self.queue_size)
+        self.dropped = self._reported = 0
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def prepare(self, record):
+        # Only merge the message; JSON encoding and payload truncation are
+        # left to the listener thread.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def _report_dropped(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._reported_at < self.report_interval:
+            return
+        dropped = self.dropped - self._reported
+        record = logging.LogRecord(__name__, logging.WARNING, __file__, 0,
+                                   'Log queue was full; dropped %d records', (dropped,), None)
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            return
+        self._reported += dropped
+        self._reported_at = now
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        if self.dropped != self._reported:
+            self._report_dropped()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Drain the queue and stop the listener (at exit)."""
+        if self.listener is not None and self._pid == os.getpid():
+            if self.dropped != self._reported:
+                self._report_dropped(force=True)
+            self.listener.stop()
+            self.listener = None
+            self._pid = None
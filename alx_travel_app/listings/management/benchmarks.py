@@ -0,0 +1,12 @@
+"""Timing helpers shared by the bench_* management commands."""
+import time
+
+
+def best_of(repeat, func):
+    """The fastest of ``repeat`` calls of ``func``, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
@@ -0,0 +1,85 @@
+from datetime import timedelta
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from listings.models import CustomUser, Listing, Booking, Review, Payment
+
+
+# Plan lines that mean "read the whole table" for each backend we deploy on.
+SEQ_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (?!.*\bUSING (?:COVERING )?INDEX\b)'),
+    'postgresql': re.compile(r'\bSeq Scan on\b'),
+    'mysql': re.compile(r'\bALL\b'),
+}
+
+
+def hot_queries():
+    """
+    The queries our viewsets run on every request, built with real values
+    taken from the current database so the planner sees realistic input.
+    """
+    user = CustomUser.objects.order_by('?').first()
+    listing = Listing.objects.filter(is_active=True).order_by('?').first()
+    now = timezone.now()
+
+    queries = []
+    if listing is not None:
+        queries += [
+            ('ListingViewSet: active listings in a city',
+             Listing.objects.filter(is_active=True, city=listing.city)),
+            ('BookingViewSet: listing bookings in a date range',
+             Booking.objects.filter(listing_id=listing,
+                                    start_date__lt=now + timedelta(days=30),
+                                    end_date__gt=now)),
+            ('ReviewViewSet: reviews for a listing',
+             Review.objects.filter(listing_id=listing).order_by('-created_at')),
+        ]
+    if user is not None:
+        queries.append(
+            ('BookingViewSet.my_bookings',
+             Booking.objects.filter(user_id=user).order_by('-created_at')),
+        )
+    queries += [
+        ('Payments: pending payments',
+         Payment.objects.filter(status='pending').order_by('created_at')),
+        ('Payments: payments by status',
+         Payment.objects.filter(status='successful').order_by('-created_at')),
+    ]
+    return queries
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN for the hot viewset queries and flag sequential scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plan for every query')
+        parser.add_argument('--fail-on-scan', action='store_true', help='Exit non-zero if any query scans a table')
+
+    def handle(self, *args, **options):
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'No scan detection for database vendor "{connection.vendor}"')
+
+        queries = hot_queries()
+        if not queries:
+            raise CommandError('No data to plan against. Run "manage.py seed" first.')
+
+        flagged = []
+        for label, queryset in queries:
+            plan = queryset.explain()
+            scans = [line.strip() for line in plan.splitlines() if pattern.search(line)]
+            if scans:
+                flagged.append(label)
+                self.stdout.write(self.style.WARNING(f'SEQ SCAN  {label}'))
+                for line in scans:
+                    self.stdout.write(f'    {line}')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'OK        {label}'))
+            if options['verbose_plans']:
+                self.stdout.write(plan)
+
+        self.stdout.write(f'\n{len(queries) - len(flagged)}/{len(queries)} queries use an index.')
+        if flagged and options['fail_on_scan']:
+            raise CommandError(f'{len(flagged)} queries fall back to a sequential scan')
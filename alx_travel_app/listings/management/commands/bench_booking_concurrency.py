@@ -0,0 +1,97 @@
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from listings.availability import BLOCKING_STATUSES, BookingConflict, create_booking
+from listings.models import CustomUser, Listing, Booking
+
+
+def count_overlaps(listings):
+    """Number of active bookings that share a night with another active booking."""
+    active = Booking.objects.filter(listing_id__in=listings, status__in=BLOCKING_STATUSES)
+    clash = active.filter(
+        listing_id=OuterRef('listing_id'),
+        start_date__lt=OuterRef('end_date'),
+        end_date__gt=OuterRef('start_date'),
+    ).exclude(pk=OuterRef('pk'))
+    return active.filter(Exists(clash)).count()
+
+
+def run_stress(listings, user, threads=8, attempts=50, days=30, seed=0):
+    """
+    Hammer ``listings`` with overlapping booking requests from several
+    threads. Returns a dict of created/conflict/error counts and the
+    elapsed time.
+    """
+    origin = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    counts = {'created': 0, 'conflicts': 0, 'errors': 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        barrier.wait()
+        try:
+            for _ in range(attempts):
+                start = origin + timedelta(days=rng.randrange(days))
+                try:
+                    create_booking(listing_id=rng.choice(listings), user_id=user, start_date=start,
+                                   end_date=start + timedelta(days=rng.randint(1, 3)))
+                    outcome = 'created'
+                except BookingConflict:
+                    outcome = 'conflicts'
+                except OperationalError:  # e.g. SQLite lock timeout
+                    outcome = 'errors'
+                with lock:
+                    counts[outcome] += 1
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    counts['elapsed'] = time.perf_counter() - started
+    return counts
+
+
+class Command(BaseCommand):
+    help = 'Stress concurrent booking creation and verify there are no overlapping bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent writers')
+        parser.add_argument('--attempts', type=int, default=100, help='Booking attempts per thread')
+        parser.add_argument('--listings', type=int, default=4, help='Listings to spread the load over')
+        parser.add_argument('--days', type=int, default=30, help='Date window the bookings fall in')
+
+    def handle(self, *args, **options):
+        user = CustomUser.objects.create_user(username='stress', email='stress@example.invalid',
+                                              password='stress-pass-123', first_name='Stress', last_name='Test')
+        listings = [
+            Listing.objects.create(title=f'Stress {i}', description='Stress test listing', host=user,
+                                   street='1 Stress St', city='Stress', state='ST', postal_code='0', country='Stress')
+            for i in range(options['listings'])
+        ]
+        try:
+            result = run_stress(listings, user, options['threads'], options['attempts'], options['days'])
+            overlaps = count_overlaps(listings)
+        finally:
+            user.delete()  # cascades to the listings and bookings
+
+        attempts = options['threads'] * options['attempts']
+        self.stdout.write(f"{options['threads']} threads x {options['attempts']} attempts on "
+                          f"{options['listings']} listings ({connection.vendor})")
+        self.stdout.write(f"  created   {result['created']}")
+        self.stdout.write(f"  conflicts {result['conflicts']}")
+        self.stdout.write(f"  errors    {result['errors']}")
+        self.stdout.write(f"  {attempts / result['elapsed']:.0f} attempts/s, "
+                          f"{result['created'] / result['elapsed']:.0f} bookings/s")
+        style = self.style.SUCCESS if overlaps == 0 else self.style.ERROR
+        self.stdout.write(style(f'Overlapping bookings: {overlaps}'))
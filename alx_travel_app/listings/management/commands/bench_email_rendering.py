@@ -0,0 +1,57 @@
+import time
+import uuid
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+from listings import emails
+
+
+def contexts(count):
+    for i in range(count):
+        start = date(2026, 1, 1) + timedelta(days=i % 365)
+        yield {
+            'guest_name': f'Guest {i}',
+            'listing_title': f'Listing {i % 500} & friends',
+            'booking_id': uuid.UUID(int=i),
+            'start_date': start,
+            'end_date': start + timedelta(days=3),
+            'number_of_nights': 3,
+            'status': 'Confirmed',
+        }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark email rendering (messages per second in one worker process)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=5000)
+        parser.add_argument('--email', default='booking_confirmation_email',
+                            help='Email name (listings/<name>.html and .txt)')
+
+    def handle(self, *args, **options):
+        name, count = options['email'], options['messages']
+        batch = list(contexts(count))
+
+        def strip_tags_per_message():
+            for context in batch:
+                html = render_to_string(f'listings/{name}.html', context)
+                strip_tags(html)
+
+        def render_per_message():
+            for context in batch:
+                emails.render(name, context)
+
+        def render_batch():
+            emails.render_many(name, batch)
+
+        emails.render(name, batch[0])  # warm the template caches
+        self.stdout.write(f'{count} x {name}')
+        for label, run in (('render_to_string + strip_tags', strip_tags_per_message),
+                           ('emails.render per message', render_per_message),
+                           ('emails.render_many', render_batch)):
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'  {label:<30}{count / elapsed:10.0f} messages/s')
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from listings.fastpath import ValuesSerializer
+from listings.management.benchmarks import best_of
+from listings.models import CustomUser, Listing, Booking, Review
+from listings.renderers import ORJSONRenderer
+from listings.serializers import ListingSerializer, BookingSerializer, ReviewSerializer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark list serialization: ModelSerializer vs the values() fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='Row counts to measure')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+
+    def handle(self, *args, **options):
+        # Synthetic rows are created inside a transaction that is rolled back.
+        with transaction.atomic():
+            self.run(options['sizes'], options['repeat'])
+            transaction.set_rollback(True)
+
+    def run(self, sizes, repeat):
+        now = timezone.now()
+        user = CustomUser.objects.create_user(username='bench', email='bench@example.com', password='bench-pass-123',
+                                              first_name='Bench', last_name='User')
+        largest = max(sizes)
+        listings = Listing.objects.bulk_create(
+            Listing(title=f'Listing {i}', description='Bench description ' * 10, host=user, street='1 Bench St',
+                    city='Bench City', state='BS', postal_code='00000', country='Benchland')
+            for i in range(largest)
+        )
+        Booking.objects.bulk_create(
+            Booking(listing_id=listings[i], user_id=user, start_date=now + timedelta(days=i % 90),
+                    end_date=now + timedelta(days=i % 90 + 3))
+            for i in range(largest)
+        )
+        Review.objects.bulk_create(
+            Review(listing_id=listings[i], user_id=user, rating=i % 5 + 1, comment='Bench comment')
+            for i in range(largest)
+        )
+
+        renderer = ORJSONRenderer()
+        for model, serializer_class in ((Listing, ListingSerializer),
+                                        (Booking, BookingSerializer),
+                                        (Review, ReviewSerializer)):
+            values_serializer = ValuesSerializer(serializer_class)
+            for size in sizes:
+                queryset = model.objects.all()[:size]
+                slow = best_of(repeat, lambda: renderer.render(serializer_class(queryset.all(), many=True).data))
+                fast = best_of(repeat, lambda: renderer.render(values_serializer.serialize(queryset.all())))
+                self.stdout.write(f'{serializer_class.__name__:<18} {size:>6} rows  '
+                                  f'serializer {slow * 1000:8.1f} ms  fast path {fast * 1000:8.1f} ms  '
+                                  f'speedup {slow / fast:4.1f}x')
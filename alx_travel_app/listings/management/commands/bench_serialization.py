@@ -0,0 +1,54 @@
+import io
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from listings.management.benchmarks import best_of
+from listings.models import CustomUser, Listing, Booking
+from listings.renderers import ORJSONRenderer, ORJSONParser
+from listings.serializers import BookingSerializer
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark JSON rendering/parsing of booking payloads (stdlib vs orjson)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Number of bookings to serialize')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (best is reported)')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+
+        # Unsaved instances: we are measuring serialization, not the database.
+        now = timezone.now()
+        users = [CustomUser(user_id=uuid.uuid4(), email=f'guest{i}@example.com') for i in range(50)]
+        listings = [Listing(listing_id=uuid.uuid4(), title=f'Listing {i}', host=users[i % 50]) for i in range(200)]
+        bookings = [
+            Booking(booking_id=uuid.uuid4(), listing_id=listings[i % 200], user_id=users[i % 50],
+                    start_date=now + timedelta(days=i % 90), end_date=now + timedelta(days=i % 90 + 3),
+                    status=Booking.Status.PENDING, created_at=now)
+            for i in range(rows)
+        ]
+
+        data = BookingSerializer(bookings, many=True).data
+        stdlib_body = JSONRenderer().render(data)
+        orjson_body = ORJSONRenderer().render(data)
+
+        results = [
+            ('serializer.data', best_of(repeat, lambda: BookingSerializer(bookings, many=True).data)),
+            ('render  JSONRenderer', best_of(repeat, lambda: JSONRenderer().render(data))),
+            ('render  ORJSONRenderer', best_of(repeat, lambda: ORJSONRenderer().render(data))),
+            ('parse   JSONParser', best_of(repeat, lambda: JSONParser().parse(io.BytesIO(stdlib_body)))),
+            ('parse   ORJSONParser', best_of(repeat, lambda: ORJSONParser().parse(io.BytesIO(orjson_body)))),
+        ]
+
+        self.stdout.write(f'{rows} bookings, {len(stdlib_body)} bytes, best of {repeat}')
+        for label, seconds in results:
+            self.stdout.write(f'  {label:<24} {seconds * 1000:9.2f} ms')
+        self.stdout.write(f'Render speedup: {results[1][1] / results[2][1]:.1f}x, '
+                          f'parse speedup: {results[3][1] / results[4][1]:.1f}x')
+        if stdlib_body != orjson_body:
+            self.stdout.write(self.style.WARNING('Rendered bodies differ between renderers'))
@@ -0,0 +1,133 @@
+import http.client
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Environment for gunicorn.conf.py. "baseline" is the previous start
+# command: one sync worker, no preload, no recycling.
+PROFILES = {
+    'baseline': {'GUNICORN_WORKER_CLASS': 'sync', 'WEB_CONCURRENCY': '1', 'GUNICORN_PRELOAD': '0',
+                 'GUNICORN_MAX_REQUESTS': '0'},
+    'gthread': {'GUNICORN_WORKER_CLASS': 'gthread'},
+    'uvicorn': {'GUNICORN_WORKER_CLASS': 'uvicorn'},
+}
+
+
+def pss_kb(pid):
+    """Proportional set size of a process and its children (shared pages split between them)."""
+    total = 0
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    for child in pids:
+        try:
+            with open(f'/proc/{child}/smaps_rollup') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('Pss:'))
+        except (OSError, StopIteration):
+            pass
+    return total
+
+
+class Command(BaseCommand):
+    help = 'Load-test gunicorn.conf.py under each worker profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES))
+        parser.add_argument('--path', default='/api/listings/', help='Endpoint to request')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per profile')
+        parser.add_argument('--concurrency', type=int, default=32, help='Concurrent keep-alive clients')
+        parser.add_argument('--user', help='Send a DRF token for this username (most endpoints need one)')
+        parser.add_argument('--workers', help='WEB_CONCURRENCY for the tuned profiles (default: from CPU count)')
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        options['headers'] = {}
+        if options['user']:
+            from django.contrib.auth import get_user_model
+            from rest_framework.authtoken.models import Token
+            user = get_user_model().objects.get(username=options['user'])
+            options['headers']['Authorization'] = f'Token {Token.objects.get_or_create(user=user)[0].key}'
+        self.stdout.write(f"{options['requests']} x GET {options['path']}, {options['concurrency']} clients")
+        for name in options['profiles']:
+            env = dict(os.environ, PORT=str(options['port']), **PROFILES[name])
+            if options['workers'] and name != 'baseline':
+                env['WEB_CONCURRENCY'] = options['workers']
+            server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                                      cwd=settings.BASE_DIR, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                self._wait_ready(options['port'], options['path'], options['headers'], server)
+                latencies, errors, elapsed = self._load(options)
+                memory = pss_kb(server.pid) / 1024
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=60)
+            latencies.sort()
+            quantile = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+            self.stdout.write(
+                f'  {name:<9}{len(latencies) / elapsed:8.0f} req/s  p50 {statistics.median(latencies) * 1000:6.1f}ms  '
+                f'p95 {quantile(0.95):6.1f}ms  p99 {quantile(0.99):6.1f}ms  errors {errors}  PSS {memory:6.0f}MB')
+
+    def _wait_ready(self, port, path, headers, server, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn exited with status {server.returncode}')
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                connection.request('GET', path, headers=headers)
+                connection.getresponse().read()
+                connection.close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError('gunicorn did not start')
+
+    def _load(self, options):
+        per_client = max(1, options['requests'] // options['concurrency'])
+        latencies, lock = [], threading.Lock()
+        errors = 0
+
+        def client(_):
+            nonlocal errors
+            connection = http.client.HTTPConnection('127.0.0.1', options['port'], timeout=30)
+            mine, failed = [], 0
+            for _ in range(per_client):
+                started = time.perf_counter()
+                # A recycled worker drops its idle keep-alive connections;
+                # like a browser or proxy, reconnect and retry once.
+                for attempt in range(2):
+                    try:
+                        connection.request('GET', options['path'], headers=options['headers'])
+                        response = connection.getresponse()
+                        response.read()
+                        if response.status != 200:
+                            failed += 1
+                        elif response.will_close:
+                            connection.close()
+                        break
+                    except (OSError, http.client.HTTPException):
+                        connection.close()
+                        if attempt:
+                            failed += 1
+                mine.append(time.perf_counter() - started)
+            connection.close()
+            with lock:
+                latencies.extend(mine)
+                errors += failed
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            list(pool.map(client, range(options['concurrency'])))
+        return latencies, errors, time.perf_counter() - started
@@ -0,0 +1,52 @@
+import itertools
+import random
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from listings import similarity
+
+
+def synthetic_listings(count, vocabulary=20000, seed=0):
+    """(title, description, city, state, country) tuples with Zipf-distributed words."""
+    rng = random.Random(seed)
+    words = [f'w{i}' for i in range(vocabulary)]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(vocabulary)))
+    cities = [(f'city{i}', f'state{i // 10}', f'country{i // 100}') for i in range(2000)]
+    for _ in range(count):
+        title = ' '.join(rng.choices(words, cum_weights=cum_weights, k=6))
+        description = ' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(40, 120)))
+        yield (title, description, *rng.choice(cities))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the similar-listings build (TF-IDF + blocked top-K) on a synthetic corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=100000, help='Synthetic listings to index')
+        parser.add_argument('--k', type=int, default=settings.SIMILAR_LISTINGS_K, help='Neighbors kept per listing')
+        parser.add_argument('--block-sizes', type=int, nargs='+', default=[256, settings.SIMILAR_LISTINGS_BLOCK_SIZE],
+                            help='Rows multiplied per block')
+        parser.add_argument('--changed', type=int, default=100, help='Rows recomputed by the incremental pass')
+
+    def handle(self, *args, **options):
+        count, k = options['listings'], options['k']
+        started = time.perf_counter()
+        matrix = similarity.vectorize(similarity.terms(*fields) for fields in synthetic_listings(count))
+        vectorized = time.perf_counter() - started
+        self.stdout.write(f'{count} listings, {matrix.shape[1]} terms, {matrix.nnz / count:.0f} terms/listing')
+        self.stdout.write(f'  vectorize          {vectorized:8.2f}s')
+
+        for block_size in options['block_sizes']:
+            started = time.perf_counter()
+            neighbors = sum(len(cols) for _, cols, _ in similarity.nearest(matrix, list(range(count)), k, block_size))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'  top-{k} block {block_size:<5}{elapsed:8.2f}s  '
+                              f'{count / elapsed:8.0f} listings/s  {neighbors / count:.1f} neighbors/listing')
+
+        changed = list(np.random.default_rng(0).choice(count, size=min(options['changed'], count), replace=False))
+        started = time.perf_counter()
+        for _ in similarity.nearest(matrix, changed, k * similarity.REVERSE_CANDIDATES):
+            pass
+        self.stdout.write(f'  incremental {len(changed):<6} {time.perf_counter() - started:8.2f}s (excluding vectorize)')
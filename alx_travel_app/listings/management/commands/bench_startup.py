@@ -0,0 +1,64 @@
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a web worker imports before serving its first request.
+BOOT = (
+    'import django; django.setup(); '
+    'from django.core.wsgi import get_wsgi_application; get_wsgi_application(); '
+    'from django.urls import get_resolver; get_resolver().url_patterns'
+)
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def import_times(profile):
+    """[(self us, cumulative us, depth, module)] for one fresh worker boot under ``profile``."""
+    env = dict(os.environ, APP_PROFILE=profile, DJANGO_SETTINGS_MODULE=os.environ.get(
+        'DJANGO_SETTINGS_MODULE', 'alx_travel_app.settings'))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', BOOT],
+                            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+    rows, errors = [], []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            rows.append((int(match[1]), int(match[2]), (len(match[3]) - 1) // 2, match[4]))
+        elif not line.startswith('import time:'):
+            errors.append(line)
+    if result.returncode:
+        raise CommandError(f'Boot under APP_PROFILE={profile} failed:\n' + '\n'.join(errors[-20:]))
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Measure worker boot import time (python -X importtime) against a budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', choices=['full', 'lean'],
+                            help='APP_PROFILE to measure (repeatable; default: lean and full)')
+        parser.add_argument('--budget-ms', type=float, default=settings.STARTUP_IMPORT_BUDGET_MS,
+                            help='Total import time allowed for the lean profile')
+        parser.add_argument('--top', type=int, default=10, help='Slowest top-level packages to list')
+        parser.add_argument('--fail', action='store_true', help='Exit non-zero when over budget')
+
+    def handle(self, *args, **options):
+        over_budget = False
+        for profile in options['profile'] or ['lean', 'full']:
+            rows = import_times(profile)
+            total = sum(self_us for self_us, _, _, _ in rows) / 1000
+            packages = {}
+            for self_us, _, _, module in rows:
+                package = module.split('.')[0]
+                packages[package] = packages.get(package, 0) + self_us
+            self.stdout.write(f'{profile:<5} {len(rows):5} modules  {total:8.1f}ms')
+            for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+                self.stdout.write(f'        {package:<30}{self_us / 1000:8.1f}ms')
+            if profile == 'lean' and total > options['budget_ms']:
+                over_budget = True
+                self.stdout.write(self.style.WARNING(
+                    f'lean boot imports take {total:.0f}ms, over the {options["budget_ms"]:.0f}ms budget'))
+        if over_budget and options['fail']:
+            raise CommandError('Startup import budget exceeded')
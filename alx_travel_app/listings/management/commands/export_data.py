@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from listings.exports import DATASETS, FORMATS, DEFAULT_CHUNK_SIZE, filter_export, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream bookings or payments to CSV/NDJSON with constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS), help='What to export')
+        parser.add_argument('--format', dest='file_format', choices=sorted(FORMATS), default='csv', help='Output format')
+        parser.add_argument('--output', help='File to write (defaults to stdout)')
+        parser.add_argument('--status', help='Only export rows with this status')
+        parser.add_argument('--since', help='Only rows created on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Only rows created on or before this date (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows fetched per cursor round trip')
+
+    def handle(self, *args, **options):
+        dataset = options['dataset']
+        model, _ = DATASETS[dataset]
+        try:
+            queryset = filter_export(model.objects.all(), status=options['status'],
+                                     since=options['since'], until=options['until'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        chunks = stream_export(dataset, options['file_format'], queryset, options['chunk_size'])
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        rows = 0
+        try:
+            for chunk in chunks:
+                output.write(chunk.encode() if isinstance(chunk, str) else chunk)
+                rows += 1
+        finally:
+            if options['output']:
+                output.close()
+
+        if options['output']:
+            if options['file_format'] == 'csv':
+                rows -= 1  # header line
+            self.stderr.write(self.style.SUCCESS(f'Exported {rows} {dataset} to {options["output"]}'))
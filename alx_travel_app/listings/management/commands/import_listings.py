@@ -0,0 +1,79 @@
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from listings import imports
+from listings.models import ListingImport
+from listings.tasks import import_listings
+
+SHOWN_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = 'Bulk-create listings from a CSV or NDJSON file, in chunks, resumable from a checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?', help='CSV or NDJSON file of listings')
+        parser.add_argument('--host', help='Email of the user the listings belong to')
+        parser.add_argument('--format', dest='file_format', choices=imports.FORMATS,
+                            help='File format (defaults to the file extension)')
+        parser.add_argument('--resume', metavar='IMPORT_ID', help='Continue an earlier import from its checkpoint')
+        parser.add_argument('--background', action='store_true', help='Queue the import as a Celery job and return')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            listing_import = ListingImport.objects.filter(pk=options['resume']).first()
+            if listing_import is None:
+                raise CommandError(f"No import {options['resume']}")
+            if listing_import.status == ListingImport.Status.COMPLETED:
+                raise CommandError(f'Import {listing_import.pk} already completed')
+        else:
+            listing_import = self._create(options)
+
+        if options['background']:
+            import_listings.delay(str(listing_import.pk))
+            self.stdout.write(self.style.SUCCESS(
+                f'Queued import {listing_import.pk}; rerun with --resume {listing_import.pk} if it stops'))
+            return
+
+        self.stdout.write(f'Importing {listing_import.source.name} as {listing_import.pk} '
+                          f'from row {listing_import.rows_processed + 1}')
+        try:
+            imports.run(listing_import, progress=self._progress)
+        except KeyboardInterrupt:
+            raise CommandError(f'Interrupted; continue with --resume {listing_import.pk}')
+
+        for error in listing_import.errors[:SHOWN_ERRORS]:
+            self.stderr.write(f"  row {error['row']}: {error['errors']}")
+        if listing_import.rows_failed > SHOWN_ERRORS:
+            self.stderr.write(f'  ... see the import in the admin for the first {len(listing_import.errors)} rejected rows')
+        if listing_import.status == ListingImport.Status.FAILED:
+            raise CommandError(f'{listing_import.error}; continue with --resume {listing_import.pk}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {listing_import.rows_created} listings, rejected {listing_import.rows_failed} rows'))
+
+    def _create(self, options):
+        path = options['file']
+        if not (path and options['host']):
+            raise CommandError('A file and --host are required unless resuming')
+        file_format = options['file_format'] or imports.format_of(path)
+        if file_format is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format')
+        host = get_user_model().objects.filter(email=options['host']).first()
+        if host is None:
+            raise CommandError(f"No user with email {options['host']}")
+
+        # Kept in storage like uploads, so a worker or a later --resume can read it.
+        listing_import = ListingImport(host=host, file_format=file_format)
+        try:
+            with open(path, 'rb') as f:
+                listing_import.source.save(os.path.basename(path), File(f), save=False)
+        except OSError as e:
+            raise CommandError(str(e))
+        listing_import.save()
+        return listing_import
+
+    def _progress(self, listing_import):
+        self.stdout.write(f'  {listing_import.rows_processed} rows: {listing_import.rows_created} created, '
+                          f'{listing_import.rows_failed} rejected')
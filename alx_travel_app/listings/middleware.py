@@ -0,0 +1,47 @@
+import re
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; fall back to gzip only
+    brotli = None
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compress responses larger than RESPONSE_COMPRESSION_MIN_SIZE bytes.
+    Brotli is used when the client accepts it and the brotli package is
+    installed, otherwise this behaves like Django's GZipMiddleware.
+    Streaming responses are always gzipped chunk by chunk so exports keep
+    constant memory. Server-sent event streams are left alone.
+    """
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response  # events must reach the client as they are written
+        if not response.streaming and len(response.content) < settings.RESPONSE_COMPRESSION_MIN_SIZE:
+            return response
+
+        ae = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if (brotli is None or response.streaming
+                or response.has_header('Content-Encoding')
+                or not re_accepts_brotli.search(ae)):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed_content = brotli.compress(response.content, quality=settings.RESPONSE_BROTLI_QUALITY)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers['Content-Length'] = str(len(response.content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
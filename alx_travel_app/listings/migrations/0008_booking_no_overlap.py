@@ -0,0 +1,29 @@
+import listings.models
+from django.db import migrations, models
+
+try:
+    from django.contrib.postgres.operations import BtreeGistExtension
+except ImportError:  # no PostgreSQL driver installed, so not migrating PostgreSQL
+    BtreeGistExtension = None
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_listingcalendar'),
+    ]
+
+    operations = [
+        *([BtreeGistExtension()] if BtreeGistExtension else []),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=listings.models.PostgresExclusionConstraint(
+                condition=models.Q(('status__in', ['pending', 'confirmed'])),
+                expressions=[
+                    ('listing_id', '='),
+                    (listings.models.TsTzRange('start_date', 'end_date'), '&&'),
+                ],
+                name='booking_no_overlap',
+            ),
+        ),
+    ]
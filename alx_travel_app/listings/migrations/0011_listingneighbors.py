@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0010_listingdailystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingNeighbors',
+            fields=[
+                ('listing_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='neighbors', serialize=False, to='listings.listing')),
+                ('neighbor_ids', models.BinaryField()),
+                ('scores', models.BinaryField()),
+                ('signature', models.CharField(max_length=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Listing neighbors',
+            },
+        ),
+    ]
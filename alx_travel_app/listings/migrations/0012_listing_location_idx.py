@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0011_listingneighbors'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['country', 'state', 'city'], name='listing_location_idx'),
+        ),
+    ]
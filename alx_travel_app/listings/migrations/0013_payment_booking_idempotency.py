@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:45
+
+import uuid
+
+import django.db.models.deletion
+import listings.models
+from django.db import migrations, models
+
+
+def link_payments_to_bookings(apps, schema_editor):
+    # Payments used to carry their booking's id as booking_reference.
+    Booking = apps.get_model('listings', 'Booking')
+    Payment = apps.get_model('listings', 'Payment')
+    candidates = {}
+    for pk, reference in Payment.objects.filter(booking_id__isnull=True).values_list('pk', 'booking_reference'):
+        try:
+            candidates[pk] = uuid.UUID(reference)
+        except ValueError:
+            pass
+    existing = set(Booking.objects.filter(pk__in=candidates.values()).values_list('pk', flat=True))
+    for pk, booking_id in candidates.items():
+        if booking_id in existing:
+            Payment.objects.filter(pk=pk).update(booking_id=booking_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0012_listing_location_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='booking_id',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payments', to='listings.booking'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='checkout_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='booking_reference',
+            field=models.CharField(default=listings.models.new_payment_reference, max_length=100, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(fields=('user_id', 'idempotency_key'), name='payment_idempotency_key_uniq'),
+        ),
+        migrations.RunPython(link_payments_to_bookings, migrations.RunPython.noop),
+    ]
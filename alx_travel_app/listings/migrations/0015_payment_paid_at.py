@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:09
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_paid_at(apps, schema_editor):
+    # The best record of when existing payments succeeded is their last update.
+    Payment = apps.get_model('listings', 'Payment')
+    Payment.objects.filter(status='successful', paid_at__isnull=True).update(paid_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0014_listingimport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_paid_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['paid_at'], name='payment_paid_at_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0015_payment_paid_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=timezone.now),
+            preserve_default=False,
+        ),
+    ]
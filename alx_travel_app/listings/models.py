@@ -1,8 +1,12 @@
+import os
+import time
 import uuid
-from django.db import models
+from django.db import connections, models
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.constraints import ExclusionConstraint
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 
 # Create your models here.
 
@@ -30,6 +34,7 @@ class Listing(models.Model):
     postal_code = models.CharField(max_length=20)
     country = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     is_active = models.BooleanField(default=True)
     
     
@@ -38,6 +43,43 @@ class Listing(models.Model):
     
     class Meta:
         verbose_name_plural = "Listings"
+        indexes = [
+            models.Index(fields=["city"], name="listing_active_city_idx",
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=["-created_at"], name="listing_created_idx"),
+            models.Index(fields=["country", "state", "city"], name="listing_location_idx"),
+        ]
+
+class TsTzRange(models.Func):
+    function = 'TSTZRANGE'
+
+
+class PostgresExclusionConstraint(ExclusionConstraint):
+    """
+    An ExclusionConstraint that is skipped on other database backends,
+    which cannot express it. They rely on the listing lock taken in
+    listings.availability.reserve() instead.
+    """
+
+    def constraint_sql(self, model, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().constraint_sql(model, schema_editor)
+        return None
+
+    def create_sql(self, model, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().create_sql(model, schema_editor)
+        return None
+
+    def remove_sql(self, model, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().remove_sql(model, schema_editor)
+        return None
+
+    def validate(self, model, instance, exclude=None, using='default'):
+        if connections[using].vendor == 'postgresql':
+            super().validate(model, instance, exclude=exclude, using=using)
+
 
 class Booking(models.Model):
     booking_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -53,7 +95,27 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f'{self.listing.title} booked by {self.user.email}'
+        return f'{self.listing_id.title} booked by {self.user_id.email}'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user_id", "-created_at"], name="booking_user_created_idx"),
+            models.Index(fields=["listing_id", "start_date", "end_date"], name="booking_listing_dates_idx"),
+            models.Index(fields=["-created_at"], name="booking_created_idx"),
+            models.Index(fields=["created_at"], name="booking_pending_created_idx",
+                         condition=models.Q(status="pending")),
+        ]
+        constraints = [
+            # No two pending/confirmed bookings of a listing may overlap.
+            PostgresExclusionConstraint(
+                name="booking_no_overlap",
+                expressions=[
+                    ("listing_id", "="),
+                    (TsTzRange("start_date", "end_date"), "&&"),
+                ],
+                condition=models.Q(status__in=["pending", "confirmed"]),
+            ),
+        ]
     
 class Review(models.Model):
     review_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -64,7 +126,31 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f'Review by {self.user.email} on {self.listing.title}'
+        return f'Review by {self.user_id.email} on {self.listing_id.title}'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["listing_id", "-created_at"], name="review_listing_created_idx"),
+            models.Index(fields=["-created_at"], name="review_created_idx"),
+        ]
+
+
+CROCKFORD_BASE32 = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+
+def new_payment_reference():
+    """
+    A unique tx_ref such as ``BOOK-01JAF3...``: a ULID, i.e. 48 bits of
+    Unix time in milliseconds followed by 80 random bits, in Crockford
+    base32. References sort by creation time, and two created in the same
+    millisecond differ in their random part.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), 'big')
+    chars = []
+    for _ in range(26):
+        value, index = divmod(value, 32)
+        chars.append(CROCKFORD_BASE32[index])
+    return 'BOOK-' + ''.join(reversed(chars))
 
 
 class Payment(models.Model):
@@ -75,16 +161,127 @@ class Payment(models.Model):
     )
 
     user_id = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='payments')
-    booking_reference = models.CharField(max_length=100, unique=True)
-    transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    booking_id = models.ForeignKey(Booking, on_delete=models.SET_NULL, null=True, blank=True, related_name='payments')
+    booking_reference = models.CharField(max_length=100, unique=True, default=new_payment_reference)
+    # Idempotency-Key of the initialize request, unique per user, and the checkout URL it returned
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True)
+    checkout_url = models.URLField(max_length=500, blank=True)
+    transaction_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=10, default='NGN')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # When the payment first succeeded; revenue rollups are keyed on it
+    paid_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.user.username} - {self.booking_reference} ({self.status})"
+        return f"{self.user_id.username} - {self.booking_reference} ({self.status})"
+
+    def mark_successful(self):
+        """Set the status to successful, stamping ``paid_at`` the first time."""
+        self.status = 'successful'
+        if self.paid_at is None:
+            self.paid_at = timezone.now()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "-created_at"], name="payment_status_created_idx"),
+            models.Index(fields=["-created_at"], name="payment_created_idx"),
+            models.Index(fields=["created_at"], name="payment_pending_idx",
+                         condition=models.Q(status="pending")),
+            models.Index(fields=["paid_at"], name="payment_paid_at_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["user_id", "idempotency_key"], name="payment_idempotency_key_uniq"),
+        ]
 
     
 
+
+
+class ListingCalendar(models.Model):
+    """
+    Precomputed occupancy for the next CALENDAR_DAYS days of a listing.
+    Bit i of ``bitmap`` (little-endian) is set when ``origin + i days`` is
+    taken by a pending or confirmed booking. Maintained by listings.occupancy.
+    """
+    listing_id = models.OneToOneField(Listing, on_delete=models.CASCADE, primary_key=True, related_name='calendar')
+    origin = models.DateField()
+    bitmap = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Calendar for {self.listing_id.title} from {self.origin}'
+
+
+class ListingDailyStats(models.Model):
+    """
+    Per listing, per day rollup behind the host analytics endpoints.
+    Rows only exist for days with activity. Maintained by listings.rollups.
+    """
+    listing_id = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    booked_nights = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.listing_id.title} on {self.day}'
+
+    class Meta:
+        verbose_name_plural = "Listing daily stats"
+        constraints = [
+            models.UniqueConstraint(fields=["listing_id", "day"], name="listing_daily_stats_unique"),
+        ]
+
+
+class ListingNeighbors(models.Model):
+    """
+    The most similar active listings to a listing, best first.
+    ``neighbor_ids`` packs 16-byte listing UUIDs and ``scores`` the matching
+    little-endian float32 cosine similarities. ``signature`` fingerprints
+    the text the vectors were built from. Maintained by listings.similarity.
+    """
+    listing_id = models.OneToOneField(Listing, on_delete=models.CASCADE, primary_key=True, related_name='neighbors')
+    neighbor_ids = models.BinaryField()
+    scores = models.BinaryField()
+    signature = models.CharField(max_length=16)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Similar listings for {self.listing_id.title}'
+
+    class Meta:
+        verbose_name_plural = "Listing neighbors"
+
+
+class ListingImport(models.Model):
+    """
+    A bulk import of listings from an uploaded CSV or NDJSON file, and its
+    progress. ``rows_processed`` is the checkpoint: rows up to it have been
+    committed or rejected. Run by listings.imports.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        COMPLETED = 'completed', 'Completed'
+        FAILED = 'failed', 'Failed'
+
+    import_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    host = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='listing_imports')
+    source = models.FileField(upload_to='listing-imports/')
+    file_format = models.CharField(max_length=10)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    rows_processed = models.PositiveIntegerField(default=0)
+    rows_created = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    # [{'row': n, 'errors': {...}}] for the first LISTING_IMPORT_MAX_ERRORS rejected rows
+    errors = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Import of {self.source.name} ({self.status})'
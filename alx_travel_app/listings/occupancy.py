@@ -0,0 +1,303 @@
+"""
+Per-listing occupancy calendars stored as day bitmaps.
+
+Each ListingCalendar covers CALENDAR_DAYS days starting at ``origin``
+(normally today). Bit i is set when the night of ``origin + i`` is held
+by a pending or confirmed booking. Bitmaps are handled as Python ints, so
+availability checks for any number of listings are a mask and an AND.
+"""
+import base64
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Booking, ListingCalendar
+
+CALENDAR_DAYS = 365
+BLOCKING_STATUSES = (Booking.Status.PENDING, Booking.Status.CONFIRMED)
+
+
+def local_day(value):
+    """The local date of a datetime; dates are returned unchanged."""
+    if hasattr(value, 'date'):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    return value
+
+
+def midnight(day):
+    """The aware datetime at the start of a local day."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def nights(start, end):
+    """
+    First night and the (exclusive) checkout day of a stay. A same-day stay
+    still holds one night.
+    """
+    start_day, end_day = local_day(start), local_day(end)
+    return start_day, max(end_day, start_day + timedelta(days=1))
+
+
+def range_mask(origin, start_day, end_day):
+    """
+    Bits for the days in [start_day, end_day) that fall inside the window
+    starting at ``origin``.
+    """
+    first = max((start_day - origin).days, 0)
+    last = min((end_day - origin).days, CALENDAR_DAYS)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def _to_int(bitmap):
+    return int.from_bytes(bytes(bitmap), 'little')
+
+
+def _to_bytes(bits):
+    return bits.to_bytes((CALENDAR_DAYS + 7) // 8, 'little')
+
+
+def bookings_mask(listing_id, origin, start_day, end_day):
+    """
+    Occupancy bits for [start_day, end_day), read from Booking rows.
+    """
+    bookings = Booking.objects.filter(
+        listing_id=listing_id,
+        status__in=BLOCKING_STATUSES,
+        start_date__lt=midnight(end_day),
+        end_date__gte=midnight(start_day),
+    ).values_list('start_date', 'end_date')
+
+    window = range_mask(origin, start_day, end_day)
+    bits = 0
+    for start, end in bookings:
+        bits |= range_mask(origin, *nights(start, end))
+    return bits & window
+
+
+def _locked_calendar(listing_id, today):
+    """
+    Fetch (or build) the calendar row under a row lock and roll it forward
+    to ``today`` if needed. Must be called inside a transaction.
+    """
+    calendar = ListingCalendar.objects.select_for_update().filter(listing_id=listing_id).first()
+    window_end = today + timedelta(days=CALENDAR_DAYS)
+    if calendar is None:
+        bits = bookings_mask(listing_id, today, today, window_end)
+        calendar, _ = ListingCalendar.objects.get_or_create(
+            listing_id_id=listing_id, defaults={'origin': today, 'bitmap': _to_bytes(bits)})
+        return calendar
+
+    shift = (today - calendar.origin).days
+    if shift > 0:
+        if shift >= CALENDAR_DAYS:
+            bits = bookings_mask(listing_id, today, today, window_end)
+        else:
+            # Drop the days that have passed and fill in the newly visible tail.
+            tail_start = calendar.origin + timedelta(days=CALENDAR_DAYS)
+            bits = _to_int(calendar.bitmap) >> shift
+            bits |= bookings_mask(listing_id, today, tail_start, window_end)
+        calendar.origin = today
+        calendar.bitmap = _to_bytes(bits)
+        calendar.save(update_fields=['origin', 'bitmap', 'updated_at'])
+    return calendar
+
+
+def get_calendar(listing_id):
+    with transaction.atomic():
+        return _locked_calendar(listing_id, timezone.localdate())
+
+
+def mark_booked(booking):
+    """Set the nights of a new or confirmed booking."""
+    with transaction.atomic():
+        calendar = _locked_calendar(booking.listing_id_id, timezone.localdate())
+        mask = range_mask(calendar.origin, *nights(booking.start_date, booking.end_date))
+        if mask:
+            calendar.bitmap = _to_bytes(_to_int(calendar.bitmap) | mask)
+            calendar.save(update_fields=['bitmap', 'updated_at'])
+
+
+def mark_booked_many(bookings):
+    """Set the nights of many bookings, locking each listing's calendar once."""
+    by_listing = {}
+    for booking in bookings:
+        by_listing.setdefault(booking.listing_id_id, []).append(booking)
+
+    today = timezone.localdate()
+    for listing_id, listing_bookings in by_listing.items():
+        with transaction.atomic():
+            calendar = _locked_calendar(listing_id, today)
+            mask = 0
+            for booking in listing_bookings:
+                mask |= range_mask(calendar.origin, *nights(booking.start_date, booking.end_date))
+            if mask:
+                calendar.bitmap = _to_bytes(_to_int(calendar.bitmap) | mask)
+                calendar.save(update_fields=['bitmap', 'updated_at'])
+
+
+def release(booking):
+    """
+    Clear the nights of a canceled booking, keeping any that another
+    booking still holds.
+    """
+    with transaction.atomic():
+        calendar = _locked_calendar(booking.listing_id_id, timezone.localdate())
+        start_day, end_day = nights(booking.start_date, booking.end_date)
+        mask = range_mask(calendar.origin, start_day, end_day)
+        if mask:
+            bits = _to_int(calendar.bitmap) & ~mask
+            bits |= bookings_mask(booking.listing_id_id, calendar.origin, start_day, end_day)
+            calendar.bitmap = _to_bytes(bits)
+            calendar.save(update_fields=['bitmap', 'updated_at'])
+
+
+def rebook(before, after):
+    """
+    Move the nights of an edited booking. ``before`` is a copy taken before
+    the edit (listing, dates, status) and ``after`` the saved booking; pass
+    ``after=None`` for a deleted one.
+    """
+    if before.status in BLOCKING_STATUSES:
+        release(before)
+    if after is not None and after.status in BLOCKING_STATUSES:
+        mark_booked(after)
+
+
+def release_many(bookings):
+    """Clear the nights of many canceled bookings, one calendar lock per listing."""
+    by_listing = {}
+    for booking in bookings:
+        by_listing.setdefault(booking.listing_id_id, []).append(nights(booking.start_date, booking.end_date))
+
+    today = timezone.localdate()
+    for listing_id, stays in by_listing.items():
+        with transaction.atomic():
+            calendar = _locked_calendar(listing_id, today)
+            mask = 0
+            for start_day, end_day in stays:
+                mask |= range_mask(calendar.origin, start_day, end_day)
+            if mask:
+                first_day = min(start_day for start_day, _ in stays)
+                last_day = max(end_day for _, end_day in stays)
+                bits = _to_int(calendar.bitmap) & ~mask
+                bits |= bookings_mask(listing_id, calendar.origin, first_day, last_day) & mask
+                calendar.bitmap = _to_bytes(bits)
+                calendar.save(update_fields=['bitmap', 'updated_at'])
+
+
+def booked_ranges(calendar):
+    """[(first night, checkout day), ...] for the runs of set bits."""
+    bits = _to_int(calendar.bitmap)
+    ranges, day = [], 0
+    while bits and day < CALENDAR_DAYS:
+        if bits & 1:
+            run = 0
+            while bits & 1:
+                bits >>= 1
+                run += 1
+            ranges.append((calendar.origin + timedelta(days=day), calendar.origin + timedelta(days=day + run)))
+            day += run
+        else:
+            skip = (bits & -bits).bit_length() - 1
+            bits >>= skip
+            day += skip
+    return ranges
+
+
+def calendar_payload(calendar):
+    return {
+        'listing_id': calendar.listing_id_id,
+        'start': calendar.origin,
+        'days': CALENDAR_DAYS,
+        'bitmap': base64.b64encode(bytes(calendar.bitmap)).decode(),
+        'booked': [{'start': start, 'end': end} for start, end in booked_ranges(calendar)],
+    }
+
+
+def _check_window(today, start_day, end_day):
+    if start_day < today or end_day > today + timedelta(days=CALENDAR_DAYS) or end_day <= start_day:
+        raise ValueError(f'Dates must fall within the next {CALENDAR_DAYS} days')
+
+
+def _build_missing(listing_ids, today):
+    """
+    Create calendars for listings that have none, reading their bookings
+    with one query. Returns {listing_id: bitmap bytes}.
+    """
+    window_end = today + timedelta(days=CALENDAR_DAYS)
+    bits = dict.fromkeys(listing_ids, 0)
+    bookings = Booking.objects.filter(
+        listing_id__in=listing_ids,
+        status__in=BLOCKING_STATUSES,
+        start_date__lt=midnight(window_end),
+        end_date__gte=midnight(today),
+    ).values_list('listing_id', 'start_date', 'end_date')
+    for listing_id, start, end in bookings:
+        bits[listing_id] |= range_mask(today, *nights(start, end))
+    bitmaps = {listing_id: _to_bytes(value) for listing_id, value in bits.items()}
+    # A calendar created meanwhile by mark_booked() wins; it already has these bookings.
+    ListingCalendar.objects.bulk_create(
+        [ListingCalendar(listing_id_id=listing_id, origin=today, bitmap=bitmap) for listing_id, bitmap in bitmaps.items()],
+        ignore_conflicts=True)
+    return bitmaps
+
+
+def available_listings(listing_ids, start_day, end_day):
+    """
+    Return the subset of ``listing_ids`` (at most AVAILABILITY_CHUNK_SIZE of
+    them) free for every night in [start_day, end_day). Raises ValueError
+    if the range is outside the calendar window.
+    """
+    today = timezone.localdate()
+    _check_window(today, start_day, end_day)
+
+    listing_ids = set(listing_ids)
+    calendars = dict(ListingCalendar.objects.filter(listing_id__in=listing_ids).values_list('listing_id', 'origin'))
+    bitmaps = dict(ListingCalendar.objects.filter(
+        listing_id__in=listing_ids, origin=today).values_list('listing_id', 'bitmap'))
+    # Missing calendars are built in bulk. Stale ones are rolled forward under
+    # their row lock (normally done nightly).
+    missing = listing_ids - set(calendars)
+    if missing:
+        bitmaps.update(_build_missing(missing, today))
+    for listing_id in set(calendars) - set(bitmaps):
+        bitmaps[listing_id] = get_calendar(listing_id).bitmap
+
+    mask = range_mask(today, start_day, end_day)
+    return {listing_id for listing_id, bitmap in bitmaps.items() if not _to_int(bitmap) & mask}
+
+
+def find_available(listing_ids, start_day, end_day, limit):
+    """
+    Scan ``listing_ids`` (an ordered iterable, e.g. a values_list iterator)
+    AVAILABILITY_CHUNK_SIZE at a time. Returns the first ``limit`` free
+    listings in that order and the id to resume after, or None when the
+    scan reached the end.
+    """
+    _check_window(timezone.localdate(), start_day, end_day)
+    free = []
+    chunk_size = settings.AVAILABILITY_CHUNK_SIZE
+    listing_ids = iter(listing_ids)
+    while chunk := list(islice(listing_ids, chunk_size)):
+        available = available_listings(chunk, start_day, end_day)
+        free += [listing_id for listing_id in chunk if listing_id in available]
+        if len(free) >= limit:
+            return free[:limit], free[limit - 1]
+    return free, None
+
+
+def roll_forward_all(batch_size=500):
+    """Move every calendar's window to start today. Returns the number rolled."""
+    today = timezone.localdate()
+    stale = ListingCalendar.objects.filter(origin__lt=today).values_list('listing_id', flat=True)
+    rolled = 0
+    for listing_id in stale.iterator(chunk_size=batch_size):
+        get_calendar(listing_id)
+        rolled += 1
+    return rolled
@@ -0,0 +1,149 @@
+"""
+Live payment status for GET /api/payments/<tx_ref>/events/.
+
+Payment state changes are published to Redis on ``payments:<tx_ref>``.
+Each ASGI worker holds a single pattern subscription and fans messages
+out to the streams waiting on that tx_ref, so an open stream costs one
+status read when it connects and no database or gateway work after that.
+"""
+import asyncio
+import contextlib
+import logging
+
+import orjson
+import redis.asyncio
+from django.conf import settings
+from redis.exceptions import RedisError
+from .models import Payment
+from .redis_client import get_client
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'payments:'
+TERMINAL_STATUSES = ('successful', 'failed')
+EVENT_FIELDS = ('booking_reference', 'status', 'transaction_id', 'updated_at')
+
+
+def payment_event(values):
+    """Event body from a dict of EVENT_FIELDS."""
+    return {
+        'tx_ref': values['booking_reference'],
+        'status': values['status'],
+        'transaction_id': values['transaction_id'],
+        'updated_at': values['updated_at'],
+    }
+
+
+def publish(payment):
+    """Tell every stream waiting on this payment about its new state."""
+    event = payment_event({field: getattr(payment, field) for field in EVENT_FIELDS})
+    try:
+        get_client().publish(f'{CHANNEL_PREFIX}{payment.booking_reference}', orjson.dumps(event))
+    except RedisError as e:
+        logger.warning("Could not publish payment event for %s: %s", payment.booking_reference, e)
+
+
+class PaymentEventHub:
+    """One Redis pattern subscription per event loop, shared by all streams."""
+
+    def __init__(self):
+        self._waiters = {}
+        self._task = None
+        self._loop = None
+        self._settled = None
+
+    async def _run(self, settled):
+        backoff = 1
+        while True:
+            settled.clear()
+            client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+                backoff = 1
+                async for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        if message['type'] == 'psubscribe':
+                            # Redis has registered the pattern: later changes reach us.
+                            settled.set()
+                        continue
+                    tx_ref = message['channel'].decode()[len(CHANNEL_PREFIX):]
+                    for queue in self._waiters.get(tx_ref, ()):
+                        queue.put_nowait(message['data'])
+            except (RedisError, OSError) as e:
+                logger.warning("Payment event subscription lost: %s", e)
+                # Streams opened while Redis is down don't wait for it.
+                settled.set()
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                await pubsub.reset()
+                await client.close()
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._settled = asyncio.Event()
+            self._task = loop.create_task(self._run(self._settled))
+
+    async def subscribed(self, timeout):
+        """
+        Wait, at most ``timeout`` seconds, until Redis has confirmed the
+        subscription or the attempt to subscribe has failed.
+        """
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._settled.wait(), timeout)
+
+    @contextlib.contextmanager
+    def listen(self, tx_ref):
+        """A queue that receives the raw events published for ``tx_ref``."""
+        self._ensure_running()
+        queue = asyncio.Queue()
+        self._waiters.setdefault(tx_ref, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            waiters = self._waiters.get(tx_ref)
+            waiters.discard(queue)
+            if not waiters:
+                del self._waiters[tx_ref]
+
+
+hub = PaymentEventHub()
+
+
+def _sse(data, event='status'):
+    if not isinstance(data, bytes):
+        data = orjson.dumps(data)
+    return b'event: ' + event.encode() + b'\ndata: ' + data + b'\n\n'
+
+
+async def stream(tx_ref):
+    """
+    SSE frames for one payment: its current state, then every change until
+    it succeeds or fails, with keep-alive comments in between. Gives up
+    after PAYMENT_EVENTS_TIMEOUT seconds.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.PAYMENT_EVENTS_TIMEOUT
+    # Subscribe before reading the current state so no change is missed.
+    with hub.listen(tx_ref) as queue:
+        await hub.subscribed(min(settings.PAYMENT_EVENTS_KEEPALIVE, deadline - loop.time()))
+        current = await Payment.objects.filter(booking_reference=tx_ref).values(*EVENT_FIELDS).afirst()
+        if current is None:
+            return
+        yield _sse(payment_event(current))
+        status = current['status']
+        while status not in TERMINAL_STATUSES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                yield _sse({'detail': 'timeout'}, event='timeout')
+                return
+            try:
+                data = await asyncio.wait_for(queue.get(), min(settings.PAYMENT_EVENTS_KEEPALIVE, remaining))
+            except asyncio.TimeoutError:
+                yield b': keep-alive\n\n'
+                continue
+            status = orjson.loads(data).get('status')
+            yield _sse(data)
@@ -0,0 +1,203 @@
+"""
+Request and task profiling.
+
+On demand: a staff user sends ``X-Profile: cprofile`` (or ``pyinstrument``,
+when that package is installed) and gets the profile report back instead
+of the response. The original status is kept in ``X-Profiled-Status``.
+
+Sampled: PROFILING_SAMPLE_RATE of requests (and PROFILING_TASK_SAMPLE_RATE
+of the tasks wrapped with ``profile_task``) run under cProfile with their
+SQL recorded. Those slower than PROFILING_SAMPLE_MIN_MS are logged on
+``listings.profiles`` with their hottest functions and statements.
+
+With the sample rate at 0 and PROFILING_HEADER unset, the middleware
+removes itself at startup. The task decorator then costs one settings
+lookup per call.
+"""
+import cProfile
+import functools
+import io
+import logging
+import pstats
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+
+try:
+    import pyinstrument
+except ImportError:  # pyinstrument is optional; cProfile is always available
+    pyinstrument = None
+
+logger = logging.getLogger('listings.profiles')
+
+# Only one profiler can be active per process on Python 3.12+, so profiles
+# never overlap; a request that would wait is simply not profiled.
+_profiler_lock = threading.Lock()
+
+
+class SQLRecorder:
+    """Collects (sql, seconds) for every query run on any connection."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def top(self, limit):
+        """The ``limit`` statements with the most total time, grouped by SQL text."""
+        grouped = {}
+        for sql, seconds in self.queries:
+            count, total = grouped.get(sql, (0, 0.0))
+            grouped[sql] = (count + 1, total + seconds)
+        ranked = sorted(grouped.items(), key=lambda item: -item[1][1])[:limit]
+        return [{'sql': sql, 'count': count, 'ms': round(total * 1000, 2)} for sql, (count, total) in ranked]
+
+
+@contextmanager
+def record_sql():
+    recorder = SQLRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+def hot_frames(profiler, limit):
+    """The ``limit`` functions with the most own time in a cProfile run."""
+    stats = pstats.Stats(profiler)
+    ranked = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:limit]
+    return [
+        {'function': f'{filename}:{line}({name})', 'calls': calls,
+         'own_ms': round(own * 1000, 2), 'cumulative_ms': round(cumulative * 1000, 2)}
+        for (filename, line, name), (_, calls, own, cumulative, _) in ranked
+    ]
+
+
+def cprofile_text(profiler, limit):
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+
+def run_sampled(label, func, *args, **kwargs):
+    """Run ``func`` under cProfile and log its profile if it was slow enough."""
+    if not _profiler_lock.acquire(blocking=False):
+        return func(*args, **kwargs)
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    try:
+        with record_sql() as sql:
+            profiler.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _profiler_lock.release()
+        if elapsed_ms >= settings.PROFILING_SAMPLE_MIN_MS:
+            logger.info("Profiled %s in %.1fms", label, elapsed_ms, extra={
+                'profile': {
+                    'target': label,
+                    'ms': round(elapsed_ms, 2),
+                    'queries': len(sql.queries),
+                    'frames': hot_frames(profiler, settings.PROFILING_TOP_FRAMES),
+                    'sql': sql.top(settings.PROFILING_TOP_QUERIES),
+                },
+            })
+
+
+class ProfilingMiddleware:
+    """On-demand (staff, X-Profile header) and sampled request profiling."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = settings.PROFILING_HEADER
+        self.meta_key = f"HTTP_{self.header.upper().replace('-', '_')}" if self.header else None
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        if not self.meta_key and not self.sample_rate:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if self.meta_key:
+            engine = request.META.get(self.meta_key)
+            if engine and is_staff(request):
+                return self.profile_on_demand(request, engine.lower())
+        if self.sample_rate and random.random() < self.sample_rate:
+            return run_sampled(request.path, self.get_response, request)
+        return self.get_response(request)
+
+    def profile_on_demand(self, request, engine):
+        if engine == 'pyinstrument' and pyinstrument is None:
+            return HttpResponse('pyinstrument is not installed\n', status=400, content_type='text/plain')
+        if not _profiler_lock.acquire(timeout=settings.PROFILING_LOCK_TIMEOUT):
+            return HttpResponse('Another profile is running\n', status=503, content_type='text/plain')
+        try:
+            with record_sql() as sql:
+                if engine == 'pyinstrument':
+                    profiler = pyinstrument.Profiler()
+                    with profiler:
+                        response = self.get_response(request)
+                    report = HttpResponse(profiler.output_html(), content_type='text/html')
+                else:
+                    profiler = cProfile.Profile()
+                    profiler.enable()
+                    try:
+                        response = self.get_response(request)
+                    finally:
+                        profiler.disable()
+                    queries = '\n'.join(f"{query['ms']:10.2f}ms  x{query['count']:<4} {query['sql']}"
+                                        for query in sql.top(settings.PROFILING_TOP_QUERIES))
+                    report = HttpResponse(
+                        cprofile_text(profiler, settings.PROFILING_TOP_FRAMES)
+                        + f'\n{len(sql.queries)} SQL queries, slowest first:\n{queries}\n',
+                        content_type='text/plain')
+        finally:
+            _profiler_lock.release()
+        report['X-Profiled-Status'] = str(response.status_code)
+        report['Cache-Control'] = 'no-store'
+        return report
+
+
+def is_staff(request):
+    """
+    Whether the request comes from a staff user. API clients authenticate
+    in the view (DRF), so a token is checked here too. That costs a query,
+    but only for requests that carry the profiling header.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    from rest_framework.authentication import TokenAuthentication
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework.request import Request
+    try:
+        authenticated = TokenAuthentication().authenticate(Request(request))
+    except AuthenticationFailed:
+        return False
+    return bool(authenticated and authenticated[0].is_staff)
+
+
+def profile_task(func):
+    """
+    Profile a Celery task: every call when its name is in PROFILING_TASKS,
+    otherwise PROFILING_TASK_SAMPLE_RATE of calls. Goes under @shared_task.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        rate = settings.PROFILING_TASK_SAMPLE_RATE
+        if (rate and random.random() < rate) or func.__name__ in settings.PROFILING_TASKS:
+            return run_sampled(f'task:{func.__name__}', func, *args, **kwargs)
+        return func(*args, **kwargs)
+    return wrapper
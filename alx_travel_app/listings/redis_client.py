@@ -0,0 +1,70 @@
+"""
+Shared Redis connection used for cross-process signalling (version
+stamps, pub/sub). redis-py re-creates its pool after a fork, so the
+client is safe to create lazily in preforked workers.
+
+Connections go through a per-process circuit breaker. After a failed
+connect, Redis is skipped for REDIS_BREAKER_SECONDS: connecting raises
+RedisUnavailable (a redis ConnectionError) at once instead of waiting
+for the connect timeout again, so callers' RedisError fallbacks stay
+fast while Redis is down. BreakerConnectionPool applies the same breaker
+to other clients, e.g. the Redis cache backend.
+"""
+import time
+
+import redis
+from django.conf import settings
+from redis.exceptions import ConnectionError, TimeoutError
+
+_client = None
+_open_until = 0.0
+_connection_classes = {}
+
+
+class RedisUnavailable(ConnectionError):
+    """Raised instead of connecting while the breaker is open."""
+
+
+def available():
+    """False while Redis is being skipped after a connection error."""
+    return time.monotonic() >= _open_until
+
+
+def trip():
+    """Skip Redis in this process for the next REDIS_BREAKER_SECONDS."""
+    global _open_until
+    _open_until = time.monotonic() + settings.REDIS_BREAKER_SECONDS
+
+
+class _BreakerMixin:
+    def connect(self):
+        if self._sock is None and not available():
+            raise RedisUnavailable('Skipping Redis after a recent connection error')
+        try:
+            super().connect()
+        except (ConnectionError, TimeoutError):
+            trip()
+            raise
+
+
+def _with_breaker(connection_class):
+    if connection_class not in _connection_classes:
+        _connection_classes[connection_class] = type(
+            f'Breaker{connection_class.__name__}', (_BreakerMixin, connection_class), {})
+    return _connection_classes[connection_class]
+
+
+class BreakerConnectionPool(redis.ConnectionPool):
+    """A ConnectionPool (any URL scheme) whose connections use the breaker."""
+
+    def __init__(self, connection_class=redis.Connection, **kwargs):
+        super().__init__(connection_class=_with_breaker(connection_class), **kwargs)
+
+
+def get_client():
+    global _client
+    if _client is None:
+        pool = BreakerConnectionPool.from_url(settings.REDIS_URL, socket_connect_timeout=1, socket_timeout=2,
+                                              health_check_interval=30)
+        _client = redis.Redis(connection_pool=pool)
+    return _client
@@ -0,0 +1,90 @@
+import datetime
+import decimal
+
+import orjson
+from django.db.models.query import QuerySet
+from django.utils.functional import Promise
+from django.utils.timezone import is_aware
+from rest_framework.settings import api_settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+
+def _default(obj):
+    """
+    Encoding for values that did not go through a serializer field, so
+    they come out the way a field would have rendered them. Decimals
+    follow COERCE_DECIMAL_TO_STRING, like DecimalField. Dates and times
+    follow DjangoJSONEncoder: microseconds are cut to milliseconds and
+    UTC becomes "Z". Other types follow DRF's JSONEncoder.
+    """
+    if isinstance(obj, Promise):
+        return str(obj)
+    if isinstance(obj, decimal.Decimal):
+        return str(obj) if api_settings.COERCE_DECIMAL_TO_STRING else float(obj)
+    if isinstance(obj, datetime.datetime):
+        representation = obj.isoformat()
+        if obj.microsecond:
+            representation = representation[:23] + representation[26:]
+        if representation.endswith('+00:00'):
+            representation = representation.removesuffix('+00:00') + 'Z'
+        return representation
+    if isinstance(obj, datetime.date):
+        return obj.isoformat()
+    if isinstance(obj, datetime.time):
+        if is_aware(obj):
+            raise ValueError("JSON can't represent timezone-aware times.")
+        representation = obj.isoformat()
+        return representation[:12] if obj.microsecond else representation
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, QuerySet):
+        return list(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    Drop-in replacement for rest_framework.renderers.JSONRenderer backed by
+    orjson. UUID and dict/list subclasses (ReturnDict/ReturnList) are
+    encoded natively. Decimal, dates and times, and lazy strings go
+    through _default.
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        option = orjson.OPT_PASSTHROUGH_DATETIME
+        if accepted_media_type and 'indent=' in accepted_media_type:
+            option |= orjson.OPT_INDENT_2
+
+        ret = orjson.dumps(data, default=_default, option=option)
+        # Same as DRF: keep U+2028/U+2029 from breaking JSONP/inline <script> use.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class ORJSONParser(BaseParser):
+    """
+    Parses JSON request bodies with orjson.
+    """
+    media_type = 'application/json'
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
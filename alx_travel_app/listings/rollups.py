@@ -0,0 +1,203 @@
+"""
+Listing x day rollups for host analytics.
+
+ListingDailyStats holds, per listing and local day, the confirmed nights
+booked, the revenue from successful payments and the reviews received.
+Dashboards only ever read these rows. They are recomputed for the
+affected listing and days whenever a booking, payment or review changes,
+re-checked nightly by a catch-up task, and can be rebuilt for any range
+with ``manage.py rebuild_listing_stats``.
+
+Payments are attributed to a listing through their booking, and to the
+day they first succeeded (``paid_at``).
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from .models import Booking, ListingDailyStats, Payment, Review
+from .occupancy import local_day, midnight, nights
+
+INTERVALS = ('day', 'month')
+REBUILD_CHUNK_DAYS = 31
+
+
+def _days(start_day, end_day):
+    day = start_day
+    while day < end_day:
+        yield day
+        day += timedelta(days=1)
+
+
+def rebuild(start_day, end_day, listing_ids=None):
+    """
+    Recompute the rows for [start_day, end_day), for every listing or only
+    ``listing_ids``. Each source table is read with one query. Returns the
+    number of rows written.
+    """
+    rows = {}
+
+    def row(listing_id, day):
+        key = (listing_id, day)
+        if key not in rows:
+            rows[key] = ListingDailyStats(listing_id_id=listing_id, day=day)
+        return rows[key]
+
+    window_start, window_end = midnight(start_day), midnight(end_day)
+
+    bookings = Booking.objects.filter(status=Booking.Status.CONFIRMED,
+                                      start_date__lt=window_end, end_date__gte=window_start)
+    reviews = Review.objects.filter(created_at__gte=window_start, created_at__lt=window_end)
+    if listing_ids is not None:
+        bookings = bookings.filter(listing_id__in=listing_ids)
+        reviews = reviews.filter(listing_id__in=listing_ids)
+
+    for listing_id, start, end in bookings.values_list('listing_id', 'start_date', 'end_date').iterator(chunk_size=2000):
+        first, last = nights(start, end)
+        for day in _days(max(first, start_day), min(last, end_day)):
+            row(listing_id, day).booked_nights += 1
+
+    per_day = reviews.annotate(day=TruncDate('created_at')).values('listing_id', 'day').annotate(
+        count=Count('pk'), total=Sum('rating')).order_by()
+    for item in per_day:
+        stats = row(item['listing_id'], item['day'])
+        stats.review_count, stats.rating_sum = item['count'], item['total']
+
+    payments = Payment.objects.filter(status='successful', booking_id__isnull=False,
+                                      paid_at__gte=window_start, paid_at__lt=window_end)
+    if listing_ids is not None:
+        payments = payments.filter(booking_id__listing_id__in=listing_ids)
+    for listing_id, amount, paid_at in payments.values_list('booking_id__listing_id', 'amount', 'paid_at'):
+        row(listing_id, local_day(paid_at)).revenue += amount
+
+    existing = ListingDailyStats.objects.filter(day__gte=start_day, day__lt=end_day)
+    if listing_ids is not None:
+        existing = existing.filter(listing_id__in=listing_ids)
+    with transaction.atomic():
+        existing.delete()
+        # A concurrent rebuild of the same rows may insert them first; update
+        # those instead of failing on listing_daily_stats_unique.
+        ListingDailyStats.objects.bulk_create(
+            rows.values(), batch_size=1000, update_conflicts=True, unique_fields=['listing_id', 'day'],
+            update_fields=['booked_nights', 'revenue', 'review_count', 'rating_sum'])
+    return len(rows)
+
+
+def rebuild_range(start_day, end_day, listing_ids=None, chunk_days=REBUILD_CHUNK_DAYS):
+    """rebuild() in chunks of ``chunk_days`` so memory stays bounded. Yields (chunk start, rows)."""
+    chunk_start = start_day
+    while chunk_start < end_day:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), end_day)
+        yield chunk_start, rebuild(chunk_start, chunk_end, listing_ids)
+        chunk_start = chunk_end
+
+
+def refresh_bookings(bookings):
+    """
+    Recompute the nights of bookings that were confirmed, canceled, edited
+    or deleted, per listing. For an edit, pass copies from before and after.
+    """
+    spans = {}
+    for booking in bookings:
+        first, last = nights(booking.start_date, booking.end_date)
+        start, end = spans.get(booking.listing_id_id, (first, last))
+        spans[booking.listing_id_id] = (min(start, first), max(end, last))
+    for listing_id, (start_day, end_day) in spans.items():
+        rebuild(start_day, end_day, [listing_id])
+
+
+def refresh_booking(booking):
+    refresh_bookings([booking])
+
+
+def refresh_payment(payment):
+    """Recompute the revenue day of a payment whose status changed."""
+    listing_id = Booking.objects.filter(booking_id=payment.booking_id_id).values_list('listing_id', flat=True).first() \
+        if payment.booking_id_id else None
+    if listing_id is not None and payment.paid_at is not None:
+        day = local_day(payment.paid_at)
+        rebuild(day, day + timedelta(days=1), [listing_id])
+
+
+def refresh_reviews(reviews):
+    """Recompute the review days of reviews that were created, edited or deleted."""
+    for listing_id, day in {(review.listing_id_id, local_day(review.created_at)) for review in reviews}:
+        rebuild(day, day + timedelta(days=1), [listing_id])
+
+
+def refresh_review(review):
+    refresh_reviews([review])
+
+
+def _periods(since, until, interval):
+    """Period start dates covering [since, until]."""
+    if interval == 'day':
+        return list(_days(since, until + timedelta(days=1)))
+    periods, month = [], since.replace(day=1)
+    while month <= until:
+        periods.append(month)
+        month = (month + timedelta(days=32)).replace(day=1)
+    return periods
+
+
+def _metrics(values, days, listings):
+    booked = values.get('booked_nights') or 0
+    reviews = values.get('review_count') or 0
+    return {
+        'booked_nights': booked,
+        'occupancy_rate': round(booked / (days * listings), 4) if days and listings else 0.0,
+        'revenue': values.get('revenue') or Decimal('0.00'),
+        'review_count': reviews,
+        'average_rating': round(values['rating_sum'] / reviews, 2) if reviews else None,
+    }
+
+
+SUMS = {
+    'booked_nights': Sum('booked_nights'),
+    'revenue': Sum('revenue'),
+    'review_count': Sum('review_count'),
+    'rating_sum': Sum('rating_sum'),
+}
+
+
+def summarize(queryset, since, until, interval='day', listings=1):
+    """
+    Totals and a gap-free series over [since, until] for a queryset of
+    ListingDailyStats. ``listings`` is the number of listings the
+    queryset spans, used for the occupancy rate.
+    """
+    queryset = queryset.filter(day__gte=since, day__lte=until)
+    if interval == 'day':
+        grouped = queryset.values(period=F('day'))
+    else:
+        grouped = queryset.annotate(period=TruncMonth('day')).values('period')
+    by_period = {item['period']: item for item in grouped.annotate(**SUMS).order_by()}
+
+    series = []
+    for period in _periods(since, until, interval):
+        if interval == 'day':
+            days = 1
+        else:
+            next_month = (period + timedelta(days=32)).replace(day=1)
+            days = (min(next_month, until + timedelta(days=1)) - max(period, since)).days
+        series.append({'period': period, **_metrics(by_period.get(period, {}), days, listings)})
+
+    total_days = (until - since).days + 1
+    return {
+        'since': since,
+        'until': until,
+        'interval': interval,
+        'totals': _metrics(queryset.aggregate(**SUMS), total_days, listings),
+        'series': series,
+    }
+
+
+def per_listing(queryset, since, until):
+    """Totals per listing over [since, until], highest revenue first."""
+    days = (until - since).days + 1
+    grouped = (queryset.filter(day__gte=since, day__lte=until)
+               .values('listing_id', 'listing_id__title').annotate(**SUMS).order_by('-revenue'))
+    return [{'listing_id': item['listing_id'], 'title': item['listing_id__title'], **_metrics(item, days, 1)}
+            for item in grouped]
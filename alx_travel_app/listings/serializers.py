@@ -1,10 +1,88 @@
 from rest_framework import serializers
-from .models import CustomUser, Listing, Booking, Review, Payment
+from .models import CustomUser, Listing, ListingImport, Booking, Review, Payment
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework.exceptions import ValidationError as DRFValidationError, PermissionDenied
+from rest_framework.permissions import SAFE_METHODS
+from django.db import IntegrityError, transaction
+from .availability import BookingConflict, create_booking, is_overlap_violation, reserve
+from .fastpath import orm_path
 
-class CustomUserSerializer(serializers.ModelSerializer):
+
+def _split_param(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    Adds sparse fieldsets and expandable relations to read requests:
+
+        ?fields=booking_id,listing.title
+        ?expand=listing,user
+
+    Expandable relations are declared on the subclass as
+    ``expandable_fields = {name: (SerializerClass, {field kwargs})}``.
+    Dotted names in ``fields`` select fields of an expanded relation.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+
+        request = self.context.get('request')
+        if fields is None and expand is None and request is not None and request.method in SAFE_METHODS:
+            fields = _split_param(request.query_params.get('fields'))
+            expand = _split_param(request.query_params.get('expand'))
+
+        for name in expand or []:
+            if name not in self.expandable_fields:
+                continue
+            serializer_class, options = self.expandable_fields[name]
+            prefix = f'{name}.'
+            nested_fields = [field[len(prefix):] for field in fields or [] if field.startswith(prefix)]
+            self.fields[name] = serializer_class(read_only=True, fields=nested_fields, expand=[], **options)
+
+        if fields:
+            requested = {field.split('.', 1)[0] for field in fields}
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+    def narrow_queryset(self, queryset):
+        """
+        Restrict ``queryset`` to the columns this serializer will read, and
+        join the relations it traverses, so sparse responses fetch less.
+        """
+        only, related = self._query_paths()
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*only)
+
+    def _query_paths(self, prefix=''):
+        model = self.Meta.model
+        only, related = [prefix + model._meta.pk.name], []
+        for field in self._readable_fields:
+            if isinstance(field, DynamicFieldsModelSerializer):
+                path = prefix + '__'.join(field.source_attrs)
+                related.append(path)
+                only.append(path)
+                nested_only, nested_related = field._query_paths(f'{path}__')
+                only += nested_only
+                related += nested_related
+                continue
+            path = orm_path(model, field.source_attrs)
+            if path is None:
+                continue
+            if len(field.source_attrs) > 1:
+                relation = prefix + '__'.join(field.source_attrs[:-1])
+                related.append(relation)
+                only.append(relation)
+            only.append(prefix + path)
+        return only, related
+
+
+class CustomUserSerializer(DynamicFieldsModelSerializer):
     password = serializers.CharField(write_only=True)
     class Meta:
         model = CustomUser
@@ -21,7 +99,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
         user.save()
         return user
 
-class ListingSerializer(serializers.ModelSerializer):
+class ListingSerializer(DynamicFieldsModelSerializer):
     host = serializers.PrimaryKeyRelatedField(queryset=CustomUser.objects.all())
     host = serializers.ReadOnlyField(source='host.user_id')
     class Meta:
@@ -32,15 +110,66 @@ class ListingSerializer(serializers.ModelSerializer):
                   "created_at", "is_active"]
     
     
-class BookingSerializer(serializers.ModelSerializer):
+class ListingImportRowSerializer(serializers.ModelSerializer):
+    """One row of a listing import. The host is the import's, not the row's."""
+    class Meta:
+        model = Listing
+        fields = ["title", "description", "street", "city",
+                  "state", "postal_code", "country", "is_active"]
+
+
+class ListingImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ListingImport
+        fields = ["import_id", "file_format", "status", "rows_processed",
+                  "rows_created", "rows_failed", "errors", "error",
+                  "created_at", "updated_at"]
+        read_only_fields = fields
+
+
+class BookingSerializer(DynamicFieldsModelSerializer):
     listing_id = serializers.PrimaryKeyRelatedField(queryset=Listing.objects.all())
     user_id = serializers.PrimaryKeyRelatedField(queryset=CustomUser.objects.all())
     user = serializers.ReadOnlyField(source='user.user_id')
+    expandable_fields = {
+        'listing': (ListingSerializer, {'source': 'listing_id'}),
+        'user': (CustomUserSerializer, {'source': 'user_id'}),
+    }
     class Meta:
         model = Booking
         fields = ["booking_id", "listing_id", "user_id",
                   "start_date", "end_date", "status", "user",
                   "created_at"]
+
+    def validate(self, attrs):
+        start_date = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = attrs.get('end_date', getattr(self.instance, 'end_date', None))
+        if start_date and end_date and end_date <= start_date:
+            raise DRFValidationError({"end_date": ["end_date must be after start_date."]})
+        return attrs
+
+    def create(self, validated_data):
+        try:
+            return create_booking(**validated_data)
+        except BookingConflict as e:
+            raise DRFValidationError({"non_field_errors": [str(e)]})
+
+    def update(self, instance, validated_data):
+        listing = validated_data.get('listing_id', instance.listing_id)
+        try:
+            with transaction.atomic():
+                reserve(listing.pk,
+                        validated_data.get('start_date', instance.start_date),
+                        validated_data.get('end_date', instance.end_date),
+                        validated_data.get('status', instance.status),
+                        exclude_pk=instance.pk)
+                return super().update(instance, validated_data)
+        except BookingConflict as e:
+            raise DRFValidationError({"non_field_errors": [str(e)]})
+        except IntegrityError as e:
+            if is_overlap_violation(e):
+                raise DRFValidationError({"non_field_errors": ["These dates overlap an existing booking for this listing."]})
+            raise
         
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -50,10 +179,26 @@ class BookingSerializer(serializers.ModelSerializer):
             raise PermissionDenied("You do not have permission to update this booking.")
         serializer.save()
 
-class ReviewSerializer(serializers.ModelSerializer):
+class BookingBulkItemSerializer(serializers.Serializer):
+    """One entry of a bulk booking request. Listing lookup happens in bulk."""
+    listing_id = serializers.UUIDField()
+    start_date = serializers.DateTimeField()
+    end_date = serializers.DateTimeField()
+
+    def validate(self, attrs):
+        if attrs['end_date'] <= attrs['start_date']:
+            raise DRFValidationError({"end_date": ["end_date must be after start_date."]})
+        return attrs
+
+
+class ReviewSerializer(DynamicFieldsModelSerializer):
     listing_id = serializers.PrimaryKeyRelatedField(queryset=Listing.objects.all())
     user_id = serializers.PrimaryKeyRelatedField(queryset=CustomUser.objects.all())
     user = serializers.ReadOnlyField(source='user.user_id')
+    expandable_fields = {
+        'listing': (ListingSerializer, {'source': 'listing_id'}),
+        'user': (CustomUserSerializer, {'source': 'user_id'}),
+    }
     class Meta:
         model = Review
         fields = ["review_id", "listing_id", "user", "user_id", 
@@ -64,10 +209,11 @@ class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = [
-            "id", "user", "booking_reference", "transaction_id",
-            "amount", "currency", "status", "created_at", "updated_at"
+            "id", "user_id", "booking_id", "booking_reference", "transaction_id",
+            "amount", "currency", "status", "checkout_url", "created_at", "updated_at"
         ]
-        read_only_fields = ["id", "transaction_id", "status", "created_at", "updated_at"]
+        read_only_fields = ["id", "user_id", "booking_id", "transaction_id", "status", "checkout_url",
+                            "created_at", "updated_at"]
     
 
 
@@ -0,0 +1,322 @@
+"""
+"Similar listings" from TF-IDF vectors of title, description and location.
+
+Every active listing becomes a sparse, L2-normalised TF-IDF row, so the
+cosine similarity of all pairs is X @ X.T. That product is computed a
+block of rows at a time and only the top K of each row is kept, in
+ListingNeighbors. The full build runs nightly and saves the fitted model
+(vocabulary, IDF weights and the matrix) to storage. In between,
+refresh_changed() reads only the listings saved since the model was, folds
+their rows into the stored matrix using the stored vocabulary and IDF, and
+multiplies just those rows. It then merges them into the lists of the
+listings they are most similar to. Terms new since the nightly build, and
+anything that merge misses, are picked up by the next full build.
+
+NumPy and SciPy are imported inside the build functions: web processes
+only read the stored rows and should not pay for importing them.
+"""
+import hashlib
+import io
+import re
+import sys
+import uuid
+from array import array
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from .models import Listing, ListingNeighbors
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or our the this to with you your'.split()
+)
+TITLE_WEIGHT = 2
+# Words in more than this share of listings make every block product dense
+# (its cost grows with the listings that share a term) while adding little
+# signal, so they are dropped once the corpus reaches MAX_DF_CORPUS listings.
+# Location terms are always kept.
+MAX_DF = 0.05
+MAX_DF_CORPUS = 1000
+# Incremental refresh looks at this many x K of a changed listing's nearest
+# rows when merging it into other listings' neighbor lists.
+REVERSE_CANDIDATES = 4
+
+CORPUS_FIELDS = ('listing_id', 'title', 'description', 'city', 'state', 'country')
+
+
+def _words(text):
+    return [word for word in TOKEN_RE.findall(text.lower()) if len(word) > 1 and word not in STOP_WORDS]
+
+
+def terms(title, description, city, state, country):
+    """Bag of terms for one listing. Location values are kept whole."""
+    location = [f'{name}={value.strip().lower()}'
+                for name, value in (('city', city), ('state', state), ('country', country)) if value.strip()]
+    return _words(title) * TITLE_WEIGHT + _words(description) + location
+
+
+def signature(title, description, city, state, country):
+    text = '\x1f'.join((title, description, city, state, country))
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+def _term_counts(documents, vocabulary, grow=True):
+    """
+    CSR matrix of raw term counts, and the column of every stored count.
+    New terms are added to ``vocabulary`` when ``grow``, else dropped.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    rows, cols, counts = array('i'), array('i'), array('f')
+    n_docs = 0
+    for n_docs, document in enumerate(documents, 1):
+        for term, count in Counter(document).items():
+            col = vocabulary.setdefault(term, len(vocabulary)) if grow else vocabulary.get(term)
+            if col is not None:
+                rows.append(n_docs - 1)
+                cols.append(col)
+                counts.append(count)
+
+    cols = np.frombuffer(cols, dtype=np.int32)
+    matrix = sparse.csr_matrix(
+        (np.frombuffer(counts, dtype=np.float32), (np.frombuffer(rows, dtype=np.int32), cols)),
+        shape=(n_docs, len(vocabulary)), dtype=np.float32)
+    return matrix, cols
+
+
+def _weigh(matrix, idf):
+    """Sublinear tf x ``idf``, L2-normalised per row."""
+    import numpy as np
+    from scipy import sparse
+
+    if not matrix.nnz:
+        return matrix
+    matrix.data = 1 + np.log(matrix.data)
+    matrix = (matrix @ sparse.diags(idf)).tocsr()
+    matrix.eliminate_zeros()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags((1 / norms).astype(np.float32)) @ matrix).tocsr()
+
+
+def fit(documents):
+    """
+    (vocabulary, idf, matrix) for an iterable of term lists. ``matrix``
+    holds L2-normalised TF-IDF rows (float32) with sublinear tf and
+    smoothed idf.
+    """
+    import numpy as np
+
+    vocabulary = {}
+    matrix, cols = _term_counts(documents, vocabulary)
+    n_docs = matrix.shape[0]
+    df = np.bincount(cols, minlength=len(vocabulary))
+    idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+    if n_docs >= MAX_DF_CORPUS:
+        words = np.fromiter(('=' not in term for term in vocabulary), dtype=bool, count=len(vocabulary))
+        idf[words & (df > MAX_DF * n_docs)] = 0
+    return vocabulary, idf, _weigh(matrix, idf)
+
+
+def vectorize(documents):
+    """The TF-IDF matrix of fit()."""
+    return fit(documents)[2]
+
+
+def transform(documents, vocabulary, idf):
+    """TF-IDF rows for term lists with an already fitted vocabulary and idf."""
+    return _weigh(_term_counts(documents, vocabulary, grow=False)[0], idf)
+
+
+def nearest(matrix, rows, k, block_size=None):
+    """
+    Yield (row, neighbor rows, scores) for each of ``rows``, best first,
+    computing ``block_size`` rows of the similarity matrix at a time.
+    Zero-similarity rows are never neighbors.
+    """
+    import numpy as np
+
+    block_size = block_size or settings.SIMILAR_LISTINGS_BLOCK_SIZE
+    transposed = matrix.T.tocsc()
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        product = (matrix[block] @ transposed).tocsr()
+        for offset, row in enumerate(block):
+            lo, hi = product.indptr[offset], product.indptr[offset + 1]
+            cols, scores = product.indices[lo:hi], product.data[lo:hi]
+            keep = cols != row
+            cols, scores = cols[keep], scores[keep]
+            if len(scores) > k:
+                top = np.argpartition(-scores, k)[:k]
+                cols, scores = cols[top], scores[top]
+            order = np.argsort(-scores, kind='stable')
+            yield row, cols[order], scores[order]
+
+
+def load_corpus():
+    """(listing ids, text signatures, vocabulary, idf, TF-IDF matrix) for every active listing."""
+    ids, signatures = [], []
+
+    def documents():
+        listings = Listing.objects.filter(is_active=True).order_by().values_list(*CORPUS_FIELDS)
+        for listing_id, *fields in listings.iterator(chunk_size=2000):
+            ids.append(listing_id)
+            signatures.append(signature(*fields))
+            yield terms(*fields)
+
+    vocabulary, idf, matrix = fit(documents())
+    return ids, signatures, vocabulary, idf, matrix
+
+
+def save_model(ids, vocabulary, idf, matrix, built_at):
+    """Store a fitted model, covering listings saved before ``built_at``."""
+    import numpy as np
+
+    buffer = io.BytesIO()
+    np.savez(buffer,
+             ids=np.frombuffer(b''.join(listing_id.bytes for listing_id in ids), dtype=np.uint8),
+             terms=np.frombuffer('\x1f'.join(vocabulary).encode(), dtype=np.uint8),
+             idf=idf, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+             shape=np.array(matrix.shape), built_at=np.array(built_at.timestamp()))
+    path = settings.SIMILAR_LISTINGS_MODEL_PATH
+    default_storage.delete(path)
+    default_storage.save(path, ContentFile(buffer.getvalue()))
+
+
+def load_model():
+    """(ids, vocabulary, idf, matrix, built_at) as saved by save_model(), or None."""
+    import numpy as np
+    from scipy import sparse
+
+    path = settings.SIMILAR_LISTINGS_MODEL_PATH
+    if not default_storage.exists(path):
+        return None
+    with default_storage.open(path, 'rb') as f:
+        arrays = np.load(io.BytesIO(f.read()))
+    raw_ids = arrays['ids'].tobytes()
+    ids = [uuid.UUID(bytes=raw_ids[i:i + 16]) for i in range(0, len(raw_ids), 16)]
+    terms = arrays['terms'].tobytes().decode()
+    vocabulary = {term: col for col, term in enumerate(terms.split('\x1f'))} if terms else {}
+    matrix = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(arrays['shape']))
+    built_at = datetime.fromtimestamp(float(arrays['built_at']), tz=dt_timezone.utc)
+    return ids, vocabulary, arrays['idf'], matrix, built_at
+
+
+def _floats(values):
+    scores = array('f', values)
+    if sys.byteorder != 'little':
+        scores.byteswap()
+    return scores
+
+
+def pack(neighbor_ids, scores):
+    return b''.join(listing_id.bytes for listing_id in neighbor_ids), _floats(scores).tobytes()
+
+
+def unpack(row):
+    """[(listing UUID, score), ...] from a ListingNeighbors row."""
+    raw_ids, scores = bytes(row.neighbor_ids), array('f')
+    scores.frombytes(bytes(row.scores))
+    if sys.byteorder != 'little':
+        scores.byteswap()
+    return [(uuid.UUID(bytes=raw_ids[i * 16:(i + 1) * 16]), float(score)) for i, score in enumerate(scores)]
+
+
+def _save(objects):
+    ListingNeighbors.objects.bulk_create(
+        objects, batch_size=1000, update_conflicts=True, unique_fields=['listing_id'],
+        update_fields=['neighbor_ids', 'scores', 'signature', 'updated_at'])
+
+
+def _neighbor_row(ids, signatures, row, cols, scores):
+    neighbor_ids, packed_scores = pack([ids[col] for col in cols], scores)
+    return ListingNeighbors(listing_id_id=ids[row], neighbor_ids=neighbor_ids,
+                            scores=packed_scores, signature=signatures[row])
+
+
+def rebuild_all(k=None, block_size=None):
+    """Recompute every active listing's neighbors. Returns the number of listings written."""
+    k = k or settings.SIMILAR_LISTINGS_K
+    built_at = timezone.now()
+    ids, signatures, vocabulary, idf, matrix = load_corpus()
+    written, pending = 0, []
+    for row, cols, scores in nearest(matrix, list(range(len(ids))), k, block_size):
+        pending.append(_neighbor_row(ids, signatures, row, cols, scores))
+        if len(pending) >= 1000:
+            _save(pending)
+            written, pending = written + len(pending), []
+    _save(pending)
+    ListingNeighbors.objects.filter(listing_id__is_active=False).delete()
+    save_model(ids, vocabulary, idf, matrix, built_at)
+    return written + len(pending)
+
+
+def refresh_changed(k=None, block_size=None):
+    """
+    Recompute neighbors for listings saved since the stored model was, and
+    merge them into the lists of the listings closest to them. Does a full
+    build instead when there is no stored model. Returns the number of
+    changed listings.
+    """
+    from scipy import sparse
+
+    k = k or settings.SIMILAR_LISTINGS_K
+    model = load_model()
+    if model is None:
+        return rebuild_all(k, block_size)
+    ids, vocabulary, idf, matrix, built_at = model
+
+    refreshed_at = timezone.now()
+    changed = list(Listing.objects.filter(updated_at__gte=built_at).order_by()
+                   .values_list(*CORPUS_FIELDS, 'is_active').iterator(chunk_size=2000))
+    ListingNeighbors.objects.filter(listing_id__is_active=False).delete()
+    if not changed:
+        return 0
+
+    # Changed rows move to the end of the matrix; deactivated listings drop out.
+    changed_ids = {listing_id for listing_id, *_ in changed}
+    active = [(listing_id, fields) for listing_id, *fields, is_active in changed if is_active]
+    keep = [row for row, listing_id in enumerate(ids) if listing_id not in changed_ids]
+    matrix = sparse.vstack(
+        [matrix[keep], transform((terms(*fields) for _, fields in active), vocabulary, idf)], format='csr')
+    ids = [ids[row] for row in keep] + [listing_id for listing_id, _ in active]
+    signatures = {listing_id: signature(*fields) for listing_id, fields in active}
+
+    objects, reverse = [], {}
+    for row, cols, scores in nearest(matrix, list(range(len(keep), len(ids))), k * REVERSE_CANDIDATES, block_size):
+        neighbor_ids, packed_scores = pack([ids[col] for col in cols[:k]], scores[:k])
+        objects.append(ListingNeighbors(listing_id_id=ids[row], neighbor_ids=neighbor_ids,
+                                        scores=packed_scores, signature=signatures[ids[row]]))
+        for col, score in zip(cols, scores):
+            if ids[col] not in changed_ids:
+                reverse.setdefault(ids[col], []).append((ids[row], float(score)))
+
+    others = list(reverse)
+    with transaction.atomic():
+        for start in range(0, len(others), 1000):
+            for existing in ListingNeighbors.objects.filter(listing_id__in=others[start:start + 1000]):
+                listing_id = existing.listing_id_id
+                merged = [(n, s) for n, s in unpack(existing) if n not in changed_ids] + reverse[listing_id]
+                merged.sort(key=lambda item: -item[1])
+                merged = merged[:k]
+                neighbor_ids, packed_scores = pack([n for n, _ in merged], [s for _, s in merged])
+                objects.append(ListingNeighbors(listing_id_id=listing_id, neighbor_ids=neighbor_ids,
+                                                scores=packed_scores, signature=existing.signature))
+        _save(objects)
+    save_model(ids, vocabulary, idf, matrix, refreshed_at)
+    return len(changed)
+
+
+def similar_to(listing_id, limit=None):
+    """[(listing UUID, score), ...] for a listing, best first; empty until the first build."""
+    row = ListingNeighbors.objects.filter(listing_id=listing_id).first()
+    if row is None:
+        return []
+    neighbors = unpack(row)
+    return neighbors[:limit] if limit else neighbors
@@ -1,14 +1,20 @@
 # listings/tasks.py
 from celery import shared_task
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.core.mail import EmailMultiAlternatives, get_connection, send_mail
 from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
 from .models import Payment
-from django.utils.html import strip_tags
-from .models import Booking
+from .models import Booking, ListingImport
+from . import chapa, emails, imports, occupancy, profiling, rollups, similarity
+from .availability import TRANSITIONS, set_status
+from .dedup import DebouncedTask
+import time
 import uuid
+import requests
 
 @shared_task
+@profiling.profile_task
 def send_payment_confirmation_email(payment_id):
     try:
         payment = Payment.objects.get(id=payment_id)
@@ -17,22 +23,24 @@ def send_payment_confirmation_email(payment_id):
 
     # Compose email
     subject = f"Payment Confirmation — {payment.booking_reference}"
-    to_email = payment.user.email if payment.user else None
+    to_email = payment.user_id.email if payment.user_id else None
     if not to_email:
         # no user email; skip
         return {"status": "skipped", "detail": "no user email available"}
     context = {
-        "payment": payment
+        "guest_name": payment.user_id.first_name or payment.user_id.username,
+        "payment": payment,
     }
-    # Render plain or HTML templates (create templates/payment_confirmation.html if you want)
-    message = render_to_string("emails/payment_confirmation.txt", context)
+    message, html_message = emails.render("payment_confirmation_email", context)
     # send_mail returns number of emails sent
-    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [to_email], fail_silently=False)
+    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [to_email], html_message=html_message,
+              fail_silently=False)
     return {"status": "sent", "to": to_email}
 
 
 
-@shared_task(bind=True, max_retries=3)
+@shared_task(bind=True, max_retries=3, base=DebouncedTask, notification_kind='booking-created')
+@profiling.profile_task
 def send_booking_confirmation_email(self, booking_id):
     """
     Send a booking confirmation email asynchronously.
@@ -40,8 +48,12 @@ def send_booking_confirmation_email(self, booking_id):
     Args:
         booking_id: The UUID of the booking to confirm
     
-    Retries up to 3 times if the task fails.
+    Retries up to 3 times if the task fails. Duplicates are dropped
+    (listings.dedup).
     """
+    statuses = self.resolve_statuses((str(booking_id),))
+    if not statuses:
+        return f'Confirmation for booking {booking_id} already sent'
     try:
         # Convert to UUID if it's a string
         if isinstance(booking_id, str):
@@ -63,9 +75,8 @@ def send_booking_confirmation_email(self, booking_id):
             'status': booking.get_status_display(),
         }
         
-        # Render HTML email template
-        html_message = render_to_string('listings/booking_confirmation_email.html', context)
-        plain_message = strip_tags(html_message)
+        # Render the plain-text and HTML parts
+        plain_message, html_message = emails.render('booking_confirmation_email', context)
         
         # Send email
         send_mail(
@@ -76,6 +87,7 @@ def send_booking_confirmation_email(self, booking_id):
             html_message=html_message,
             fail_silently=False,
         )
+        self.mark_sent(statuses)
         
         return f'Email sent successfully for booking {booking_id}'
         
@@ -86,50 +98,104 @@ def send_booking_confirmation_email(self, booking_id):
         raise self.retry(exc=exc, countdown=60)
 
 
-@shared_task(bind=True, max_retries=3)
+@shared_task(bind=True, max_retries=3, base=DebouncedTask, notification_kind='booking-created')
+@profiling.profile_task
+def send_group_booking_confirmation_email(self, booking_ids):
+    """
+    Send one confirmation email per guest covering a batch of bookings.
+    
+    Args:
+        booking_ids: List of booking UUID strings created together
+    """
+    statuses = self.resolve_statuses((booking_ids,))
+    try:
+        bookings = (Booking.objects.filter(booking_id__in=list(statuses))
+                    .select_related('listing_id', 'user_id')
+                    .order_by('start_date'))
+        
+        by_guest = {}
+        for booking in bookings:
+            by_guest.setdefault(booking.user_id, []).append({
+                'listing_title': booking.listing_id.title,
+                'start_date': booking.start_date,
+                'end_date': booking.end_date,
+                'booking_id': booking.booking_id,
+            })
+        
+        contexts = [
+            {'guest_name': guest.first_name or guest.username, 'bookings': guest_bookings}
+            for guest, guest_bookings in by_guest.items()
+        ]
+        messages = emails.render_many('group_booking_confirmation_email', contexts)
+        for (guest, guest_bookings), (plain_message, html_message) in zip(by_guest.items(), messages):
+            send_mail(
+                subject=f'Booking Confirmation - {len(guest_bookings)} bookings',
+                message=plain_message,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                recipient_list=[guest.email],
+                html_message=html_message,
+                fail_silently=False,
+            )
+        self.mark_sent(statuses)
+        
+        return f'Group confirmation sent for {len(statuses)} bookings to {len(by_guest)} guests'
+        
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=60)
+
+
+STATUS_EMAILS = {
+    'confirmed': ('Booking Confirmed', 'booking_confirmed_email'),
+    'canceled': ('Booking Cancelled', 'booking_cancelled_email'),
+}
+
+
+def _status_update_email(new_status):
+    """Subject prefix and email name for a booking status update."""
+    return STATUS_EMAILS.get(new_status, ('Booking Status Updated', 'booking_status_email'))
+
+
+def _status_update_context(booking, new_status):
+    return {
+        'guest_name': booking.user_id.first_name or booking.user_id.username,
+        'listing_title': booking.listing_id.title,
+        'booking_id': booking.booking_id,
+        'status': new_status.capitalize(),
+    }
+
+
+@shared_task(bind=True, max_retries=3, base=DebouncedTask, notification_kind='booking-status')
+@profiling.profile_task
 def send_booking_status_update_email(self, booking_id, new_status):
     """
-    Send a booking status update email.
+    Send a booking status update email about the booking's latest status,
+    which may be newer than ``new_status`` (listings.dedup).
     
     Args:
         booking_id: The UUID of the booking
         new_status: The new status of the booking
     """
+    statuses = self.resolve_statuses((str(booking_id), new_status))
+    if not statuses:
+        return f'Status update for booking {booking_id} already sent'
+    new_status = statuses[str(booking_id)]
     try:
         if isinstance(booking_id, str):
             booking_id = uuid.UUID(booking_id)
         
-        booking = Booking.objects.get(booking_id=booking_id)
-        
-        # Determine email subject and message based on status
-        if new_status == 'confirmed':
-            subject = f'Booking Confirmed - {booking.listing_id.title}'
-            template = 'listings/booking_confirmed_email.html'
-        elif new_status == 'canceled':
-            subject = f'Booking Cancelled - {booking.listing_id.title}'
-            template = 'listings/booking_cancelled_email.html'
-        else:
-            subject = f'Booking Status Updated - {booking.listing_id.title}'
-            template = 'listings/booking_status_email.html'
-        
-        context = {
-            'guest_name': booking.user_id.first_name or booking.user_id.username,
-            'listing_title': booking.listing_id.title,
-            'booking_id': booking.booking_id,
-            'status': new_status.capitalize(),
-        }
-        
-        html_message = render_to_string(template, context)
-        plain_message = strip_tags(html_message)
+        booking = Booking.objects.select_related('listing_id', 'user_id').get(booking_id=booking_id)
+        subject, email_name = _status_update_email(new_status)
+        plain_message, html_message = emails.render(email_name, _status_update_context(booking, new_status))
         
         send_mail(
-            subject=subject,
+            subject=f'{subject} - {booking.listing_id.title}',
             message=plain_message,
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[booking.user_id.email],
             html_message=html_message,
             fail_silently=False,
         )
+        self.mark_sent(statuses)
         
         return f'Status update email sent for booking {booking_id}'
         
@@ -139,7 +205,48 @@ def send_booking_status_update_email(self, booking_id, new_status):
         raise self.retry(exc=exc, countdown=60)
 
 
+@shared_task(bind=True, max_retries=3, base=DebouncedTask, notification_kind='booking-status')
+@profiling.profile_task
+def send_booking_status_update_emails(self, booking_ids, new_status):
+    """
+    Send status update emails for a batch of bookings over one SMTP
+    connection, each about its booking's latest status (listings.dedup).
+    Only the emails that failed are retried.
+    
+    Args:
+        booking_ids: List of booking UUID strings
+        new_status: The new status of the bookings
+    """
+    statuses = self.resolve_statuses((booking_ids, new_status))
+    bookings = Booking.objects.filter(booking_id__in=list(statuses)).select_related('listing_id', 'user_id')
+    by_status = {}
+    for booking in bookings:
+        by_status.setdefault(statuses[str(booking.booking_id)], []).append(booking)
+    sent, failed = {}, []
+    with get_connection() as connection:
+        for status, status_bookings in by_status.items():
+            subject, email_name = _status_update_email(status)
+            messages = emails.render_many(email_name,
+                                          [_status_update_context(booking, status) for booking in status_bookings])
+            for booking, (plain_message, html_message) in zip(status_bookings, messages):
+                email = EmailMultiAlternatives(f'{subject} - {booking.listing_id.title}', plain_message,
+                                               settings.DEFAULT_FROM_EMAIL, [booking.user_id.email],
+                                               connection=connection)
+                email.attach_alternative(html_message, 'text/html')
+                try:
+                    email.send()
+                    sent[str(booking.booking_id)] = status
+                except Exception:
+                    failed.append(str(booking.booking_id))
+    self.mark_sent(sent)
+    
+    if failed:
+        raise self.retry(args=(failed, new_status), countdown=60)
+    return f'Status update emails sent for {len(booking_ids)} bookings'
+
+
 @shared_task
+@profiling.profile_task
 def send_bulk_emails(user_emails, subject, message):
     """
     Send bulk emails to multiple users.
@@ -173,4 +280,139 @@ def send_bulk_emails(user_emails, subject, message):
 def debug_task():
     """Debug task for testing Celery setup."""
     print('Debug task executed!')
-    return 'Debug task completed'
\ No newline at end of file
+    return 'Debug task completed'
+
+@shared_task
+@profiling.profile_task
+def bulk_update_booking_status(booking_ids, new_status):
+    """
+    Move many bookings to a new status with a single UPDATE, then queue the
+    usual status update emails. Used by the admin bulk actions.
+
+    Args:
+        booking_ids: List of booking UUID strings
+        new_status: 'confirmed' or 'canceled'
+    """
+    if new_status not in TRANSITIONS:
+        return f'Unsupported status {new_status}'
+
+    updated_ids = [str(pk) for pk in set_status(Booking.objects.filter(booking_id__in=booking_ids), new_status)]
+
+    changed = Booking.objects.filter(booking_id__in=updated_ids).only('listing_id', 'start_date', 'end_date')
+    if new_status == Booking.Status.CANCELED:
+        occupancy.release_many(changed)
+    rollups.refresh_bookings(changed)
+
+    if updated_ids:
+        send_booking_status_update_emails.delay(updated_ids, new_status)
+
+    return f'{len(updated_ids)} of {len(booking_ids)} bookings set to {new_status}'
+
+
+@shared_task
+@profiling.profile_task
+def reverify_payments(payment_ids):
+    """
+    Re-check pending/failed payments against Chapa and record the result,
+    with the same checks as the verify endpoint (listings.chapa).
+
+    Args:
+        payment_ids: List of Payment primary keys
+    """
+    if not settings.CHAPA_SECRET_KEY:
+        return 'CHAPA_SECRET_KEY not configured'
+
+    results = {chapa.SUCCESSFUL: 0, chapa.MISMATCH: 0, chapa.FAILED: 0, "errors": 0}
+
+    for payment in Payment.objects.filter(id__in=payment_ids).exclude(status='successful'):
+        try:
+            outcome, _ = chapa.verify_with_chapa(payment)
+        except (requests.RequestException, ValueError):
+            results["errors"] += 1
+            continue
+        results[outcome] += 1
+
+    return results
+
+
+@shared_task
+@profiling.profile_task
+def roll_forward_calendars():
+    """Nightly: move every occupancy calendar window to start today."""
+    return f'Rolled {occupancy.roll_forward_all()} listing calendars forward'
+
+
+@shared_task
+@profiling.profile_task
+def expire_pending_bookings():
+    """
+    Cancel pending bookings older than BOOKING_HOLD_TTL_MINUTES.
+
+    Works in batches of BOOKING_EXPIRY_BATCH_SIZE with one UPDATE each, at
+    most BOOKING_EXPIRY_MAX_BATCHES per run, and queues a single grouped
+    status email task for the bookings it actually canceled. Rows locked by
+    a concurrent confirm or cancel are skipped rather than waited on.
+    """
+    cutoff = timezone.now() - timedelta(minutes=settings.BOOKING_HOLD_TTL_MINUTES)
+    expired_ids = []
+    for _ in range(settings.BOOKING_EXPIRY_MAX_BATCHES):
+        # Served by the booking_pending_created_idx partial index.
+        batch = (Booking.objects.filter(status=Booking.Status.PENDING, created_at__lt=cutoff)
+                 .order_by('created_at')[:settings.BOOKING_EXPIRY_BATCH_SIZE])
+        canceled = set_status(batch, Booking.Status.CANCELED, skip_locked=True)
+        if not canceled:
+            break
+        expired_ids += [str(pk) for pk in canceled]
+
+    if expired_ids:
+        occupancy.release_many(Booking.objects.filter(booking_id__in=expired_ids).only('listing_id', 'start_date', 'end_date'))
+        send_booking_status_update_emails.delay(expired_ids, Booking.Status.CANCELED)
+    return f'Expired {len(expired_ids)} pending bookings'
+
+
+@shared_task
+@profiling.profile_task
+def catch_up_listing_stats():
+    """
+    Nightly: recompute the daily stats rollups from LISTING_STATS_CATCHUP_DAYS
+    ago through the end of the occupancy window, picking up any change that
+    bypassed the incremental updates.
+    """
+    today = timezone.localdate()
+    start_day = today - timedelta(days=settings.LISTING_STATS_CATCHUP_DAYS)
+    end_day = today + timedelta(days=occupancy.CALENDAR_DAYS)
+    rows = sum(written for _, written in rollups.rebuild_range(start_day, end_day))
+    return f'Rebuilt {rows} listing stats rows from {start_day} to {end_day}'
+
+
+@shared_task
+@profiling.profile_task
+def build_listing_neighbors():
+    """Nightly: recompute the similar listings of every active listing."""
+    return f'Built neighbors for {similarity.rebuild_all()} listings'
+
+
+@shared_task
+@profiling.profile_task
+def refresh_listing_neighbors():
+    """Recompute similar listings for listings whose text changed since the last run."""
+    return f'Refreshed neighbors for {similarity.refresh_changed()} changed listings'
+
+
+# acks_late: a worker lost mid-import leaves the task queued, and the next
+# run resumes from the import's checkpoint.
+@shared_task(acks_late=True)
+@profiling.profile_task
+def import_listings(import_id):
+    """
+    Run a listing import from its checkpoint (listings.imports). After
+    LISTING_IMPORT_TASK_SECONDS it queues itself to continue, so large
+    files stay within the task time limit.
+    """
+    listing_import = ListingImport.objects.filter(pk=import_id).first()
+    if listing_import is None or listing_import.status in (ListingImport.Status.COMPLETED, ListingImport.Status.FAILED):
+        return f'Nothing to import for {import_id}'
+    if imports.run(listing_import, deadline=time.monotonic() + settings.LISTING_IMPORT_TASK_SECONDS):
+        import_listings.delay(import_id)
+    return (f'Import {import_id}: {listing_import.rows_processed} rows, {listing_import.rows_created} created, '
+            f'{listing_import.rows_failed} rejected ({listing_import.status})')
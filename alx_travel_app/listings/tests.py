@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
@@ -87,4 +87,1825 @@ class BookingAPITest(TestCase):
         )
         
         self.assertEqual(Booking.objects.count(), 1)
-        self.assertEqual(booking.status, 'pending')
\ No newline at end of file
+        self.assertEqual(booking.status, 'pending')
+
+class QueryPlanAuditTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='audituser',
+            email='audit@example.com',
+            password='testpass123',
+            first_name='Audit',
+            last_name='User'
+        )
+        self.listing = Listing.objects.create(
+            title='Audit Listing',
+            description='Audit Description',
+            host=self.user,
+            street='1 Audit St',
+            city='Audit City',
+            state='Audit State',
+            postal_code='12345',
+            country='Audit Country'
+        )
+
+    def test_hot_queries_use_indexes(self):
+        """Test that every audited viewset query is served by an index"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('audit_query_plans', '--fail-on-scan', stdout=out)
+        self.assertNotIn('SEQ SCAN', out.getvalue())
+
+
+class RendererTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.host = User.objects.create_user(
+            username='renderhost',
+            email='render@example.com',
+            password='testpass123',
+            first_name='Render',
+            last_name='Host'
+        )
+        for i in range(20):
+            Listing.objects.create(
+                title=f'Listing {i}',
+                description='A long enough description to make the payload worth compressing. ' * 3,
+                host=self.host,
+                street='1 Render St',
+                city='Render City',
+                state='Render State',
+                postal_code='12345',
+                country='Render Country'
+            )
+
+    def test_orjson_output_matches_stdlib_renderer(self):
+        """Test that ORJSONRenderer produces the same bytes as DRF's JSONRenderer"""
+        from decimal import Decimal
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import ORJSONRenderer
+        from .serializers import ListingSerializer
+
+        data = ListingSerializer(Listing.objects.all(), many=True).data
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_raw_decimals_and_datetimes_render_like_serializer_fields(self):
+        """Test that values outside serializer fields keep Decimal precision and DjangoJSONEncoder timestamps"""
+        import datetime
+        import json
+        from decimal import Decimal
+        from django.core.serializers.json import DjangoJSONEncoder
+        from rest_framework import serializers
+        from .renderers import ORJSONRenderer
+
+        amount = Decimal('12.50')
+        self.assertEqual(ORJSONRenderer().render({'amount': amount}),
+                         b'{"amount":"%s"}' % serializers.DecimalField(max_digits=10, decimal_places=2)
+                         .to_representation(amount).encode())
+        values = {
+            'aware': datetime.datetime(2026, 1, 2, 3, 4, 5, 123456, tzinfo=datetime.timezone.utc),
+            'naive': datetime.datetime(2026, 1, 2, 3, 4, 5, 999),
+            'whole': datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=datetime.timezone(datetime.timedelta(hours=3))),
+            'day': datetime.date(2026, 1, 2),
+            'time': datetime.time(3, 4, 5, 123456),
+        }
+        self.assertEqual(json.loads(ORJSONRenderer().render(values)),
+                         json.loads(json.dumps(values, cls=DjangoJSONEncoder)))
+
+    def test_large_responses_are_compressed(self):
+        """Test that list responses above the size threshold are gzipped"""
+        self.client.force_authenticate(user=self.host)
+
+        response = self.client.get('/api/listings/', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+
+class FastListParityTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='parityuser',
+            email='parity@example.com',
+            password='testpass123',
+            first_name='Parity',
+            last_name='User'
+        )
+        start_date = timezone.now()
+        for i in range(3):
+            listing = Listing.objects.create(
+                title=f'Parity Listing {i}',
+                description='Parity Description',
+                host=self.user,
+                street='1 Parity St',
+                city='Parity City',
+                state='Parity State',
+                postal_code='12345',
+                country='Parity Country',
+                is_active=bool(i % 2)
+            )
+            Booking.objects.create(
+                listing_id=listing,
+                user_id=self.user,
+                start_date=start_date,
+                end_date=start_date + timedelta(days=i + 1)
+            )
+            Review.objects.create(
+                listing_id=listing,
+                user_id=self.user,
+                rating=i + 1,
+                comment='Parity comment'
+            )
+
+    def test_fast_path_output_is_byte_identical(self):
+        """Test that the values() fast path renders exactly like the serializers"""
+        from rest_framework.renderers import JSONRenderer
+        from .fastpath import ValuesSerializer
+        from .serializers import ListingSerializer, BookingSerializer, ReviewSerializer
+
+        for model, serializer_class in ((Listing, ListingSerializer),
+                                        (Booking, BookingSerializer),
+                                        (Review, ReviewSerializer)):
+            with self.subTest(serializer=serializer_class.__name__):
+                queryset = model.objects.all()
+                expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+                actual = JSONRenderer().render(ValuesSerializer(serializer_class).serialize(queryset))
+                self.assertEqual(actual, expected)
+
+    def test_list_endpoints_use_fast_path(self):
+        """Test that list endpoints return the serializer representation"""
+        from rest_framework.renderers import JSONRenderer
+        from .serializers import BookingSerializer
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/bookings/my_bookings/')
+
+        self.assertEqual(response.status_code, 200)
+        expected = BookingSerializer(Booking.objects.filter(user_id=self.user), many=True).data
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+
+
+class SparseFieldsetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='sparseuser',
+            email='sparse@example.com',
+            password='testpass123',
+            first_name='Sparse',
+            last_name='User'
+        )
+        self.client.force_authenticate(user=self.user)
+        start_date = timezone.now()
+        for i in range(3):
+            listing = Listing.objects.create(
+                title=f'Sparse Listing {i}',
+                description='Sparse Description',
+                host=self.user,
+                street='1 Sparse St',
+                city='Sparse City',
+                state='Sparse State',
+                postal_code='12345',
+                country='Sparse Country'
+            )
+            Booking.objects.create(
+                listing_id=listing,
+                user_id=self.user,
+                start_date=start_date,
+                end_date=start_date + timedelta(days=2)
+            )
+
+    def test_fields_param_limits_listing_payload(self):
+        """Test that ?fields= returns only the requested listing fields"""
+        response = self.client.get('/api/listings/?fields=listing_id,title,city')
+
+        self.assertEqual(response.status_code, 200)
+        for row in response.json():
+            self.assertEqual(list(row), ['listing_id', 'title', 'city'])
+
+    def test_expand_embeds_listing_without_extra_queries(self):
+        """Test that ?expand=listing embeds the listing using a single join"""
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/bookings/?expand=listing&fields=booking_id,listing.title')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+        for row in response.json():
+            self.assertEqual(set(row), {'booking_id', 'listing'})
+            self.assertEqual(set(row['listing']), {'title'})
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.host = User.objects.create_user(
+            username='exporthost',
+            email='exporthost@example.com',
+            password='testpass123',
+            first_name='Export',
+            last_name='Host'
+        )
+        self.guest = User.objects.create_user(
+            username='exportguest',
+            email='exportguest@example.com',
+            password='testpass123',
+            first_name='Export',
+            last_name='Guest'
+        )
+        listing = Listing.objects.create(
+            title='Export Listing',
+            description='Export Description',
+            host=self.host,
+            street='1 Export St',
+            city='Export City',
+            state='Export State',
+            postal_code='12345',
+            country='Export Country'
+        )
+        start_date = timezone.now()
+        for booking_status in ('pending', 'confirmed', 'canceled'):
+            Booking.objects.create(
+                listing_id=listing,
+                user_id=self.guest,
+                start_date=start_date,
+                end_date=start_date + timedelta(days=2),
+                status=booking_status
+            )
+        Payment.objects.create(
+            user_id=self.guest,
+            booking_reference='BOOK-EXPORT-1',
+            amount='150.25'
+        )
+
+    def test_host_streams_booking_csv(self):
+        """Test that a host can stream their listing's bookings as CSV"""
+        self.client.force_authenticate(user=self.host)
+
+        response = self.client.get('/api/exports/bookings.csv?status=confirmed')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['booking_id', 'listing_id', 'listing_title'])
+        self.assertEqual(len(lines), 2)
+        self.assertIn('confirmed', lines[1])
+
+    def test_payment_ndjson_keeps_exact_amounts(self):
+        """Test that NDJSON payment exports keep Decimal amounts exact"""
+        import json
+
+        self.client.force_authenticate(user=self.guest)
+
+        response = self.client.get('/api/exports/payments.ndjson')
+
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['amount'], '150.25')
+
+    def test_invalid_date_filter_is_rejected(self):
+        """Test that malformed date filters return 400"""
+        self.client.force_authenticate(user=self.host)
+
+        response = self.client.get('/api/exports/bookings.csv?since=yesterday')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class AdminTest(TestCase):
+    def setUp(self):
+        from django.conf import settings
+        from django.test import override_settings
+
+        # Nothing is collected under test, so the static manifest has no admin assets.
+        settings_override = override_settings(STORAGES={**settings.STORAGES, 'staticfiles': {
+            'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.admin_user = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            first_name='Admin',
+            last_name='User'
+        )
+        self.client.force_login(self.admin_user)
+        listing = Listing.objects.create(
+            title='Admin Listing',
+            description='Admin Description',
+            host=self.admin_user,
+            street='1 Admin St',
+            city='Admin City',
+            state='Admin State',
+            postal_code='12345',
+            country='Admin Country'
+        )
+        start_date = timezone.now()
+        self.booking = Booking.objects.create(
+            listing_id=listing,
+            user_id=self.admin_user,
+            start_date=start_date,
+            end_date=start_date + timedelta(days=2)
+        )
+        Review.objects.create(listing_id=listing, user_id=self.admin_user, rating=5, comment='Great')
+        Payment.objects.create(user_id=self.admin_user, booking_reference='BOOK-ADMIN-1', amount='10.00')
+
+    def test_changelists_load_and_search(self):
+        """Test that every changelist renders, including searches that are not valid UUIDs"""
+        for model in ('listing', 'booking', 'review', 'payment'):
+            with self.subTest(model=model):
+                response = self.client.get(f'/admin/listings/{model}/')
+                self.assertEqual(response.status_code, 200)
+                response = self.client.get(f'/admin/listings/{model}/?q=BOOK-ADMIN')
+                self.assertEqual(response.status_code, 200)
+
+    def test_bulk_confirm_runs_as_background_job(self):
+        """Test that the confirm action queues a Celery job instead of updating inline"""
+        from unittest import mock
+
+        with mock.patch('listings.admin.bulk_update_booking_status.delay') as delay:
+            response = self.client.post('/admin/listings/booking/', {
+                'action': 'confirm_bookings',
+                '_selected_action': [str(self.booking.booking_id)],
+            })
+
+        self.assertEqual(response.status_code, 302)
+        delay.assert_called_once_with([str(self.booking.booking_id)], Booking.Status.CONFIRMED)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, Booking.Status.PENDING)
+
+
+class OccupancyCalendarTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='calendaruser',
+            email='calendar@example.com',
+            password='testpass123',
+            first_name='Calendar',
+            last_name='User'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.listing = Listing.objects.create(
+            title='Calendar Listing',
+            description='Calendar Description',
+            host=self.user,
+            street='1 Calendar St',
+            city='Calendar City',
+            state='Calendar State',
+            postal_code='12345',
+            country='Calendar Country'
+        )
+        self.other_listing = Listing.objects.create(
+            title='Free Listing',
+            description='Free Description',
+            host=self.user,
+            street='2 Calendar St',
+            city='Calendar City',
+            state='Calendar State',
+            postal_code='12345',
+            country='Calendar Country'
+        )
+
+    def test_calendar_tracks_created_and_canceled_bookings(self):
+        """Test that creating and canceling a booking updates the calendar bitmap"""
+        from unittest import mock
+
+        start_date = timezone.localtime() + timedelta(days=10)
+        with mock.patch('listings.views.send_booking_confirmation_email.delay'):
+            response = self.client.post('/api/bookings/', {
+                'listing_id': str(self.listing.listing_id),
+                'user_id': str(self.user.user_id),
+                'start_date': start_date.isoformat(),
+                'end_date': (start_date + timedelta(days=3)).isoformat(),
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        calendar = self.client.get(f'/api/listings/{self.listing.listing_id}/calendar/').json()
+        self.assertEqual(calendar['booked'], [{
+            'start': str(start_date.date()),
+            'end': str(start_date.date() + timedelta(days=3)),
+        }])
+
+        available = self.client.get('/api/listings/available/', {
+            'start': str(start_date.date() + timedelta(days=1)),
+            'end': str(start_date.date() + timedelta(days=2)),
+        }).json()
+        self.assertEqual(available['listing_ids'], [str(self.other_listing.listing_id)])
+
+        with mock.patch('listings.views.send_booking_status_update_email.delay'):
+            self.client.post(f"/api/bookings/{response.json()['booking_id']}/cancel_booking/")
+        calendar = self.client.get(f'/api/listings/{self.listing.listing_id}/calendar/').json()
+        self.assertEqual(calendar['booked'], [])
+
+    def test_calendar_follows_booking_edits_and_deletes(self):
+        """Test that editing a booking's dates moves its nights and deleting it frees them"""
+        start_date = timezone.localtime() + timedelta(days=10)
+        booking = Booking.objects.create(
+            listing_id=self.listing, user_id=self.user,
+            start_date=start_date, end_date=start_date + timedelta(days=2))
+        calendar_url = f'/api/listings/{self.listing.listing_id}/calendar/'
+        booking_url = f'/api/bookings/{booking.booking_id}/'
+
+        moved = start_date + timedelta(days=20)
+        response = self.client.patch(booking_url, {
+            'start_date': moved.isoformat(),
+            'end_date': (moved + timedelta(days=1)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(calendar_url).json()['booked'], [{
+            'start': str(moved.date()),
+            'end': str(moved.date() + timedelta(days=1)),
+        }])
+
+        self.assertEqual(self.client.delete(booking_url).status_code, 204)
+        self.assertEqual(self.client.get(calendar_url).json()['booked'], [])
+
+    def test_available_pages_and_backfills_calendars_in_bulk(self):
+        """Test that /available/ pages through listings and builds missing calendars in one pass"""
+        from .models import ListingCalendar
+
+        start_date = timezone.localtime() + timedelta(days=5)
+        Booking.objects.create(
+            listing_id=self.listing, user_id=self.user,
+            start_date=start_date, end_date=start_date + timedelta(days=2))
+        extra = [
+            Listing.objects.create(
+                title=f'Extra Listing {i}', description='Extra', host=self.user, street=f'{i} Extra St',
+                city='Calendar City', state='Calendar State', postal_code='12345', country='Calendar Country')
+            for i in range(3)
+        ]
+        ListingCalendar.objects.all().delete()
+        free = sorted([self.other_listing.listing_id] + [listing.listing_id for listing in extra])
+        params = {'start': str(start_date.date()), 'end': str(start_date.date() + timedelta(days=1)), 'limit': 3}
+
+        with self.settings(AVAILABILITY_CHUNK_SIZE=2):
+            first = self.client.get('/api/listings/available/', params).json()
+            second = self.client.get('/api/listings/available/', {**params, 'after': first['next']}).json()
+        self.assertEqual(first['listing_ids'], [str(pk) for pk in free[:3]])
+        self.assertEqual(first['next'], str(free[2]))
+        self.assertEqual(second['listing_ids'], [str(free[3])])
+        self.assertIsNone(second['next'])
+        self.assertEqual(ListingCalendar.objects.count(), 5)
+
+
+class ConcurrentBookingTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='concurrentuser',
+            email='concurrent@example.com',
+            password='testpass123',
+            first_name='Concurrent',
+            last_name='User'
+        )
+        self.listings = [
+            Listing.objects.create(
+                title=f'Concurrent Listing {i}',
+                description='Concurrent Description',
+                host=self.user,
+                street='1 Concurrent St',
+                city='Concurrent City',
+                state='Concurrent State',
+                postal_code='12345',
+                country='Concurrent Country'
+            )
+            for i in range(2)
+        ]
+
+    def test_no_overlaps_under_contention(self):
+        """Test that concurrent booking attempts never produce overlapping bookings"""
+        from .management.commands.bench_booking_concurrency import count_overlaps, run_stress
+
+        result = run_stress(self.listings, self.user, threads=4, attempts=15, days=10)
+
+        self.assertGreater(result['created'], 0)
+        self.assertGreater(result['conflicts'], 0)
+        self.assertEqual(count_overlaps(self.listings), 0)
+
+    def test_overlapping_booking_is_rejected(self):
+        """Test that the API rejects a booking overlapping an existing one"""
+        from unittest import mock
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        start_date = timezone.now() + timedelta(days=1)
+        payload = {
+            'listing_id': str(self.listings[0].listing_id),
+            'user_id': str(self.user.user_id),
+            'start_date': start_date.isoformat(),
+            'end_date': (start_date + timedelta(days=3)).isoformat(),
+        }
+        with mock.patch('listings.views.send_booking_confirmation_email.delay'):
+            first = client.post('/api/bookings/', payload, format='json')
+            payload['start_date'] = (start_date + timedelta(days=2)).isoformat()
+            payload['end_date'] = (start_date + timedelta(days=4)).isoformat()
+            second = client.post('/api/bookings/', payload, format='json')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 400)
+        self.assertIn('non_field_errors', second.json())
+
+
+class BulkBookingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.agent = User.objects.create_user(
+            username='agent',
+            email='agent@example.com',
+            password='testpass123',
+            first_name='Travel',
+            last_name='Agent'
+        )
+        self.client.force_authenticate(user=self.agent)
+        self.listings = [
+            Listing.objects.create(
+                title=f'Bulk Listing {i}',
+                description='Bulk Description',
+                host=self.agent,
+                street='1 Bulk St',
+                city='Bulk City',
+                state='Bulk State',
+                postal_code='12345',
+                country='Bulk Country'
+            )
+            for i in range(2)
+        ]
+        self.start = timezone.now() + timedelta(days=1)
+
+    def item(self, listing, day, nights=1):
+        start_date = self.start + timedelta(days=day)
+        return {
+            'listing_id': str(listing.listing_id),
+            'start_date': start_date.isoformat(),
+            'end_date': (start_date + timedelta(days=nights)).isoformat(),
+        }
+
+    def post(self, items):
+        from unittest import mock
+
+        with mock.patch('listings.views.send_group_booking_confirmation_email.delay') as delay:
+            response = self.client.post('/api/bookings/bulk/', {'bookings': items}, format='json')
+        return response, delay
+
+    def test_partial_failures_are_reported_per_item(self):
+        """Test that bad items are reported by index while the rest are created"""
+        bad_dates = self.item(self.listings[0], 5)
+        bad_dates['end_date'] = bad_dates['start_date']
+        response, delay = self.post([
+            self.item(self.listings[0], 0, nights=2),
+            self.item(self.listings[1], 0),
+            self.item(self.listings[0], 1),  # overlaps the first item
+            bad_dates,
+        ])
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(len(response.json()['created']), 2)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [2, 3])
+        self.assertEqual(Booking.objects.count(), 2)
+        delay.assert_called_once()
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        """Test that validation and insert cost a constant number of queries"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        # The first batch also builds the listings' occupancy calendars.
+        self.post([self.item(listing, 0) for listing in self.listings])
+
+        with CaptureQueriesContext(connection) as small:
+            response, _ = self.post([self.item(listing, 1) for listing in self.listings])
+        self.assertEqual(response.status_code, 201)
+
+        with CaptureQueriesContext(connection) as large:
+            response, _ = self.post([self.item(listing, day) for day in range(10, 30) for listing in self.listings])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(large), len(small))
+
+
+class PendingExpiryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='expiryuser',
+            email='expiry@example.com',
+            password='testpass123',
+            first_name='Expiry',
+            last_name='User'
+        )
+        listing = Listing.objects.create(
+            title='Expiry Listing',
+            description='Expiry Description',
+            host=self.user,
+            street='1 Expiry St',
+            city='Expiry City',
+            state='Expiry State',
+            postal_code='12345',
+            country='Expiry Country'
+        )
+        start_date = timezone.now() + timedelta(days=3)
+        self.bookings = [
+            Booking.objects.create(
+                listing_id=listing,
+                user_id=self.user,
+                start_date=start_date + timedelta(days=i * 2),
+                end_date=start_date + timedelta(days=i * 2 + 1)
+            )
+            for i in range(3)
+        ]
+        stale = [booking.pk for booking in self.bookings[:2]]
+        Booking.objects.filter(pk__in=stale).update(created_at=timezone.now() - timedelta(days=1))
+
+    def test_sweeper_cancels_stale_pending_bookings_in_one_batch(self):
+        """Test that the sweeper cancels only expired holds and queues one email batch"""
+        from unittest import mock
+        from .tasks import expire_pending_bookings
+
+        with self.settings(BOOKING_EXPIRY_BATCH_SIZE=1), \
+                mock.patch('listings.tasks.send_booking_status_update_emails.delay') as delay:
+            expire_pending_bookings()
+
+        statuses = [Booking.objects.get(pk=booking.pk).status for booking in self.bookings]
+        self.assertEqual(statuses, ['canceled', 'canceled', 'pending'])
+        delay.assert_called_once()
+        self.assertEqual(sorted(delay.call_args.args[0]), sorted(str(b.pk) for b in self.bookings[:2]))
+
+    def test_bulk_confirm_leaves_bookings_that_moved_on(self):
+        """Test that the bulk status task only confirms and emails bookings that were still pending"""
+        from unittest import mock
+        from .tasks import bulk_update_booking_status
+
+        Booking.objects.filter(pk=self.bookings[0].pk).update(status=Booking.Status.CANCELED)
+        with mock.patch('listings.tasks.send_booking_status_update_emails.delay') as delay:
+            result = bulk_update_booking_status([str(b.pk) for b in self.bookings], Booking.Status.CONFIRMED)
+
+        statuses = [Booking.objects.get(pk=booking.pk).status for booking in self.bookings]
+        self.assertEqual(statuses, ['canceled', 'confirmed', 'confirmed'])
+        self.assertEqual(sorted(delay.call_args.args[0]), sorted(str(b.pk) for b in self.bookings[1:]))
+        self.assertTrue(result.startswith('2 of 3'))
+
+    def test_confirm_does_not_revive_a_booking_expired_after_it_was_read(self):
+        """Test that confirming a booking the sweeper canceled meanwhile is refused"""
+        from unittest import mock
+        from .views import BookingViewSet
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        read_while_pending = Booking.objects.get(pk=self.bookings[0].pk)
+        Booking.objects.filter(pk=read_while_pending.pk).update(status=Booking.Status.CANCELED)
+        with mock.patch.object(BookingViewSet, 'get_object', return_value=read_while_pending), \
+                mock.patch('listings.views.send_booking_status_update_email.delay') as delay:
+            response = client.post(f'/api/bookings/{read_while_pending.pk}/confirm_booking/')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Booking.objects.get(pk=read_while_pending.pk).status, 'canceled')
+        delay.assert_not_called()
+
+    def test_batched_status_emails_are_sent(self):
+        """Test that the grouped status task sends one email per booking"""
+        from django.core import mail
+        from .tasks import send_booking_status_update_emails
+
+        send_booking_status_update_emails([str(b.pk) for b in self.bookings[:2]], 'canceled')
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertTrue(mail.outbox[0].subject.startswith('Booking Cancelled'))
+
+
+class ListingStatsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.host = User.objects.create_user(
+            username='statshost',
+            email='statshost@example.com',
+            password='testpass123',
+            first_name='Stats',
+            last_name='Host'
+        )
+        self.guest = User.objects.create_user(
+            username='statsguest',
+            email='statsguest@example.com',
+            password='testpass123',
+            first_name='Stats',
+            last_name='Guest'
+        )
+        self.listing = Listing.objects.create(
+            title='Stats Listing',
+            description='Stats Description',
+            host=self.host,
+            street='1 Stats St',
+            city='Stats City',
+            state='Stats State',
+            postal_code='12345',
+            country='Stats Country'
+        )
+        start_date = timezone.now() + timedelta(days=2)
+        self.booking = Booking.objects.create(
+            listing_id=self.listing,
+            user_id=self.guest,
+            start_date=start_date,
+            end_date=start_date + timedelta(days=3)
+        )
+        self.first_night = timezone.localtime(start_date).date()
+
+    def test_confirm_payment_and_review_update_rollups(self):
+        """Test that booking, payment and review changes are reflected in the stats endpoint"""
+        from unittest import mock
+        from . import rollups
+
+        self.client.force_authenticate(user=self.guest)
+        with mock.patch('listings.views.send_booking_status_update_email.delay'):
+            self.client.post(f'/api/bookings/{self.booking.pk}/confirm_booking/')
+        payment = Payment.objects.create(user_id=self.guest, booking_id=self.booking,
+                                         amount='150.00', status='successful', paid_at=timezone.now())
+        rollups.refresh_payment(payment)
+        self.client.post('/api/review/', {'listing_id': self.listing.pk, 'user_id': self.guest.pk,
+                                           'rating': 4, 'comment': 'Nice'}, format='json')
+
+        self.client.force_authenticate(user=self.host)
+        today = timezone.localdate()
+        response = self.client.get(f'/api/listings/{self.listing.pk}/stats/',
+                                   {'since': today, 'until': today + timedelta(days=9)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        totals = response.data['totals']
+        self.assertEqual(totals['booked_nights'], 3)
+        self.assertEqual(totals['occupancy_rate'], 0.3)
+        self.assertEqual(totals['revenue'], 150)
+        self.assertEqual(totals['average_rating'], 4.0)
+        self.assertEqual(len(response.data['series']), 10)
+
+        summary = self.client.get('/api/listings/host_stats/', {'interval': 'month'})
+        self.assertEqual(summary.data['by_listing'][0]['listing_id'], self.listing.pk)
+
+        self.client.force_authenticate(user=self.guest)
+        response = self.client.get(f'/api/listings/{self.listing.pk}/stats/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_edits_and_deletes_update_rollups(self):
+        """Test that revenue stays on the paid day and booking/review edits and deletes refresh the rows"""
+        from unittest import mock
+        from django.db.models import Sum
+        from .models import ListingDailyStats
+        from . import rollups
+
+        def stats(field):
+            return ListingDailyStats.objects.filter(listing_id=self.listing).aggregate(total=Sum(field))['total'] or 0
+
+        paid_day = timezone.now() - timedelta(days=3)
+        Booking.objects.filter(pk=self.booking.pk).update(status='confirmed')
+        payment = Payment.objects.create(user_id=self.guest, booking_id=self.booking,
+                                         amount='150.00', status='successful', paid_at=paid_day)
+        rollups.refresh_payment(payment)
+        payment.save()  # a later update must not move the revenue
+        rollups.rebuild(timezone.localdate() - timedelta(days=5), timezone.localdate() + timedelta(days=1))
+        self.assertEqual(ListingDailyStats.objects.get(revenue__gt=0).day, timezone.localtime(paid_day).date())
+
+        self.client.force_authenticate(user=self.guest)
+        with mock.patch('listings.views.send_booking_status_update_email.delay'):
+            self.client.patch(f'/api/bookings/{self.booking.pk}/', {
+                'end_date': (self.booking.start_date + timedelta(days=1)).isoformat()}, format='json')
+        self.assertEqual(stats('booked_nights'), 1)
+        self.client.delete(f'/api/bookings/{self.booking.pk}/')
+        self.assertEqual(stats('booked_nights'), 0)
+
+        review = self.client.post('/api/review/', {'listing_id': self.listing.pk, 'user_id': self.guest.pk,
+                                                    'rating': 4, 'comment': 'Nice'}, format='json').data
+        self.client.patch(f"/api/review/{review['review_id']}/", {'rating': 2}, format='json')
+        self.assertEqual(stats('rating_sum'), 2)
+        self.client.delete(f"/api/review/{review['review_id']}/")
+        self.assertEqual(stats('review_count'), 0)
+
+    def test_rebuild_matches_incremental_updates(self):
+        """Test that a full rebuild reproduces the incrementally maintained rows"""
+        from django.core.management import call_command
+        from io import StringIO
+        from .models import ListingDailyStats
+        from . import rollups
+
+        Booking.objects.filter(pk=self.booking.pk).update(status='confirmed')
+        rollups.refresh_booking(Booking.objects.get(pk=self.booking.pk))
+        incremental = list(ListingDailyStats.objects.order_by('day').values_list('day', 'booked_nights'))
+
+        ListingDailyStats.objects.all().delete()
+        call_command('rebuild_listing_stats', stdout=StringIO())
+        rebuilt = list(ListingDailyStats.objects.order_by('day').values_list('day', 'booked_nights'))
+        self.assertEqual(rebuilt, incremental)
+        self.assertEqual(incremental[0], (self.first_night, 1))
+
+    def test_rebuild_overwrites_rows_a_concurrent_rebuild_inserted(self):
+        """Test that a row inserted by another rebuild after ours deleted is updated instead of violating uniqueness"""
+        from unittest import mock
+        from django.db.models.query import QuerySet
+        from .models import ListingDailyStats
+        from . import rollups
+
+        Booking.objects.filter(pk=self.booking.pk).update(status='confirmed')
+        delete = QuerySet.delete
+
+        def delete_then_race(queryset):
+            result = delete(queryset)
+            ListingDailyStats.objects.create(listing_id=self.listing, day=self.first_night, booked_nights=7)
+            return result
+
+        with mock.patch.object(QuerySet, 'delete', delete_then_race):
+            rollups.refresh_booking(Booking.objects.get(pk=self.booking.pk))
+        self.assertEqual(ListingDailyStats.objects.get(day=self.first_night).booked_nights, 1)
+
+
+class SimilarListingsTest(TestCase):
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='similaruser',
+            email='similar@example.com',
+            password='testpass123',
+            first_name='Similar',
+            last_name='User'
+        )
+        self.client.force_authenticate(user=self.user)
+        listings = [
+            ('Beach villa with pool', 'Sea view villa near the beach with a private pool', 'Mombasa', 'Kenya'),
+            ('Beach cottage', 'Small cottage steps from the beach, sea view', 'Mombasa', 'Kenya'),
+            ('City loft', 'Modern loft downtown near offices and cafes', 'Nairobi', 'Kenya'),
+            ('Downtown studio', 'Compact studio downtown close to offices', 'Nairobi', 'Kenya'),
+        ]
+        self.listings = [
+            Listing.objects.create(
+                title=title,
+                description=description,
+                host=self.user,
+                street='1 Similar St',
+                city=city,
+                state='Similar State',
+                postal_code='12345',
+                country=country
+            )
+            for title, description, city, country in listings
+        ]
+
+    def test_similar_endpoint_ranks_closest_listings_first(self):
+        """Test that the full build stores neighbors and the endpoint serves them best first"""
+        from . import similarity
+
+        self.assertEqual(similarity.rebuild_all(k=2), 4)
+        response = self.client.get(f'/api/listings/{self.listings[0].pk}/similar/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual(results[0]['listing_id'], str(self.listings[1].pk))
+        self.assertGreater(results[0]['similarity'], results[1]['similarity'])
+
+    def test_incremental_refresh_only_recomputes_changed_listings(self):
+        """Test that a text change is picked up and merged into other listings' neighbors"""
+        from . import similarity
+
+        from unittest import mock
+
+        similarity.rebuild_all(k=2)
+        self.assertEqual(similarity.refresh_changed(k=2), 0)
+
+        changed = self.listings[3]
+        changed.title, changed.description = 'Beach bungalow', 'Bungalow on the beach with sea view and pool'
+        changed.city = 'Mombasa'
+        changed.save()
+        with mock.patch('listings.similarity.terms', wraps=similarity.terms) as vectorized:
+            self.assertEqual(similarity.refresh_changed(k=2), 1)
+        self.assertEqual(vectorized.call_count, 1)
+        self.assertEqual(similarity.refresh_changed(k=2), 0)
+
+        neighbors = [listing_id for listing_id, _ in similarity.similar_to(self.listings[0].pk)]
+        self.assertIn(changed.pk, neighbors)
+        self.assertEqual(similarity.similar_to(changed.pk)[0][0], self.listings[0].pk)
+
+
+class LocationAutocompleteTest(TestCase):
+    def setUp(self):
+        from . import locations
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='locationuser',
+            email='location@example.com',
+            password='testpass123',
+            first_name='Location',
+            last_name='User'
+        )
+        self.client.force_authenticate(user=self.user)
+        for city, country in (('Lagos', 'Nigeria'), ('Lagos', 'Nigeria'), ('Lamu', 'Kenya'),
+                              ('São Paulo', 'Brazil'), ('Nairobi', 'Kenya')):
+            self.create_listing(city, country)
+        locations._mark_stale()
+
+    def create_listing(self, city, country, **fields):
+        return Listing.objects.create(
+            title=f'{city} Listing',
+            description='Location Description',
+            host=self.user,
+            street='1 Location St',
+            city=city,
+            state='Location State',
+            postal_code='12345',
+            country=country,
+            **fields
+        )
+
+    def test_prefix_lookup_returns_counts_without_queries(self):
+        """Test that lookups are served from the index, most listings first, ignoring case and accents"""
+        response = self.client.get('/api/listings/locations/', {'prefix': 'la'})
+        self.assertEqual([(r['city'], r['count']) for r in response.data['results']], [('Lagos', 2), ('Lamu', 1)])
+
+        with self.assertNumQueries(0):
+            from . import locations
+            self.assertEqual(locations.search('SAO')[0]['city'], 'São Paulo')
+            self.assertEqual(locations.search('ke')[0], {'type': 'country', 'country': 'Kenya', 'count': 2})
+
+    def test_listing_changes_refresh_the_index(self):
+        """Test that a committed listing change marks the index stale and the next lookup sees it"""
+        from . import locations
+
+        self.assertEqual(len(locations.search('lamu')), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_listing('Lamu', 'Kenya')
+            self.create_listing('Lausanne', 'Switzerland', is_active=False)
+        self.assertEqual(locations.search('lamu')[0]['count'], 2)
+        self.assertEqual(locations.search('lau'), [])
+
+
+class ListingFacetTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='facetuser',
+            email='facet@example.com',
+            password='testpass123',
+            first_name='Facet',
+            last_name='User'
+        )
+        self.client.force_authenticate(user=self.user)
+        for city, state, country, is_active in (('Lagos', 'Lagos', 'Nigeria', True),
+                                                ('Lagos', 'Lagos', 'Nigeria', False),
+                                                ('Abuja', 'FCT', 'Nigeria', True),
+                                                ('Nairobi', 'Nairobi', 'Kenya', True)):
+            self.create_listing(city, state, country, is_active=is_active)
+
+    def create_listing(self, city, state, country, **fields):
+        return Listing.objects.create(
+            title=f'{city} Listing',
+            description='Facet Description',
+            host=self.user,
+            street='1 Facet St',
+            city=city,
+            state=state,
+            postal_code='12345',
+            country=country,
+            **fields
+        )
+
+    def test_filters_and_disjunctive_facet_counts(self):
+        """Test that results are filtered and each facet is counted without its own filter"""
+        response = self.client.get('/api/listings/', {'country': 'Nigeria', 'is_active': 'true', 'facets': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(r['city'] for r in response.data['results']), ['Abuja', 'Lagos'])
+        counts = response.data['facets']
+        self.assertEqual(counts['country'], [{'value': 'Nigeria', 'count': 2}, {'value': 'Kenya', 'count': 1}])
+        self.assertEqual(counts['is_active'], [{'value': True, 'count': 2}, {'value': False, 'count': 1}])
+
+        plain = self.client.get('/api/listings/', {'city': ['Abuja', 'Nairobi']})
+        self.assertEqual(len(plain.data), 2)
+        self.assertEqual(self.client.get('/api/listings/', {'is_active': 'maybe'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_counts_are_cached_until_a_listing_changes(self):
+        """Test that repeat requests skip the GROUP BYs and a listing save invalidates them"""
+        from . import facets
+
+        facets.facet_counts(Listing.objects.all(), {})
+        with self.assertNumQueries(0):
+            facets.facet_counts(Listing.objects.all(), {})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_listing('Mombasa', 'Mombasa', 'Kenya')
+        counts = facets.facet_counts(Listing.objects.all(), {})
+        self.assertIn({'value': 'Kenya', 'count': 2}, counts['country'])
+
+
+    def test_counts_fall_back_quickly_when_the_redis_cache_is_down(self):
+        """Test that facet requests still answer, connecting at most once, while Redis is unreachable"""
+        from unittest import mock
+        from django.conf import settings
+        from django.test import override_settings
+        from . import redis_client
+
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                              'LOCATION': 'redis://127.0.0.1:1/0', 'OPTIONS': settings.REDIS_CACHE_OPTIONS}}
+        refused = OSError(111, 'Connection refused')
+        with override_settings(CACHES=caches, REDIS_URL='redis://127.0.0.1:1/1'), \
+                mock.patch.object(redis_client, '_client', None), mock.patch.object(redis_client, '_open_until', 0.0), \
+                mock.patch('redis.connection.Connection._connect', side_effect=refused) as connect:
+            for _ in range(2):
+                response = self.client.get('/api/listings/', {'facets': 'true'})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertIn({'value': 'Nigeria', 'count': 3}, response.data['facets']['country'])
+        self.assertEqual(connect.call_count, 1)
+
+
+class PaymentEventStreamTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='eventuser',
+            email='event@example.com',
+            password='testpass123',
+            first_name='Event',
+            last_name='User'
+        )
+        self.payment = Payment.objects.create(user_id=self.user, booking_reference='EVT-1', amount='10.00')
+
+    async def test_stream_pushes_changes_until_terminal_status(self):
+        """Test that the stream sends the current state, then published changes, and ends on success"""
+        import asyncio
+        import orjson
+        from . import payment_events
+
+        frames = payment_events.stream('EVT-1')
+        first = await frames.__anext__()
+        self.assertIn(b'"status":"pending"', first)
+
+        for queue in payment_events.hub._waiters['EVT-1']:
+            queue.put_nowait(orjson.dumps({'tx_ref': 'EVT-1', 'status': 'successful'}))
+        second = await asyncio.wait_for(frames.__anext__(), 1)
+        self.assertTrue(second.startswith(b'event: status\ndata: '))
+        self.assertIn(b'successful', second)
+        with self.assertRaises(StopAsyncIteration):
+            await frames.__anext__()
+        self.assertNotIn('EVT-1', payment_events.hub._waiters)
+
+    async def test_unknown_payment_is_404(self):
+        """Test that the events endpoint rejects unknown references before streaming"""
+        response = await self.async_client.get('/api/payments/NOPE/events/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = await self.async_client.get('/api/payments/EVT-1/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        response.close()
+
+    def test_wsgi_requests_are_refused(self):
+        """Test that the events endpoint answers 501 instead of streaming from a WSGI worker"""
+        response = self.client.get('/api/payments/EVT-1/events/')
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+    async def test_view_streams_published_events(self):
+        """Test that an event published for a payment reaches its open stream as a data frame"""
+        import asyncio
+        from unittest import mock
+        from . import payment_events
+        try:
+            import fakeredis
+        except ImportError:
+            self.skipTest('fakeredis is not installed')
+
+        server = fakeredis.FakeServer()
+        publisher = fakeredis.FakeRedis(server=server)
+        with mock.patch('listings.payment_events.get_client', return_value=publisher), \
+                mock.patch('redis.asyncio.Redis.from_url', return_value=fakeredis.FakeAsyncRedis(server=server)):
+            response = await self.async_client.get('/api/payments/EVT-1/events/')
+            frames = aiter(response.streaming_content)
+            self.assertIn(b'"status":"pending"', await anext(frames))
+            while not publisher.pubsub_numpat():
+                await asyncio.sleep(0.01)
+
+            self.payment.status = 'successful'
+            payment_events.publish(self.payment)
+            frame = await asyncio.wait_for(anext(frames), 2)
+        self.assertTrue(frame.startswith(b'event: status\ndata: {'))
+        self.assertIn(b'"status":"successful"', frame)
+        await frames.aclose()
+
+    async def test_change_published_before_the_state_is_read_is_not_missed(self):
+        """Test that the stream subscribes before reading, so a change published in between still arrives"""
+        import asyncio
+        import copy
+        from unittest import mock
+        from django.db.models.query import QuerySet
+        from . import payment_events
+        try:
+            import fakeredis
+        except ImportError:
+            self.skipTest('fakeredis is not installed')
+
+        server = fakeredis.FakeServer()
+        publisher = fakeredis.FakeRedis(server=server)
+        read = QuerySet.afirst
+
+        async def read_after_a_change(queryset):
+            changed = copy.copy(self.payment)
+            changed.status = 'successful'
+            payment_events.publish(changed)
+            return await read(queryset)
+
+        with mock.patch('listings.payment_events.get_client', return_value=publisher), \
+                mock.patch('redis.asyncio.Redis.from_url', return_value=fakeredis.FakeAsyncRedis(server=server)), \
+                mock.patch.object(QuerySet, 'afirst', read_after_a_change):
+            frames = payment_events.stream('EVT-1')
+            self.assertIn(b'"status":"pending"', await anext(frames))
+            frame = await asyncio.wait_for(anext(frames), 2)
+        self.assertIn(b'"status":"successful"', frame)
+        await frames.aclose()
+
+
+class LoggingPipelineTest(TestCase):
+    def setUp(self):
+        import tempfile
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = f'{self.tmp.name}/app.log'
+
+    def record(self, name='listings.views', level=20, msg='hello %s', args=('world',), **extra):
+        import logging
+
+        record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_records_with_sampled_truncated_payloads(self):
+        """Test that records become JSON lines with extras, payloads are truncated and sampled per logger"""
+        import json
+        from .logs import JSONFormatter, SamplingFilter
+
+        entry = json.loads(JSONFormatter(max_payload_chars=5).format(self.record(tx_ref='T1', payload='abcdefgh')))
+        self.assertEqual((entry['message'], entry['tx_ref'], entry['payload']), ('hello world', 'T1', 'abcde'))
+        self.assertEqual(entry['payload_truncated'], 8)
+
+        sampler = SamplingFilter({'listings.payloads': 0})
+        self.assertFalse(sampler.filter(self.record(name='listings.payloads')))
+        self.assertTrue(sampler.filter(self.record(name='listings.payloads', level=40)))
+        self.assertTrue(sampler.filter(self.record()))
+
+    def test_handlers_sharing_a_file_rotate_without_losing_lines(self):
+        """Test that two writers (as from two processes) rotate the same file by size and keep every line"""
+        import glob
+        import os
+        from .logs import ProcessSafeRotatingFileHandler
+
+        writers = [ProcessSafeRotatingFileHandler(self.path, max_bytes=50, backup_count=50) for _ in range(2)]
+        for i in range(40):
+            writers[i % 2].emit(self.record(msg='line %03d', args=(i,)))
+        for writer in writers:
+            writer.close()
+
+        lines = []
+        for path in glob.glob(f'{self.path}*'):
+            if not path.endswith('.lock'):
+                with open(path) as f:
+                    lines += f.read().splitlines()
+        self.assertEqual(sorted(lines), [f'line {i:03d}' for i in range(40)])
+        self.assertTrue(os.path.exists(f'{self.path}.5'))
+
+    def test_queue_handler_writes_in_background_and_drops_when_full(self):
+        """Test that the queue handler hands records to its listener and never blocks on a full queue"""
+        import logging
+        from .logs import BackgroundQueueHandler
+
+        target = logging.FileHandler(self.path)
+        target.name = 'test-target'
+        handler = BackgroundQueueHandler(['test-target'], queue_size=100)
+        handler.handle(self.record())
+        handler.stop()
+        target.close()
+        with open(self.path) as f:
+            self.assertEqual(f.read(), 'hello world\n')
+
+        handler.queue.maxsize = 1
+        handler._ensure_listener = lambda: None  # no consumer: the queue fills up
+        for _ in range(3):
+            handler.handle(self.record())
+        self.assertEqual(handler.dropped, 2)
+
+        handler.queue.get_nowait()
+        handler.queue.maxsize = 3
+        handler.handle(self.record())
+        handler.handle(self.record())  # within report_interval: no second report
+        messages = [record.getMessage() for record in handler.queue.queue]
+        self.assertEqual(messages, ['Log queue was full; dropped 2 records', 'hello world', 'hello world'])
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        from rest_framework.authtoken.models import Token
+
+        self.client = APIClient()
+        self.staff = User.objects.create_user(
+            username='staff',
+            email='staff@example.com',
+            password='testpass123',
+            first_name='Staff',
+            last_name='User',
+            is_staff=True
+        )
+        self.guest = User.objects.create_user(
+            username='testguest',
+            email='guest@example.com',
+            password='testpass123',
+            first_name='Guest',
+            last_name='User'
+        )
+        self.staff_token = Token.objects.create(user=self.staff)
+        self.guest_token = Token.objects.create(user=self.guest)
+
+    def test_staff_header_returns_profile_report(self):
+        """Test that a staff token with X-Profile gets a cProfile report and others get the normal response"""
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.staff_token.key}', HTTP_X_PROFILE='cprofile')
+        response = self.client.get('/api/listings/')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertEqual(response['X-Profiled-Status'], '200')
+        self.assertIn(b'SQL queries, slowest first', response.content)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.guest_token.key}', HTTP_X_PROFILE='cprofile')
+        response = self.client.get('/api/listings/')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertNotIn('X-Profiled-Status', response)
+
+    def test_sampled_requests_and_tasks_log_hot_frames_and_sql(self):
+        """Test that sampled requests and decorated tasks are logged with their hottest functions and SQL"""
+        from django.test import override_settings
+        from . import tasks
+
+        self.client.force_authenticate(self.guest)
+        with override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_TASK_SAMPLE_RATE=1, PROFILING_SAMPLE_MIN_MS=0), \
+                self.assertLogs('listings.profiles', 'INFO') as logs:
+            self.client.get('/api/listings/')
+            tasks.expire_pending_bookings()
+
+        profiles = {record.profile['target']: record.profile for record in logs.records}
+        self.assertEqual(set(profiles), {'/api/listings/', 'task:expire_pending_bookings'})
+        for profile in profiles.values():
+            self.assertTrue(profile['frames'])
+            self.assertTrue(profile['sql'])
+            self.assertEqual(profile['queries'], sum(query['count'] for query in profile['sql']))
+
+    def test_middleware_unloads_when_disabled(self):
+        """Test that with no header and no sampling the middleware removes itself"""
+        from django.core.exceptions import MiddlewareNotUsed
+        from django.test import override_settings
+        from .profiling import ProfilingMiddleware
+
+        with override_settings(PROFILING_HEADER='', PROFILING_SAMPLE_RATE=0):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(lambda request: None)
+
+
+class TaskTracingTest(TestCase):
+    def test_request_trace_id_is_returned_and_stamped_on_published_tasks(self):
+        """Test that requests get a trace ID and tasks published under it carry it with their enqueue time"""
+        from celery.signals import before_task_publish
+        from .tracing import trace_id
+
+        response = self.client.get('/api/listings/', HTTP_X_REQUEST_ID='req-123')
+        self.assertEqual(response['X-Request-ID'], 'req-123')
+        generated = self.client.get('/api/listings/', HTTP_X_REQUEST_ID='bad id\n')['X-Request-ID']
+        self.assertRegex(generated, r'^[0-9a-f]{32}$')
+
+        headers = {}
+        token = trace_id.set('req-123')
+        try:
+            before_task_publish.send(sender='listings.tasks.debug_task', headers=headers, body=None)
+        finally:
+            trace_id.reset(token)
+        self.assertEqual(headers['trace_id'], 'req-123')
+        self.assertAlmostEqual(headers['enqueued_at'], timezone.now().timestamp(), delta=5)
+
+    def test_task_runs_are_logged_and_exported_as_otlp_histograms(self):
+        """Test that a task run records its queue wait, run time and trace ID, and exports OTLP histograms"""
+        import json
+        import tempfile
+        import time
+        from . import tasks, tracing
+
+        tracing.metrics.collect()
+        with self.assertLogs('listings.tracing', 'INFO') as logs:
+            tasks.expire_pending_bookings.apply(headers={'trace_id': 'req-9', 'enqueued_at': time.time() - 2})
+        record = logs.records[-1]
+        self.assertEqual((record.task, record.state, record.retries), ('listings.tasks.expire_pending_bookings', 'SUCCESS', 0))
+        self.assertGreaterEqual(record.queue_wait_ms, 2000)
+        self.assertIsNotNone(record.runtime_ms)
+
+        with tempfile.NamedTemporaryFile(suffix='.jsonl') as f:
+            tracing.OTLPJSONFileExporter(f.name).export(tracing.metrics.collect())
+            request = json.loads(f.read())
+        metrics = {metric['name']: metric for metric in request['resourceMetrics'][0]['scopeMetrics'][0]['metrics']}
+        wait = metrics['celery.task.queue_wait']['histogram']['dataPoints'][0]
+        self.assertEqual(wait['attributes'][0]['value']['stringValue'], 'listings.tasks.expire_pending_bookings')
+        self.assertEqual(wait['count'], '1')
+        self.assertEqual(len(wait['bucketCounts']), len(wait['explicitBounds']) + 1)
+        self.assertIn('celery.task.duration', metrics)
+
+
+class EmailRenderingTest(TestCase):
+    def test_text_parts_come_from_their_own_templates(self):
+        """Test that emails render plain text without markup or HTML escaping, and batches match single renders"""
+        from . import emails
+
+        contexts = [
+            {'guest_name': 'Ada & Bob', 'listing_title': 'Loft <Center>', 'booking_id': 'b1', 'status': 'Confirmed'},
+            {'guest_name': 'Cy', 'listing_title': 'Cabin', 'booking_id': 'b2', 'status': 'Confirmed'},
+        ]
+        text, html = emails.render('booking_confirmed_email', contexts[0])
+        self.assertIn('Dear Ada & Bob,', text)
+        self.assertIn('Property: Loft <Center>', text)
+        self.assertNotIn('<div', text)
+        self.assertIn('Loft &lt;Center&gt;', html)
+
+        self.assertEqual(emails.render_many('booking_confirmed_email', contexts),
+                         [emails.render('booking_confirmed_email', context) for context in contexts])
+
+
+class FakeRedis:
+    """The few Redis string commands listings.dedup uses, in memory."""
+
+    def __init__(self):
+        self.data = {}
+        self.commands = []
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            self.commands.append(None)
+        else:
+            self.data[key] = str(value).encode()
+            self.commands.append(True)
+
+    def get(self, key):
+        self.commands.append(self.data.get(key))
+
+    def delete(self, key):
+        self.commands.append(int(self.data.pop(key, None) is not None))
+
+    def execute(self):
+        results, self.commands = self.commands, []
+        return results
+
+
+class NotificationDedupTest(TestCase):
+    def setUp(self):
+        from unittest import mock
+
+        self.client = APIClient()
+        self.host = User.objects.create_user(
+            username='testhost',
+            email='host@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='Host'
+        )
+        self.listing = Listing.objects.create(
+            title='Dedup Listing',
+            description='A listing',
+            host=self.host,
+            street='1 Main St',
+            city='Dedup City',
+            state='Dedup State',
+            postal_code='12345',
+            country='Dedup Country'
+        )
+        start_date = timezone.now() + timedelta(days=5)
+        self.booking = Booking.objects.create(listing_id=self.listing, user_id=self.host,
+                                              start_date=start_date, end_date=start_date + timedelta(days=2))
+        self.redis = FakeRedis()
+        patcher = mock.patch('listings.dedup.get_client', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_duplicates_are_dropped_and_only_the_latest_status_is_sent(self):
+        """Test that repeated confirm/cancel clicks queue one debounced task that sends the final status once"""
+        from unittest import mock
+        from celery.app.task import Task
+        from django.core import mail
+        from .tasks import send_booking_status_update_email
+
+        self.client.force_authenticate(self.host)
+        with mock.patch.object(Task, 'apply_async') as apply_async:
+            self.client.post(f'/api/bookings/{self.booking.pk}/confirm_booking/')
+            self.client.post(f'/api/bookings/{self.booking.pk}/confirm_booking/')
+            self.client.post(f'/api/bookings/{self.booking.pk}/cancel_booking/')
+        apply_async.assert_called_once()
+        self.assertEqual(apply_async.call_args.kwargs['countdown'], 5)
+
+        booking_id = str(self.booking.pk)
+        send_booking_status_update_email(booking_id, 'confirmed')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertTrue(mail.outbox[0].subject.startswith('Booking Cancelled'))
+
+        # A late duplicate of the same status is not sent again.
+        send_booking_status_update_email(booking_id, 'canceled')
+        self.assertEqual(len(mail.outbox), 1)
+
+
+    def test_failed_publish_releases_the_claim(self):
+        """Test that a notification whose publish fails does not block the next one"""
+        from unittest import mock
+        from celery.app.task import Task
+        from kombu.exceptions import OperationalError
+        from .tasks import send_booking_status_update_email
+
+        booking_id = str(self.booking.pk)
+        with mock.patch.object(Task, 'apply_async', side_effect=OperationalError('broker down')):
+            with self.assertRaises(OperationalError):
+                send_booking_status_update_email.delay(booking_id, 'confirmed')
+        self.assertNotIn(f'notify:booking-status:{booking_id}:pending', self.redis.data)
+
+        with mock.patch.object(Task, 'apply_async') as apply_async:
+            self.assertIsNotNone(send_booking_status_update_email.delay(booking_id, 'confirmed'))
+            self.assertIsNone(send_booking_status_update_email.delay(booking_id, 'confirmed'))
+        apply_async.assert_called_once()
+
+
+class RedisBreakerTest(TestCase):
+    def test_failed_connect_skips_redis_for_a_while(self):
+        """Test that after a failed connect Redis calls fail fast until REDIS_BREAKER_SECONDS pass"""
+        import time
+        from unittest import mock
+        from django.conf import settings
+        from redis.exceptions import RedisError
+        from . import changes, redis_client
+
+        refused = OSError(111, 'Connection refused')
+        with mock.patch.object(redis_client, '_client', None), mock.patch.object(redis_client, '_open_until', 0.0), \
+                mock.patch('redis.connection.Connection._connect', side_effect=refused) as connect:
+            with self.assertRaises(RedisError):
+                redis_client.get_client().get('key')
+            self.assertFalse(redis_client.available())
+            with self.assertRaises(redis_client.RedisUnavailable):
+                redis_client.get_client().get('key')
+            self.assertTrue(changes.current_version().startswith('l'))
+            self.assertEqual(connect.call_count, 1)
+
+            later = time.monotonic() + settings.REDIS_BREAKER_SECONDS + 1
+            with mock.patch('listings.redis_client.time.monotonic', return_value=later):
+                with self.assertRaises(RedisError):
+                    redis_client.get_client().get('key')
+            self.assertEqual(connect.call_count, 2)
+
+
+class RedisThrottleTest(TestCase):
+    def setUp(self):
+        from unittest import mock
+
+        self.client = APIClient()
+        self.script = mock.Mock(return_value=[1, 0])
+        patcher = mock.patch('listings.throttling._script', self.script)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rejected_request_gets_retry_after(self):
+        """Test that a request over the sliding-window limit gets a 429 with Retry-After"""
+        self.script.return_value = [0, 2500]
+        response = self.client.get('/api/payments/verify/tx-123/')
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '3')
+        self.script.assert_called_once_with(keys=['throttle:payments-verify:ip:127.0.0.1'], args=[60000, 30])
+
+    def test_only_signups_are_throttled_and_redis_errors_fail_open(self):
+        """Test that user sign-up is counted per scope and let through when Redis is unreachable"""
+        from redis.exceptions import RedisError
+
+        self.script.side_effect = RedisError('down')
+        response = self.client.post('/api/user/', {
+            'email': 'new@example.com',
+            'first_name': 'New',
+            'last_name': 'User',
+            'password': 'a-Strong-passw0rd',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.script.call_args.kwargs['args'], [3600000, 5])
+
+        self.script.reset_mock()
+        self.client.force_authenticate(User.objects.get(email='new@example.com'))
+        self.client.get('/api/user/')
+        self.script.assert_not_called()
+
+
+    def fake_redis(self):
+        from unittest import mock
+        try:
+            import fakeredis
+        except ImportError:
+            self.skipTest('fakeredis is not installed')
+        for patcher in (mock.patch('listings.throttling._script', None),
+                        mock.patch('listings.throttling.get_client', return_value=fakeredis.FakeRedis())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_sliding_window_script_counts_in_redis(self):
+        """Test that the Lua script allows the limit, then denies with the time until a slot frees"""
+        from . import throttling
+
+        self.fake_redis()
+        results = [throttling.hit('throttle:test', 3, 60) for _ in range(4)]
+        self.assertEqual([allowed for allowed, _ in results], [True, True, True, False])
+        self.assertEqual(results[0][1], 0)
+        self.assertTrue(0 < results[3][1] <= 60)
+
+    def test_spoofed_forwarded_for_does_not_reset_the_count(self):
+        """Test that anonymous clients are counted by the proxy-appended address, whatever they prepend"""
+        from unittest import mock
+        from .throttling import RedisScopedRateThrottle
+
+        self.fake_redis()
+        with mock.patch.object(RedisScopedRateThrottle, 'THROTTLE_RATES', {'payments-verify': '2/min'}):
+            codes = [self.client.get('/api/payments/verify/tx-123/', HTTP_X_FORWARDED_FOR=f'10.9.9.{n}, 203.0.113.7')
+                     .status_code for n in range(3)]
+        self.assertEqual(codes, [status.HTTP_404_NOT_FOUND, status.HTTP_404_NOT_FOUND,
+                                 status.HTTP_429_TOO_MANY_REQUESTS])
+
+
+class PaymentInitializeTest(TestCase):
+    def setUp(self):
+        from unittest import mock
+
+        self.client = APIClient()
+        self.guest = User.objects.create_user(
+            username='payguest',
+            email='payguest@example.com',
+            password='testpass123',
+            first_name='Pay',
+            last_name='Guest'
+        )
+        listing = Listing.objects.create(
+            title='Paid Listing',
+            description='A listing',
+            host=self.guest,
+            street='1 Main St',
+            city='Pay City',
+            state='Pay State',
+            postal_code='12345',
+            country='Pay Country'
+        )
+        start_date = timezone.now() + timedelta(days=5)
+        self.booking = Booking.objects.create(listing_id=listing, user_id=self.guest,
+                                              start_date=start_date, end_date=start_date + timedelta(days=2))
+        self.client.force_authenticate(self.guest)
+        patcher = mock.patch('listings.throttling._script', return_value=[1, 0])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.chapa = mock.Mock()
+        self.chapa.json.return_value = {'status': 'success', 'data': {'checkout_url': 'https://checkout.chapa.co/abc'}}
+
+    def initialize(self, key=None, amount='150.00'):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post('/api/payments/initialize/', {
+            'amount': amount, 'email': 'payguest@example.com', 'booking_id': str(self.booking.pk),
+        }, format='json', **headers)
+
+    def test_retry_with_idempotency_key_returns_stored_checkout_url(self):
+        """Test that a retried Idempotency-Key replays the first response without calling Chapa again"""
+        from unittest import mock
+
+        with mock.patch('listings.views.requests.post', return_value=self.chapa) as post:
+            first = self.initialize(key='retry-1')
+            second = self.initialize(key='retry-1')
+            mismatch = self.initialize(key='retry-1', amount='99.00')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.data['checkout_url'], 'https://checkout.chapa.co/abc')
+        self.assertEqual(second.data['payment']['id'], first.data['payment']['id'])
+        self.assertEqual(mismatch.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        post.assert_called_once()
+        payment = Payment.objects.get()
+        self.assertEqual(payment.booking_id, self.booking)
+        self.assertEqual(payment.user_id, self.guest)
+
+    def test_references_are_unique_and_failed_attempts_are_retried(self):
+        """Test that generated references differ and sort by time, and a failed keyed attempt is retried once"""
+        from unittest import mock
+        import requests
+
+        with mock.patch('listings.views.requests.post', return_value=self.chapa):
+            first = self.initialize()
+            second = self.initialize()
+        references = [first.data['payment']['booking_reference'], second.data['payment']['booking_reference']]
+        self.assertNotEqual(references[0], references[1])
+        # After the prefix, the first 10 characters encode the creation millisecond.
+        self.assertLessEqual(references[0][5:15], references[1][5:15])
+
+        with mock.patch('listings.views.requests.post', side_effect=requests.ConnectionError('down')):
+            failed = self.initialize(key='retry-2')
+        self.assertEqual(failed.status_code, status.HTTP_502_BAD_GATEWAY)
+        with mock.patch('listings.views.requests.post', return_value=self.chapa) as post:
+            retried = self.initialize(key='retry-2')
+        self.assertEqual(retried.status_code, status.HTTP_201_CREATED)
+        post.assert_called_once()
+        self.assertEqual(Payment.objects.filter(idempotency_key='retry-2').count(), 1)
+        self.assertEqual(retried.data['payment']['status'], 'pending')
+
+
+    def test_success_without_checkout_url_fails_and_can_be_retried(self):
+        """Test that a Chapa success with no checkout_url fails the payment instead of leaving it in progress"""
+        from unittest import mock
+
+        no_url = mock.Mock()
+        no_url.json.return_value = {'status': 'success', 'data': {}}
+        with mock.patch('listings.views.requests.post', return_value=no_url):
+            first = self.initialize(key='no-url')
+        self.assertEqual(first.status_code, status.HTTP_502_BAD_GATEWAY)
+        self.assertEqual(Payment.objects.get(idempotency_key='no-url').status, 'failed')
+
+        with mock.patch('listings.views.requests.post', return_value=self.chapa):
+            retried = self.initialize(key='no-url')
+        self.assertEqual(retried.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retried.data['checkout_url'], 'https://checkout.chapa.co/abc')
+
+
+class PaymentReverifyTest(TestCase):
+    def setUp(self):
+        from unittest import mock
+        from django.test import override_settings
+
+        self.guest = User.objects.create_user(
+            username='reverifyguest',
+            email='reverify@example.com',
+            password='testpass123'
+        )
+        settings_override = override_settings(CHAPA_SECRET_KEY='test-secret')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = mock.patch('listings.chapa.payment_events.publish')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def chapa_says(self, payment, **data):
+        from unittest import mock
+
+        response = mock.Mock()
+        response.json.return_value = {'status': 'success', 'message': 'Payment details',
+                                      'data': {'tx_ref': payment.booking_reference, 'amount': '150.00',
+                                               'status': 'success', **data}}
+        return mock.patch('listings.chapa.requests.get', return_value=response)
+
+    def test_reverify_applies_the_verify_endpoint_checks(self):
+        """Test that the admin re-verify job refuses payments whose amount or tx_ref Chapa does not confirm"""
+        from unittest import mock
+        from .tasks import reverify_payments
+
+        paid, short, other = (Payment.objects.create(user_id=self.guest, amount='150.00') for _ in range(3))
+        with mock.patch('listings.tasks.send_payment_confirmation_email.delay') as delay:
+            with self.chapa_says(paid):
+                self.assertEqual(reverify_payments([paid.pk])['successful'], 1)
+            with self.chapa_says(short, amount='1.00'):
+                self.assertEqual(reverify_payments([short.pk])['failed'], 1)
+            with self.chapa_says(other, tx_ref='someone-else'):
+                self.assertEqual(reverify_payments([other.pk])['mismatch'], 1)
+
+        delay.assert_called_once_with(paid.pk)
+        statuses = dict(Payment.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {paid.pk: 'successful', short.pk: 'failed', other.pk: 'failed'})
+
+
+class ListingImportTest(TestCase):
+    CSV = (
+        'title,description,street,city,state,postal_code,country,is_active\n'
+        'Beach House,Sea view,1 Shore Rd,Mombasa,Coast,80100,Kenya,true\n'
+        ',No title,2 Shore Rd,Mombasa,Coast,80100,Kenya,true\n'
+        'Loft,Downtown,3 Main St,Nairobi,Nairobi,00100,Kenya,false\n'
+        'Cabin,Quiet,4 Hill Rd,Nanyuki,Laikipia,10400,Kenya,true\n'
+    )
+
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.tmp.name, LISTING_IMPORT_CHUNK_SIZE=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.host = User.objects.create_user(
+            username='importhost',
+            email='importhost@example.com',
+            password='testpass123',
+            first_name='Import',
+            last_name='Host'
+        )
+
+    def test_upload_runs_in_background_with_progress_and_row_errors(self):
+        """Test that an uploaded CSV is imported by the task in chunks, reporting rejected rows by number"""
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .tasks import import_listings
+
+        self.client.force_authenticate(self.host)
+        upload = SimpleUploadedFile('partner.csv', self.CSV.encode(), content_type='text/csv')
+        with mock.patch('listings.views.import_listings.delay') as delay:
+            response = self.client.post('/api/listings/imports/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        import_id = response.data['import_id']
+        delay.assert_called_once_with(str(import_id))
+
+        with mock.patch('listings.changes.bump_version') as bump_version, \
+                self.captureOnCommitCallbacks(execute=True):
+            import_listings(str(import_id))
+        self.assertTrue(bump_version.called)
+
+        progress = self.client.get(f'/api/listings/imports/{import_id}/')
+        self.assertEqual(progress.data['status'], 'completed')
+        self.assertEqual((progress.data['rows_processed'], progress.data['rows_created'], progress.data['rows_failed']),
+                         (4, 3, 1))
+        self.assertEqual(progress.data['errors'], [{'row': 2, 'errors': {'title': ['This field may not be blank.']}}])
+        self.assertEqual(set(Listing.objects.filter(host=self.host).values_list('title', flat=True)),
+                         {'Beach House', 'Loft', 'Cabin'})
+
+        self.client.force_authenticate(User.objects.create_user(username='other', email='other@example.com',
+                                                                password='testpass123'))
+        self.assertEqual(self.client.get(f'/api/listings/imports/{import_id}/').status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_interrupted_import_resumes_from_checkpoint(self):
+        """Test that an import stopped after a chunk continues from its checkpoint without duplicating rows"""
+        from unittest import mock
+        from django.core.files.base import ContentFile
+        from . import imports
+        from .models import ListingImport
+
+        listing_import = ListingImport(host=self.host, file_format='ndjson')
+        lines = b''.join(b'{"title": "Flat %d", "description": "d", "street": "s", "city": "Kisumu", '
+                         b'"state": "s", "postal_code": "1", "country": "Kenya"}\n' % i for i in range(5))
+        listing_import.source.save('partner.ndjson', ContentFile(lines + b'not json\n'))
+
+        with mock.patch('listings.changes.bump_version'):
+            self.assertTrue(imports.run(listing_import, deadline=0))
+            self.assertEqual(ListingImport.objects.get(pk=listing_import.pk).rows_processed, 2)
+
+            self.assertFalse(imports.run(ListingImport.objects.get(pk=listing_import.pk)))
+        listing_import.refresh_from_db()
+        self.assertEqual(listing_import.status, ListingImport.Status.COMPLETED)
+        self.assertEqual((listing_import.rows_created, listing_import.rows_failed), (5, 1))
+        self.assertEqual(Listing.objects.filter(city='Kisumu').count(), 5)
+
+    def test_unexpected_error_marks_the_import_failed(self):
+        """Test that an error outside the expected file errors still leaves the import FAILED with its message"""
+        from unittest import mock
+        from django.core.files.base import ContentFile
+        from django.db import DatabaseError
+        from . import imports
+        from .models import ListingImport
+
+        listing_import = ListingImport(host=self.host, file_format='ndjson')
+        listing_import.source.save('broken.ndjson', ContentFile(b'{"title": "Flat"}\n'))
+
+        with mock.patch('listings.imports._commit_chunk', side_effect=DatabaseError('disk full')):
+            with self.assertRaises(DatabaseError):
+                imports.run(listing_import)
+        listing_import.refresh_from_db()
+        self.assertEqual(listing_import.status, ListingImport.Status.FAILED)
+        self.assertEqual(listing_import.error, 'After row 0: DatabaseError: disk full')
+
+
+class LeanProfileTest(TestCase):
+    def setUp(self):
+        import importlib
+        import tempfile
+        from django.test import override_settings
+        from django.urls import clear_url_caches
+        from alx_travel_app import urls
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(clear_url_caches)
+        self.addCleanup(importlib.reload, urls)
+        settings_override = override_settings(APP_PROFILE='lean', STATIC_ROOT=self.tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        importlib.reload(urls)
+        clear_url_caches()
+
+    def test_schema_redirects_to_the_collected_file(self):
+        """Test that the lean /api/schema/ redirects to the static schema, and 404s until it is collected"""
+        from django.conf import settings
+        from django.test import override_settings
+
+        response = self.client.get('/api/schema/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        storages = {**settings.STORAGES, 'staticfiles': {
+            'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+        with override_settings(STORAGES=storages):
+            response = self.client.get('/api/schema/')
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(response['Location'], '/static/schema/openapi.json')
+        self.assertEqual(self.client.get('/swagger/').status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,319 @@
+"""
+Request-to-task correlation and task latency metrics.
+
+Every request gets a trace ID: the incoming X-Request-ID, or the trace id
+of a W3C ``traceparent``, or a new random one. It is returned in the
+response, added to every log record, and copied into the headers of each
+task published while handling the request, so a view and the emails it
+queues share one ID. Tasks queued by tasks (including retries) keep the
+ID too.
+
+Each published task also carries its enqueue time. When a task runs, its
+queue wait (enqueue or ETA to start), run time, retries and final state
+are logged on ``listings.tracing``. Queue wait and run time also go into
+per-task histograms. Every TASK_METRICS_EXPORT_SECONDS they are appended
+to TASK_METRICS_FILE as OTLP/JSON lines, one ExportMetricsServiceRequest
+per line with delta temporality. An OpenTelemetry Collector can tail that
+file with its ``otlpjsonfile`` receiver.
+
+This module is imported while logging is configured (CorrelationIdFilter),
+so it must not import Django models.
+"""
+import atexit
+import contextvars
+import fcntl
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from datetime import datetime
+
+import orjson
+from celery.signals import before_task_publish, task_postrun, task_prerun, task_retry, worker_process_shutdown
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+trace_id = contextvars.ContextVar('trace_id', default=None)
+
+# Celery already uses "correlation_id" for the task id, so the headers get their own names.
+TRACE_HEADER = 'trace_id'
+ENQUEUED_HEADER = 'enqueued_at'
+VALID_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+TRACEPARENT_RE = re.compile(r'^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$')
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+class CorrelationIdMiddleware:
+    """Sets the trace ID for the request and returns it in TRACE_ID_HEADER."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = settings.TRACE_ID_HEADER
+        self.meta_key = f"HTTP_{self.header.upper().replace('-', '_')}"
+
+    def __call__(self, request):
+        incoming = request.META.get(self.meta_key, '')
+        if not VALID_ID_RE.match(incoming):
+            parent = TRACEPARENT_RE.match(request.META.get('HTTP_TRACEPARENT', ''))
+            incoming = parent[1] if parent else new_trace_id()
+        token = trace_id.set(incoming)
+        try:
+            response = self.get_response(request)
+        finally:
+            trace_id.reset(token)
+        response[self.header] = incoming
+        return response
+
+
+class CorrelationIdFilter(logging.Filter):
+    """Adds ``trace_id`` to records logged while a request or task is running."""
+
+    def filter(self, record):
+        current = trace_id.get()
+        if current is not None and not hasattr(record, 'trace_id'):
+            record.trace_id = current
+        return True
+
+
+class Histogram:
+    """Explicit-bucket histogram in the OTLP shape (bucket i counts values <= bounds[i])."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+
+METRICS = {
+    'celery.task.queue_wait': 'Time from enqueue (or ETA) until a worker started the task',
+    'celery.task.duration': 'Time the task body ran',
+}
+
+
+class TaskMetrics:
+    """Per-process task histograms and retry counts, collected as OTLP JSON deltas."""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self._lock = threading.Lock()
+        self._reset(time.time_ns())
+
+    def _reset(self, start_ns):
+        self.start_ns = start_ns
+        self.histograms = {}
+        self.retries = {}
+
+    def observe(self, metric, task_name, ms):
+        with self._lock:
+            key = (metric, task_name)
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(self.bounds)
+            self.histograms[key].observe(ms)
+
+    def add_retry(self, task_name):
+        with self._lock:
+            self.retries[task_name] = self.retries.get(task_name, 0) + 1
+
+    def collect(self):
+        """An ExportMetricsServiceRequest for everything since the last collect, or None."""
+        now = time.time_ns()
+        with self._lock:
+            histograms, retries, start_ns = self.histograms, self.retries, self.start_ns
+            self._reset(now)
+        if not histograms and not retries:
+            return None
+
+        def attributes(task_name):
+            return [{'key': 'celery.task.name', 'value': {'stringValue': task_name}}]
+
+        metrics = []
+        for name, description in METRICS.items():
+            points = [
+                {
+                    'attributes': attributes(task_name),
+                    'startTimeUnixNano': str(start_ns),
+                    'timeUnixNano': str(now),
+                    'count': str(histogram.count),
+                    'sum': histogram.sum,
+                    'min': histogram.min,
+                    'max': histogram.max,
+                    'bucketCounts': [str(count) for count in histogram.counts],
+                    'explicitBounds': histogram.bounds,
+                }
+                for (metric, task_name), histogram in sorted(histograms.items()) if metric == name
+            ]
+            if points:
+                metrics.append({'name': name, 'description': description, 'unit': 'ms',
+                                'histogram': {'aggregationTemporality': 1, 'dataPoints': points}})
+        if retries:
+            metrics.append({
+                'name': 'celery.task.retries', 'unit': '{retry}',
+                'sum': {'aggregationTemporality': 1, 'isMonotonic': True, 'dataPoints': [
+                    {'attributes': attributes(task_name), 'startTimeUnixNano': str(start_ns),
+                     'timeUnixNano': str(now), 'asInt': str(count)}
+                    for task_name, count in sorted(retries.items())
+                ]},
+            })
+        return {'resourceMetrics': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': settings.TASK_METRICS_SERVICE_NAME}},
+                {'key': 'process.pid', 'value': {'intValue': str(os.getpid())}},
+            ]},
+            'scopeMetrics': [{'scope': {'name': __name__}, 'metrics': metrics}],
+        }]}
+
+
+class OTLPJSONFileExporter:
+    """Appends one JSON request per line, under a lock so processes can share the file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, request):
+        line = orjson.dumps(request) + b'\n'
+        with open(self.path, 'ab') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(line)
+
+
+class PeriodicExport:
+    """Collects and exports every ``interval`` seconds from a thread started on first use in each process."""
+
+    def __init__(self, metrics, exporter, interval):
+        self.metrics = metrics
+        self.exporter = exporter
+        self.interval = interval
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        atexit.register(self.flush)
+
+    def ensure_running(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # Anything inherited from the parent is the parent's to export.
+                self.metrics._reset(time.time_ns())
+                self._stop = threading.Event()
+                threading.Thread(target=self._run, name='task-metrics-export', daemon=True).start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        if self._pid != os.getpid():
+            return
+        request = self.metrics.collect()
+        if request is not None:
+            try:
+                self.exporter.export(request)
+            except OSError as e:
+                logger.warning("Could not export task metrics: %s", e)
+
+
+metrics = TaskMetrics(settings.TASK_METRICS_BUCKETS_MS)
+exporter = (PeriodicExport(metrics, OTLPJSONFileExporter(settings.TASK_METRICS_FILE),
+                           settings.TASK_METRICS_EXPORT_SECONDS)
+            if settings.TASK_METRICS_FILE else None)
+
+# task_id -> (perf_counter at start, trace_id context token)
+_running = {}
+
+
+def _timestamp(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def _header(request, name):
+    # Workers merge message headers into the request; eager apply() nests them.
+    value = request.get(name)
+    if value is None and isinstance(request.headers, dict):
+        value = request.headers.get(name)
+    return value
+
+
+@before_task_publish.connect
+def _stamp_headers(headers=None, **kwargs):
+    if headers is None:
+        return
+    headers.setdefault(TRACE_HEADER, trace_id.get() or new_trace_id())
+    headers[ENQUEUED_HEADER] = time.time()
+
+
+@task_prerun.connect
+def _task_started(task_id=None, task=None, **kwargs):
+    token = trace_id.set(_header(task.request, TRACE_HEADER) or trace_id.get())
+    _running[task_id] = (time.perf_counter(), time.time(), token)
+
+
+@task_postrun.connect
+def _task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _running.pop(task_id, None)
+    if started is None:
+        return
+    started_perf, started_at, token = started
+    runtime_ms = (time.perf_counter() - started_perf) * 1000
+    request = task.request
+    enqueued_at = _timestamp(_header(request, ENQUEUED_HEADER))
+    ready_at = max(filter(None, (enqueued_at, _timestamp(request.get('eta')))), default=None)
+    queue_wait_ms = max(0.0, (started_at - ready_at) * 1000) if ready_at else None
+
+    if exporter is not None:
+        exporter.ensure_running()
+        metrics.observe('celery.task.duration', task.name, runtime_ms)
+        if queue_wait_ms is not None:
+            metrics.observe('celery.task.queue_wait', task.name, queue_wait_ms)
+    logger.info("Task %s %s", task.name, state, extra={
+        'task': task.name,
+        'task_id': task_id,
+        'state': state,
+        'enqueued_at': enqueued_at,
+        'started_at': started_at,
+        'queue_wait_ms': None if queue_wait_ms is None else round(queue_wait_ms, 2),
+        'runtime_ms': round(runtime_ms, 2),
+        'retries': request.retries or 0,
+    })
+    try:
+        trace_id.reset(token)
+    except ValueError:  # finished in a different context than it started
+        pass
+
+
+@task_retry.connect
+def _task_retried(sender=None, **kwargs):
+    if exporter is not None:
+        exporter.ensure_running()
+        metrics.add_retry(sender.name)
+
+
+@worker_process_shutdown.connect
+def _flush_on_shutdown(**kwargs):
+    if exporter is not None:
+        exporter.flush()
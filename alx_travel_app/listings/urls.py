@@ -6,7 +6,9 @@ from .views import (CustomUserViewSet,
                     ReviewViewSet,
                     InitializePaymentAPIView,
                     VerifyPaymentAPIView,
-                    ChapaWebhookAPIView
+                    ChapaWebhookAPIView,
+                    ExportAPIView,
+                    payment_event_stream
                     )
 
 router = routers.DefaultRouter()
@@ -22,4 +24,6 @@ urlpatterns = [
     path("payments/verify/<str:tx_ref>/", VerifyPaymentAPIView.as_view(), name="payments-verify"),
     path("payments/verify/", VerifyPaymentAPIView.as_view(), name="payments-verify-query"),
     path("payments/webhook/", ChapaWebhookAPIView.as_view(), name="payments-webhook"),
+    path("payments/<str:tx_ref>/events/", payment_event_stream, name="payment-events"),
+    path("exports/<str:dataset>.<str:file_format>", ExportAPIView.as_view(), name="export"),
 ]
\ No newline at end of file
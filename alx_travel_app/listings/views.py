@@ -1,47 +1,229 @@
-from .models import CustomUser, Listing, Booking, Review, Payment
+from .models import CustomUser, Listing, ListingImport, Booking, Review, Payment, ListingDailyStats, new_payment_reference
+import copy
 import os
 from django.conf import settings
 from rest_framework import viewsets, permissions, status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 import requests
 import logging
-import time
+from datetime import timedelta
 from decimal import Decimal, InvalidOperation
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from .tasks import send_booking_confirmation_email, send_booking_status_update_email
+from .throttling import RedisScopedRateThrottle
+from .exports import DATASETS, FORMATS, filter_export, stream_export
+from .fastpath import FastListMixin
+from . import chapa, facets, imports, locations, occupancy, payment_events, rollups, similarity
+from .availability import create_bookings, set_status
+from .tasks import (import_listings,
+                    send_booking_confirmation_email,
+                    send_booking_status_update_email,
+                    send_group_booking_confirmation_email)
 from .serializers import (CustomUserSerializer,
                           ListingSerializer, 
+                          ListingImportSerializer,
                           BookingSerializer, 
+                          BookingBulkItemSerializer,
                           ReviewSerializer, 
                           PaymentSerializer
 )
 
 
+class SparseFieldsMixin:
+    """
+    Narrows read querysets to the columns and joins the serializer needs
+    for the requested ?fields= / ?expand=.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method not in permissions.SAFE_METHODS:
+            return queryset
+        return self.get_serializer().narrow_queryset(queryset)
+
+
 # Create your views here.
 class CustomUserViewSet(viewsets.ModelViewSet):
     queryset = CustomUser.objects.all() 
     serializer_class = CustomUserSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'user-signup'
     
     def get_permissions(self):
         if self.action in ['create']:  
             return [AllowAny()]
         return [IsAuthenticated()]
+
+    def get_throttles(self):
+        # Only sign-ups are rate limited
+        if self.action == 'create':
+            return [RedisScopedRateThrottle()]
+        return super().get_throttles()
     
-class ListingViewSet(viewsets.ModelViewSet):
+class ListingViewSet(FastListMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Listing.objects.all()
     serializer_class = ListingSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    filter_backends = [facets.FacetFilterBackend]
+
+    def list(self, request, *args, **kwargs):
+        """Listings filtered by ?country=&state=&city=&is_active=; add ?facets=true for counts per value."""
+        if request.query_params.get('facets', '').lower() not in ('1', 'true'):
+            return super().list(request, *args, **kwargs)
+        response = super().list(request, *args, **kwargs)
+        counts = facets.facet_counts(Listing.objects.all(), facets.parse_filters(request.query_params))
+        return Response({'count': len(response.data), 'results': response.data, 'facets': counts})
+
     def perform_create(self, serializer):
          serializer.save(host=self.request.user)
 
+    @action(detail=True, methods=['get'])
+    def calendar(self, request, pk=None):
+        """Occupancy for the next 365 days as a day bitmap plus booked ranges."""
+        listing = self.get_object()
+        return Response(occupancy.calendar_payload(occupancy.get_calendar(listing.pk)))
+
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        """
+        Active listings free for every night in [start, end), a page at a
+        time in listing_id order. ``next`` is the ``after`` value for the
+        following page, or null on the last one.
+        """
+        start = parse_date(request.query_params.get('start') or '')
+        end = parse_date(request.query_params.get('end') or '')
+        if not (start and end):
+            return Response({'detail': 'start and end are required (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', settings.AVAILABILITY_PAGE_SIZE))
+        except ValueError:
+            return Response({'detail': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(limit, 1), settings.AVAILABILITY_MAX_PAGE_SIZE)
+
+        listings = Listing.objects.filter(is_active=True).order_by('listing_id')
+        after = request.query_params.get('after')
+        try:
+            if after:
+                listings = listings.filter(listing_id__gt=after)
+            listing_ids = listings.values_list('listing_id', flat=True).iterator(
+                chunk_size=settings.AVAILABILITY_CHUNK_SIZE)
+            free, last = occupancy.find_available(listing_ids, start, end, limit)
+        except DjangoValidationError:
+            return Response({'detail': 'after must be a listing id'}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'start': start, 'end': end, 'listing_ids': free, 'next': last})
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Active listings most similar in title, description and location, best first."""
+        listing = self.get_object()
+        try:
+            limit = int(request.query_params.get('limit', settings.SIMILAR_LISTINGS_K))
+        except ValueError:
+            return Response({'detail': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        neighbors = similarity.similar_to(listing.pk, max(limit, 1))
+        found = self.get_serializer().narrow_queryset(
+            Listing.objects.filter(is_active=True)).in_bulk([listing_id for listing_id, _ in neighbors])
+        results = [{**self.get_serializer(found[listing_id]).data, 'similarity': round(score, 4)}
+                   for listing_id, score in neighbors if listing_id in found]
+        return Response({'listing_id': listing.pk, 'results': results})
+
+    @action(detail=False, methods=['get'])
+    def locations(self, request):
+        """Autocomplete for cities and countries of active listings, served from an in-memory index."""
+        prefix = request.query_params.get('prefix', '')
+        try:
+            limit = min(int(request.query_params.get('limit', settings.LOCATION_AUTOCOMPLETE_LIMIT)), 50)
+        except ValueError:
+            return Response({'detail': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'prefix': prefix, 'results': locations.search(prefix, max(limit, 1))})
+
+    def _stats_window(self, request):
+        """(since, until, interval) from the query string, defaulting to the last 30 days."""
+        params = request.query_params
+        until = parse_date(params.get('until') or '') or timezone.localdate()
+        since = parse_date(params.get('since') or '') or until - timedelta(days=29)
+        interval = params.get('interval', 'day')
+        if interval not in rollups.INTERVALS:
+            raise ValueError(f"interval must be one of {', '.join(rollups.INTERVALS)}")
+        if since > until or (until - since).days >= settings.LISTING_STATS_MAX_DAYS:
+            raise ValueError(f'since must be on or before until and at most {settings.LISTING_STATS_MAX_DAYS} days earlier')
+        return since, until, interval
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """Occupancy, revenue and rating for one of the host's listings, read from the daily rollups."""
+        listing = self.get_object()
+        if listing.host_id != request.user.pk and not request.user.is_staff:
+            return Response({'detail': 'Only the host can view listing stats.'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            since, until, interval = self._stats_window(request)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        summary = rollups.summarize(ListingDailyStats.objects.filter(listing_id=listing.pk), since, until, interval)
+        return Response({'listing_id': listing.pk, **summary})
+
+    @action(detail=False, methods=['get'])
+    def host_stats(self, request):
+        """The same figures across all of the current user's listings, with a per-listing breakdown."""
+        try:
+            since, until, interval = self._stats_window(request)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        listings = Listing.objects.filter(host=request.user).count()
+        queryset = ListingDailyStats.objects.filter(listing_id__host=request.user)
+        summary = rollups.summarize(queryset, since, until, interval, listings=listings)
+        return Response({'listings': listings, **summary,
+                         'by_listing': rollups.per_listing(queryset, since, until)})
+
+    @action(detail=False, methods=['post'], url_path='imports')
+    def bulk_import(self, request):
+        """
+        Upload a CSV or NDJSON file of listings (multipart field ``file``) to
+        create them for the current user in the background. Returns the
+        import; follow it at /api/listings/imports/<import_id>/.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('format') or imports.format_of(upload.name)
+        if file_format not in imports.FORMATS:
+            return Response({'detail': f"format must be one of {', '.join(imports.FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if upload.size > settings.LISTING_IMPORT_MAX_UPLOAD_MB * 1024 * 1024:
+            return Response({'detail': f'Files are limited to {settings.LISTING_IMPORT_MAX_UPLOAD_MB} MB'},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        listing_import = ListingImport(host=request.user, file_format=file_format)
+        listing_import.source.save(upload.name, upload, save=False)
+        listing_import.save()
+        import_listings.delay(str(listing_import.pk))
+        return Response(ListingImportSerializer(listing_import).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path=r'imports/(?P<import_id>[0-9a-f-]{32,36})')
+    def import_progress(self, request, import_id=None):
+        """Progress and rejected rows of one of the current user's imports."""
+        try:
+            listing_import = ListingImport.objects.filter(pk=import_id, host=request.user).first()
+        except DjangoValidationError:  # not a UUID
+            listing_import = None
+        if listing_import is None:
+            return Response({'detail': 'Import not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ListingImportSerializer(listing_import).data)
+
 
-class BookingViewSet(viewsets.ModelViewSet):
+class BookingViewSet(FastListMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -49,31 +231,89 @@ class BookingViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """Create a booking and trigger email notification."""
         booking = serializer.save(user_id=self.request.user)
+        occupancy.mark_booked(booking)
         
         # Trigger asynchronous email task
         send_booking_confirmation_email.delay(str(booking.booking_id))
         
         return booking
+
+    def perform_update(self, serializer):
+        """Save an edit and move the booking's nights to its new dates/status."""
+        before = copy.copy(serializer.instance)
+        booking = serializer.save()
+        occupancy.rebook(before, booking)
+        rollups.refresh_bookings([before, booking])
+
+    def perform_destroy(self, instance):
+        """Delete a booking and free its nights."""
+        before = copy.copy(instance)
+        instance.delete()
+        occupancy.rebook(before, None)
+        rollups.refresh_booking(before)
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create up to BOOKING_BULK_MAX_ITEMS bookings in one request.
+        Items are validated and inserted together; failures are reported
+        per item index and do not block the rest of the batch.
+        """
+        items = request.data.get('bookings') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({'detail': 'Expected a non-empty list of bookings.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.BOOKING_BULK_MAX_ITEMS:
+            return Response({'detail': f'At most {settings.BOOKING_BULK_MAX_ITEMS} bookings per request.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        errors, valid, positions = {}, [], []
+        for index, item in enumerate(items):
+            item_serializer = BookingBulkItemSerializer(data=item)
+            if item_serializer.is_valid():
+                valid.append(item_serializer.validated_data)
+                positions.append(index)
+            else:
+                errors[index] = item_serializer.errors
+
+        created, conflicts = create_bookings(request.user, valid)
+        for valid_index, message in conflicts.items():
+            errors[positions[valid_index]] = {'non_field_errors': [message]}
+
+        if created:
+            occupancy.mark_booked_many(created)
+            send_group_booking_confirmation_email.delay([str(booking.booking_id) for booking in created])
+
+        if not created:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({
+            'created': BookingSerializer(created, many=True).data,
+            'errors': [{'index': index, 'errors': errors[index]} for index in sorted(errors)],
+        }, status=response_status)
+
     @action(detail=False, methods=['get'])
     def my_bookings(self, request):
         """Get all bookings for the current user."""
-        bookings = Booking.objects.filter(user_id=request.user)
-        serializer = self.get_serializer(bookings, many=True)
-        return Response(serializer.data)
+        bookings = self.get_queryset().filter(user_id=request.user)
+        return self.fast_list_response(bookings)
     
     @action(detail=True, methods=['post'])
     def confirm_booking(self, request, pk=None):
         """Confirm a pending booking."""
         booking = self.get_object()
-        if booking.status != Booking.Status.PENDING:
+        # Conditional UPDATE, so a booking expired or canceled meanwhile is not revived.
+        if not set_status(Booking.objects.filter(pk=booking.pk), Booking.Status.CONFIRMED):
             return Response(
                 {'detail': 'Only pending bookings can be confirmed.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         booking.status = Booking.Status.CONFIRMED
-        booking.save()
+        occupancy.mark_booked(booking)
+        rollups.refresh_booking(booking)
         
         # Send confirmation email
         send_booking_status_update_email.delay(str(booking.booking_id), 'confirmed')
@@ -90,14 +330,15 @@ class BookingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        if booking.status == Booking.Status.CANCELED:
+        if not set_status(Booking.objects.filter(pk=booking.pk), Booking.Status.CANCELED):
             return Response(
                 {'detail': 'Booking is already cancelled.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         booking.status = Booking.Status.CANCELED
-        booking.save()
+        occupancy.release(booking)
+        rollups.refresh_booking(booking)
         
         # Send cancellation email
         send_booking_status_update_email.delay(str(booking.booking_id), 'canceled')
@@ -105,56 +346,137 @@ class BookingViewSet(viewsets.ModelViewSet):
         return Response({'status': 'booking cancelled'})
 
         
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(FastListMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        review = serializer.save(user_id=self.request.user)
+        rollups.refresh_review(review)
+
+    def perform_update(self, serializer):
+        before = copy.copy(serializer.instance)
+        review = serializer.save()
+        rollups.refresh_reviews([before, review])
+
+    def perform_destroy(self, instance):
+        before = copy.copy(instance)
+        instance.delete()
+        rollups.refresh_review(before)
         
 
 class InitializePaymentAPIView(APIView):
     """
     Initialize a payment with Chapa and store the transaction in your DB.
+
+    Clients may send an ``Idempotency-Key`` header (unique per user). A
+    retry with the same key gets the stored checkout URL back without a
+    second Payment or Chapa call. If the earlier attempt failed, it is
+    tried again under a new reference.
     """
     permission_classes = [permissions.IsAuthenticated]  # or AllowAny for testing
+    throttle_classes = [RedisScopedRateThrottle]
+    throttle_scope = 'payments-initialize'
 
     def post(self, request, *args, **kwargs):
-        from decimal import Decimal
-        user = request.user if request.user.is_authenticated else None
+        user = request.user
         data = request.data
 
         amount = data.get("amount")
         email = data.get("email")
         first_name = data.get("first_name", "")
         last_name = data.get("last_name", "")
-        booking_reference = data.get("booking_reference") or f"BOOK-{int(time.time())}"
+        booking_reference = data.get("booking_reference") or new_payment_reference()
         currency = data.get("currency", "NGN")
-        callback_url = data.get("callback_url") or f"{request.build_absolute_uri('/api/payments/verify/')}{booking_reference}/"
+        idempotency_key = request.headers.get("Idempotency-Key")
 
         if not (amount and email):
             return Response({"detail": "amount and email are required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            amount = Decimal(str(amount))
+        except InvalidOperation:
+            return Response({"detail": "amount must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        if idempotency_key is not None and not 0 < len(idempotency_key) <= 255:
+            return Response({"detail": "Idempotency-Key must be 1 to 255 characters"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if data.get("booking_id"):
+            booking = self.own_booking(user, data["booking_id"])
+            if booking is None:
+                return Response({"detail": "booking_id is not one of your bookings"}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            # Older clients send the booking id as the reference.
+            booking = self.own_booking(user, data.get("booking_reference"))
 
-        # Create payment record locally
-        payment = Payment.objects.create(
-            user=user,
-            booking_reference=booking_reference,
-            amount=Decimal(amount),
-            currency=currency,
-            status="pending"
-        )
+        if idempotency_key:
+            payment = Payment.objects.filter(user_id=user, idempotency_key=idempotency_key).first()
+            if payment is not None:
+                return self.replay(request, payment, amount, currency, booking)
+        try:
+            with transaction.atomic():
+                payment = Payment.objects.create(
+                    user_id=user,
+                    booking_id=booking,
+                    booking_reference=booking_reference,
+                    idempotency_key=idempotency_key or None,
+                    amount=amount,
+                    currency=currency,
+                    status="pending"
+                )
+        except IntegrityError:
+            # A concurrent request with the same key got there first, or the client reused a reference.
+            payment = Payment.objects.filter(user_id=user, idempotency_key=idempotency_key).first() \
+                if idempotency_key else None
+            if payment is not None:
+                return self.replay(request, payment, amount, currency, booking)
+            return Response({"detail": "booking_reference is already in use"}, status=status.HTTP_409_CONFLICT)
+        return self.initialize(request, payment, email, first_name, last_name)
+
+    @staticmethod
+    def own_booking(user, booking_id):
+        if not booking_id:
+            return None
+        try:
+            return Booking.objects.filter(pk=booking_id, user_id=user).first()
+        except DjangoValidationError:  # not a UUID
+            return None
+
+    def replay(self, request, payment, amount, currency, booking):
+        """The response for a retried Idempotency-Key."""
+        if payment.amount != amount or payment.currency != currency or payment.booking_id_id != getattr(booking, 'pk', None):
+            return Response({"detail": "Idempotency-Key was already used for a different payment"},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if payment.checkout_url:
+            response = self.initialized(payment)
+            response["Idempotent-Replayed"] = "true"
+            return response
+        if payment.status == "failed":
+            # Claim the failed attempt so only one retry reaches Chapa.
+            reference = new_payment_reference()
+            claimed = Payment.objects.filter(pk=payment.pk, status="failed").update(
+                status="pending", booking_reference=reference, updated_at=timezone.now())
+            if claimed:
+                payment.refresh_from_db()
+                data = request.data
+                return self.initialize(request, payment, data.get("email"),
+                                       data.get("first_name", ""), data.get("last_name", ""))
+        return Response({"detail": "A request with this Idempotency-Key is still in progress"},
+                        status=status.HTTP_409_CONFLICT)
+
+    def initialize(self, request, payment, email, first_name, last_name):
+        booking_reference = payment.booking_reference
+        callback_url = request.data.get("callback_url") or f"{request.build_absolute_uri('/api/payments/verify/')}{booking_reference}/"
 
         # Prepare Chapa API call
         chapa_url = "https://api.chapa.co/v1/transaction/initialize"
         headers = {"Authorization": f"Bearer {CHAPA_SECRET_KEY}"}
         payload = {
-            "amount": str(amount),
+            "amount": str(payment.amount),
             "email": email,
             "first_name": first_name,
             "last_name": last_name,
             "tx_ref": booking_reference,
-            "currency": currency,
+            "currency": payment.currency,
             "callback_url": callback_url,
             "customization": {
                 "title": "ALX Travel Payment",
@@ -168,33 +490,41 @@ class InitializePaymentAPIView(APIView):
             resp_data = resp.json()
         except requests.RequestException as e:
             payment.status = "failed"
-            payment.save()
+            payment.save(update_fields=["status", "updated_at"])
             return Response({"detail": "Failed to initiate payment", "error": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
 
+        checkout_url = (resp_data.get("data") or {}).get("checkout_url")
+        if resp_data.get("status") == "success" and checkout_url:
+            payment.checkout_url = checkout_url
+            payment.save(update_fields=["checkout_url", "updated_at"])
+            return self.initialized(payment)
+        # Without a checkout URL the payment cannot proceed; failing it lets a keyed retry try again.
+        payment.status = "failed"
+        payment.save(update_fields=["status", "updated_at"])
         if resp_data.get("status") == "success":
-            checkout_url = resp_data.get("data", {}).get("checkout_url")
-            # Optionally store full Chapa response for debugging
-            if hasattr(payment, "metadata"):
-                payment.metadata = resp_data
-                payment.save()
+            return Response({"detail": "Chapa returned no checkout_url", "response": resp_data},
+                            status=status.HTTP_502_BAD_GATEWAY)
+        return Response({"detail": "Chapa initialization failed", "response": resp_data}, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response({
-                "detail": "Payment initialized successfully",
-                "checkout_url": checkout_url,
-                "payment": PaymentSerializer(payment).data
-            }, status=status.HTTP_201_CREATED)
-        else:
-            payment.status = "failed"
-            payment.save()
-            return Response({"detail": "Chapa initialization failed", "response": resp_data}, status=status.HTTP_400_BAD_REQUEST)
+    @staticmethod
+    def initialized(payment):
+        return Response({
+            "detail": "Payment initialized successfully",
+            "checkout_url": payment.checkout_url,
+            "payment": PaymentSerializer(payment).data
+        }, status=status.HTTP_201_CREATED)
 
 
 CHAPA_SECRET_KEY = os.getenv("CHAPA_SECRET_KEY")
 CHAPA_VERIFY_URL = "https://api.chapa.co/v1/transaction/verify/"
 
 logger = logging.getLogger(__name__)
+# Full gateway responses; sampled and truncated by the logging config.
+payload_logger = logging.getLogger("listings.payloads")
 class VerifyPaymentAPIView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [RedisScopedRateThrottle]
+    throttle_scope = 'payments-verify'
 
     def get(self, request, tx_ref=None, *args, **kwargs):
         tx_ref = tx_ref or request.query_params.get("tx_ref")
@@ -215,76 +545,19 @@ class VerifyPaymentAPIView(APIView):
             logger.error("CHAPA_SECRET_KEY not configured")
             return Response({"detail": "Payment gateway not configured"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        verify_url = f"{CHAPA_VERIFY_URL}{tx_ref}"
-        headers = {"Authorization": f"Bearer {CHAPA_SECRET_KEY}"}
         try:
-            resp = requests.get(verify_url, headers=headers, timeout=15)
-            resp.raise_for_status()
+            outcome, resp_data = chapa.verify_with_chapa(payment)
+        except ValueError:  # before RequestException: requests' JSONDecodeError is both
+            return Response({"detail": "Invalid response from payment provider"}, status=status.HTTP_502_BAD_GATEWAY)
         except requests.RequestException as e:
-            logger.error("Failed to call Chapa verify: %s", str(e))
             return Response({"detail": "Failed to verify with Chapa", "error": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
 
-        # Parse JSON safely
-        try:
-            resp_data = resp.json()
-        except ValueError:
-            logger.error("Invalid JSON from Chapa: %s", resp.text)
-            return Response({"detail": "Invalid response from payment provider"}, status=status.HTTP_502_BAD_GATEWAY)
-
-        logger.info("Chapa verify response for %s: %s", tx_ref, resp.text)
-
-        chapa_status = (resp_data.get("status") or "").lower()
-        chapa_data = resp_data.get("data") or {}
-
-        chapa_tx_ref = chapa_data.get("tx_ref") or chapa_data.get("reference") or chapa_data.get("id")
-        chapa_amount = chapa_data.get("amount")
-
-        # Basic checks
-        if str(chapa_tx_ref) != str(payment.booking_reference):
-            logger.warning("tx_ref mismatch: local=%s chapa=%s", payment.booking_reference, chapa_tx_ref)
-            payment.status = "failed"
-            # optional: payment.metadata = resp_data
-            payment.save()
+        if outcome == chapa.MISMATCH:
             return Response({"detail": "Transaction reference mismatch. Marked failed."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Compare amounts (use Decimal)
-        amount_ok = True
-        if chapa_amount is not None:
-            try:
-                chapa_amount_dec = Decimal(str(chapa_amount))
-                if chapa_amount_dec != payment.amount:
-                    amount_ok = False
-                    logger.warning("amount mismatch for %s: local=%s chapa=%s", tx_ref, payment.amount, chapa_amount_dec)
-            except (InvalidOperation, TypeError) as e:
-                logger.warning("Could not parse chapa amount: %s", e)
-                amount_ok = False
-
-        # Determine success — parenthesize properly
-        message = (resp_data.get("message") or "").lower()
-        success_by_message = "successful" in message or "success" in message
-        chapa_data_status = (chapa_data.get("status") or "").lower()
-
-        is_success = (chapa_status == "success") or (chapa_data_status in ("success", "completed")) or success_by_message
-
-        if is_success and amount_ok:
-            payment.status = "successful"
-            payment.transaction_id = chapa_data.get("reference") or chapa_data.get("id") or chapa_data.get("tx_ref") or payment.transaction_id
-            payment.metadata = resp_data if hasattr(payment, "metadata") else None
-            payment.save()
-            # enqueue email
-            try:
-                from .tasks import send_payment_confirmation_email
-                send_payment_confirmation_email.delay(payment.id)
-            except Exception as e:
-                logger.error("Failed to queue email task: %s", e)
+        if outcome == chapa.SUCCESSFUL:
             return Response({"detail": "Payment verified and marked successful", "payment": PaymentSerializer(payment).data})
-        else:
-            payment.status = "failed"
-            payment.transaction_id = chapa_data.get("reference") or chapa_data.get("id") or chapa_data.get("tx_ref") or payment.transaction_id
-            payment.metadata = resp_data if hasattr(payment, "metadata") else None
-            payment.save()
-            return Response({"detail": "Payment verification returned non-success state", "raw": resp_data, "payment": PaymentSerializer(payment).data},
-                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({"detail": "Payment verification returned non-success state", "raw": resp_data, "payment": PaymentSerializer(payment).data},
+                        status=status.HTTP_400_BAD_REQUEST)
 
 
 @method_decorator(csrf_exempt, name="dispatch")
@@ -313,10 +586,10 @@ class ChapaWebhookAPIView(APIView):
         try:
             resp_data = resp.json()
         except ValueError:
-            logger.error("Invalid JSON in webhook verify response: %s", resp.text)
+            logger.error("Invalid JSON in webhook verify response for %s", tx_ref, extra={"payload": resp.text})
             return Response({"detail": "Invalid response from payment provider"}, status=status.HTTP_502_BAD_GATEWAY)
 
-        logger.info("Chapa webhook verify response for %s: %s", tx_ref, resp.text)
+        payload_logger.info("Chapa webhook verify response for %s", tx_ref, extra={"payload": resp.text})
 
         chapa_status = (resp_data.get("status") or "").lower()
         chapa_data = resp_data.get("data") or {}
@@ -332,10 +605,12 @@ class ChapaWebhookAPIView(APIView):
 
         if is_success:
             if payment.status != "successful":
-                payment.status = "successful"
+                payment.mark_successful()
                 payment.transaction_id = chapa_data.get("reference") or chapa_data.get("id") or chapa_data.get("tx_ref") or payment.transaction_id
                 payment.metadata = resp_data if hasattr(payment, "metadata") else None
                 payment.save()
+                rollups.refresh_payment(payment)
+                payment_events.publish(payment)
                 try:
                     from .tasks import send_payment_confirmation_email
                     send_payment_confirmation_email.delay(payment.id)
@@ -349,4 +624,65 @@ class ChapaWebhookAPIView(APIView):
             payment.status = "failed"
             payment.metadata = resp_data if hasattr(payment, "metadata") else None
             payment.save()
+            payment_events.publish(payment)
             return Response({"detail": "Updated to failed"}, status=status.HTTP_200_OK)
+
+
+class ExportAPIView(APIView):
+    """
+    Stream bookings or payments as CSV or NDJSON.
+
+    GET /api/exports/<bookings|payments>.<csv|ndjson>?status=&since=YYYY-MM-DD&until=YYYY-MM-DD
+
+    Staff export every row. Hosts get bookings on their own listings and
+    other users get their own payments.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_export_queryset(self, dataset):
+        model, _ = DATASETS[dataset]
+        queryset = model.objects.all()
+        user = self.request.user
+        if user.is_staff:
+            return queryset
+        if dataset == 'bookings':
+            return queryset.filter(listing_id__host=user)
+        return queryset.filter(user_id=user)
+
+    def get(self, request, dataset, file_format, *args, **kwargs):
+        if dataset not in DATASETS or file_format not in FORMATS:
+            return Response({"detail": "Unknown export"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            queryset = filter_export(
+                self.get_export_queryset(dataset),
+                status=request.query_params.get("status"),
+                since=request.query_params.get("since"),
+                until=request.query_params.get("until"),
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(stream_export(dataset, file_format, queryset),
+                                         content_type=FORMATS[file_format])
+        response["Content-Disposition"] = f'attachment; filename="{dataset}.{file_format}"'
+        return response
+
+
+async def payment_event_stream(request, tx_ref):
+    """
+    GET /api/payments/<tx_ref>/events/ - Server-Sent Events with the
+    payment's status, pushed as the webhook or verify call records it.
+    Replaces polling the verify endpoint. Needs the ASGI app (gunicorn's
+    uvicorn worker): under WSGI a stream would hold a worker thread and
+    deliver nothing until it ended, so it is refused with 501.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"detail": "Payment events are only served by the ASGI app; poll the verify endpoint instead"},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+    if not await Payment.objects.filter(booking_reference=tx_ref).aexists():
+        return JsonResponse({"detail": "Payment not found"}, status=status.HTTP_404_NOT_FOUND)
+    response = StreamingHttpResponse(payment_events.stream(tx_ref), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # keep proxies from buffering the stream
+    return response